@@ -1,12 +1,41 @@
+import logging
+
 import streamlit as st
+from backend import metrics
+from backend.graph import run_workflow_stream
+from backend.prompts import preload_prompts
 from backend.wizard import (
     wizard_find_similar,
     wizard_start_plan_chat,
-    wizard_chat_continue,
+    wizard_chat_continue_stream,
 )
+from render_event import render_event, render_stream
 
 st.set_page_config(page_title="i2i Assistant", page_icon="🧠", layout="wide")
 ss = st.session_state
+log = logging.getLogger(__name__)
+
+@st.cache_resource(show_spinner=False)
+def _warm_prompt_cache() -> int:
+    """Once per server process; LLM calls fall back to per-prompt fetches."""
+    try:
+        return preload_prompts()
+    except Exception:
+        log.warning("prompt cache warm-up failed, fetching prompts on demand",
+                    exc_info=True)
+        return 0
+_warm_prompt_cache()
+
+@st.cache_resource(show_spinner=False)
+def _metrics_endpoint() -> int | None:
+    """Prometheus /metrics on METRICS_PORT (off when unset)."""
+    if not metrics.METRICS_PORT:
+        return None
+    try:
+        return metrics.serve().server_port
+    except OSError:                       # port taken, e.g. a second server process
+        return None
+_metrics_endpoint()
 
 # ---------------- simple router ----------------
 def go(page: str) -> None:
@@ -22,8 +51,16 @@ if ss.page == "dashboard":
 
     with st.form("search"):
         q = st.text_input("Describe the task")
-        if st.form_submit_button("Run") and q.strip():
-            st.write("Running existing task …")         # placeholder
+        run = st.form_submit_button("Run") and q.strip()
+
+    if run:
+        ss.last_prompt = q.strip()
+        render_stream(run_workflow_stream(ss.last_prompt))
+    elif ss.get("user_inputs") and ss.get("last_prompt"):      # form answered
+        render_stream(run_workflow_stream(ss.last_prompt, ss.pop("user_inputs"),
+                                          run_id=ss.pop("run_id", None)))
+    elif ss.get("event"):
+        render_event()
 
     st.button("Create New Workflow (Wizard)",
               on_click=lambda: go("wizard_intro"))
@@ -100,12 +137,9 @@ if ss.page == "wizard_plan":
         with st.chat_message("user"):
             st.write(user_msg)
 
-        with st.spinner("Thinking…"):
-            assistant_text = wizard_chat_continue(ss.wizard_chat)
-        ss.wizard_chat.append({"role": "assistant", "content": assistant_text})
-
-        with st.chat_message("assistant"):
-            st.write(assistant_text)
+        with st.chat_message("assistant"):       # tokens render as they arrive
+            assistant_text = st.write_stream(wizard_chat_continue_stream(ss.wizard_chat))
+        ss.wizard_chat.append({"role": "assistant", "content": assistant_text.strip()})
 
         st.rerun()                      # refresh for next turn
 
@@ -0,0 +1,195 @@
+"""
+backend.answer_cache
+--------------------
+Semantic answer cache for document Q&A (policy_qna).
+
+Handbook questions repeat with small wording changes, so answers are kept
+per doc_id together with the question embedding; a new question whose
+cosine similarity to a cached one is ≥ POLICY_QNA_CACHE_SIM gets that
+answer back without retrieval or an LLM call.
+
+Every entry is tied to the doc's chunk *version* — (chunk count, max
+updated_at) of its `vector_chunks` rows, polled at most every
+POLICY_QNA_VERSION_SEC. Re-ingesting a document moves the version and
+drops its cached answers; `invalidate_doc(doc_id)` does it immediately
+(call it from in-process ingest). If the version cannot be read the
+cache is bypassed rather than risk a stale answer.
+
+    result = cached_answer(question, doc_id, q_vec, lambda: run_rag(...))
+
+Environment vars
+----------------
+POLICY_QNA_CACHE_SIM          – min cosine similarity for a hit (default: 0.95)
+POLICY_QNA_CACHE_MAX          – answers kept per doc_id (default: 512)
+POLICY_QNA_VERSION_SEC        – doc version re-check interval (default: 30)
+POLICY_QNA_CACHE_DISABLED     – "1" / "true" bypasses the cache
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend import streaming
+
+log = logging.getLogger(__name__)
+
+SIM_THRESHOLD = float(os.getenv("POLICY_QNA_CACHE_SIM", "0.95"))
+MAX_PER_DOC   = int(os.getenv("POLICY_QNA_CACHE_MAX", "512"))
+VERSION_SEC   = float(os.getenv("POLICY_QNA_VERSION_SEC", "30"))
+ENABLED       = os.getenv("POLICY_QNA_CACHE_DISABLED", "").lower() not in {"1", "true", "yes"}
+
+
+# ────────── per-document store ─────────────────────────────────────────
+class _DocAnswers:
+    __slots__ = ("version", "matrix", "values", "used")
+
+    def __init__(self, version: Hashable, dim: int):
+        self.version = version
+        self.matrix  = np.empty((0, dim), dtype=np.float32)   # normalised question vecs
+        self.values: List[Dict[str, Any]] = []
+        self.used:   List[float] = []
+
+
+def _unit(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+class SemanticAnswerCache:
+    """Nearest-question lookup per (doc_id, doc version)."""
+
+    def __init__(self, threshold: float = SIM_THRESHOLD, max_per_doc: int = MAX_PER_DOC):
+        self.threshold   = threshold
+        self.max_per_doc = max_per_doc
+        self.hits = self.misses = 0
+        self._docs: Dict[str, _DocAnswers] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, doc_id: str, version: Hashable,
+               q_vec: Sequence[float]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        q = _unit(q_vec)
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None or doc.version != version or not doc.values \
+                    or doc.matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            sims = doc.matrix @ q
+            best = int(np.argmax(sims))
+            sim  = float(sims[best])
+            if sim < self.threshold:
+                self.misses += 1
+                return None
+            doc.used[best] = time.monotonic()
+            self.hits += 1
+            return sim, doc.values[best]
+
+    def store(self, doc_id: str, version: Hashable, q_vec: Sequence[float],
+              value: Dict[str, Any]) -> None:
+        q = _unit(q_vec)
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None or doc.version != version or doc.matrix.shape[1] != q.shape[0]:
+                doc = self._docs[doc_id] = _DocAnswers(version, q.shape[0])
+            if len(doc.values) >= self.max_per_doc:          # evict least recently used
+                drop = int(np.argmin(doc.used))
+                doc.matrix = np.delete(doc.matrix, drop, axis=0)
+                del doc.values[drop], doc.used[drop]
+            doc.matrix = np.vstack([doc.matrix, q[None, :]])
+            doc.values.append(value)
+            doc.used.append(time.monotonic())
+
+    def invalidate(self, doc_id: str | None = None) -> None:
+        with self._lock:
+            if doc_id is None:
+                self._docs.clear()
+            else:
+                self._docs.pop(doc_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": sum(len(d.values) for d in self._docs.values())}
+
+
+# ────────── doc version signal ─────────────────────────────────────────
+_VERSIONS: Dict[str, Tuple[Optional[Hashable], float]] = {}
+_versions_lock = threading.Lock()
+
+
+def _fetch_doc_version(doc_id: str) -> Hashable:
+    from backend.db_router import table_version
+    from backend.vector_search import _SB
+    return table_version("vector_chunks", _SB, doc_id=doc_id)
+
+
+def doc_version(doc_id: str) -> Optional[Hashable]:
+    """Chunk version of *doc_id*, re-read at most every VERSION_SEC."""
+    with _versions_lock:
+        hit = _VERSIONS.get(doc_id)
+        if hit is not None and time.monotonic() - hit[1] < VERSION_SEC:
+            return hit[0]
+    try:
+        version: Optional[Hashable] = _fetch_doc_version(doc_id)
+    except Exception as e:                      # unknown version → no caching
+        log.warning("answer cache: version check for %s failed: %s", doc_id, e)
+        version = None
+    with _versions_lock:
+        _VERSIONS[doc_id] = (version, time.monotonic())
+    if version is not None and hit is not None and hit[0] != version:
+        ANSWERS.invalidate(doc_id)
+        log.info("answer cache: %s re-ingested, dropped cached answers", doc_id)
+    return version
+
+
+def invalidate_doc(doc_id: str | None = None) -> None:
+    """Forget answers (and the cached version) for *doc_id*, or all docs."""
+    with _versions_lock:
+        if doc_id is None:
+            _VERSIONS.clear()
+        else:
+            _VERSIONS.pop(doc_id, None)
+    ANSWERS.invalidate(doc_id)
+
+
+# ────────── process-wide cache + helper ────────────────────────────────
+ANSWERS = SemanticAnswerCache()
+
+
+def cached_answer(question: str, doc_id: str, q_vec: Sequence[float] | None,
+                  compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Return a cached answer for a question close enough to *question*,
+    else `compute()` it and remember the result. Needs the question's
+    embedding; without one (or without a doc version) it just computes.
+    """
+    if not ENABLED or q_vec is None:
+        return compute()
+    version = doc_version(doc_id)
+    if version is None:
+        return compute()
+
+    hit = ANSWERS.lookup(doc_id, version, q_vec)
+    if hit is not None:
+        log.debug("answer cache hit for %r (sim %.3f)", question, hit[0])
+        streaming.emit(str(hit[1].get("content") or ""))
+        return dict(hit[1])
+
+    result = compute()
+    ANSWERS.store(doc_id, version, q_vec, dict(result))
+    return result
+
+
+__all__ = [
+    "SemanticAnswerCache",
+    "ANSWERS",
+    "cached_answer",
+    "doc_version",
+    "invalidate_doc",
+]
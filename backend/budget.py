@@ -0,0 +1,208 @@
+"""
+backend.budget
+--------------
+Per-run cost budgets for json_graph chains (`GraphDef.cost_guard`).
+
+cost_guard keys (all optional — a missing limit is unlimited)
+  max_wall_sec     – wall-clock seconds for the whole run
+  max_tokens       – LLM tokens (actual usage when the API reports it,
+                     else the request estimate)
+  max_calls        – external calls: OpenAI, Supabase RPC, Storage
+  max_chunks       – retrieved chunks
+  degrade_at       – share of a limit after which callers degrade
+                     (default: BUDGET_DEGRADE_AT)
+  fallback_model   – model used once degraded (default: BUDGET_FALLBACK_MODEL)
+
+The budget of the running chain lives in a ContextVar (like the token
+sink in backend.streaming), so usage is charged where the work happens —
+the OpenAI transport, `match_vectors`, docx storage — and attributed to
+the json_graph node that is running. Hard limits are checked before every
+node and before every outbound call; crossing one raises BudgetExceeded.
+Short of that, callers degrade: `limit_chunks(k)` trims retrieval to what
+is left and `pick_model(name)` switches to the fallback model.
+
+Environment vars
+----------------
+BUDGET_DEGRADE_AT        – default degrade threshold (default: 0.8)
+BUDGET_FALLBACK_MODEL    – default cheaper model (default: gpt-4o-mini)
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+DEGRADE_AT     = float(os.getenv("BUDGET_DEGRADE_AT", "0.8"))
+FALLBACK_MODEL = os.getenv("BUDGET_FALLBACK_MODEL", "gpt-4o-mini")
+
+KINDS = ("tokens", "calls", "chunks")
+
+
+class BudgetExceeded(RuntimeError):
+    def __init__(self, kind: str, used: float, limit: float):
+        super().__init__(f"{kind} budget exceeded ({used:g} > {limit:g})")
+        self.kind, self.used, self.limit = kind, used, limit
+
+
+class Budget:
+    """Usage meter + limits for one run. Thread-safe (DAG branches share it)."""
+
+    def __init__(self, guard: Mapping[str, Any] | None = None):
+        g = dict(guard or {})
+        self.limits: Dict[str, float] = {
+            k: float(g[f"max_{k}"]) for k in KINDS if g.get(f"max_{k}") is not None}
+        self.wall_limit     = float(g["max_wall_sec"]) if g.get("max_wall_sec") is not None else None
+        self.degrade_at     = float(g.get("degrade_at", DEGRADE_AT))
+        self.fallback_model = str(g.get("fallback_model") or FALLBACK_MODEL)
+        self.used: Dict[str, float] = dict.fromkeys(KINDS, 0.0)
+        self.nodes: Dict[str, Dict[str, float]] = {}
+        self.degraded: List[str] = []
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ── time ──
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining_time(self) -> Optional[float]:
+        return None if self.wall_limit is None else max(0.0, self.wall_limit - self.elapsed())
+
+    # ── accounting ──
+    def charge(self, **amounts: float) -> None:
+        node = _NODE.get()
+        with self._lock:
+            per = self.nodes.setdefault(node, {}) if node else None
+            for kind, n in amounts.items():
+                self.used[kind] = self.used.get(kind, 0.0) + n
+                if per is not None:
+                    per[kind] = per.get(kind, 0.0) + n
+
+    def check(self, **upcoming: float) -> None:
+        """Raise BudgetExceeded if usage (+ *upcoming*) is past a hard limit."""
+        if self.wall_limit is not None and self.elapsed() > self.wall_limit:
+            raise BudgetExceeded("wall_sec", round(self.elapsed(), 3), self.wall_limit)
+        for kind, limit in self.limits.items():
+            used = self.used[kind] + upcoming.get(kind, 0.0)
+            if used > limit:
+                raise BudgetExceeded(kind, used, limit)
+
+    def exceeded(self) -> List[str]:
+        over = [k for k, lim in self.limits.items() if self.used[k] > lim]
+        if self.wall_limit is not None and self.elapsed() > self.wall_limit:
+            over.append("wall_sec")
+        return over
+
+    # ── degradation ──
+    def _note(self, what: str) -> None:
+        with self._lock:
+            if what not in self.degraded:
+                self.degraded.append(what)
+
+    def pressure(self) -> float:
+        """Highest used/limit share over tokens, calls and wall time."""
+        shares = [self.used[k] / lim for k, lim in self.limits.items()
+                  if k != "chunks" and lim > 0]
+        if self.wall_limit:
+            shares.append(self.elapsed() / self.wall_limit)
+        return max(shares, default=0.0)
+
+    def chunks(self, k: int) -> int:
+        limit = self.limits.get("chunks")
+        if limit is None:
+            return k
+        left = max(0, int(limit - self.used["chunks"]))
+        if left < k:
+            self._note(f"chunks:{k}->{left}")
+        return min(k, left)
+
+    def model(self, name: str) -> str:
+        if name == self.fallback_model or self.pressure() < self.degrade_at:
+            return name
+        self._note(f"model:{name}->{self.fallback_model}")
+        return self.fallback_model
+
+    # ── per-node attribution ──
+    @contextmanager
+    def node(self, name: str) -> Iterator[None]:
+        token = _NODE.set(name)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            _NODE.reset(token)
+            with self._lock:
+                per = self.nodes.setdefault(name, {})
+                per["wall_sec"] = round(per.get("wall_sec", 0.0) + time.monotonic() - t0, 4)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            used = {k: v for k, v in self.used.items()}
+            used["wall_sec"] = round(self.elapsed(), 4)
+            limits = dict(self.limits)
+            if self.wall_limit is not None:
+                limits["wall_sec"] = self.wall_limit
+            out: Dict[str, Any] = {"used": used, "limits": limits,
+                                   "nodes": {n: dict(v) for n, v in self.nodes.items()}}
+            if self.degraded:
+                out["degraded"] = list(self.degraded)
+        over = self.exceeded()
+        if over:
+            out["exceeded"] = over
+        return out
+
+
+# ────────── active budget (context-local) ──────────────────────────────
+_CURRENT: contextvars.ContextVar[Optional[Budget]] = \
+    contextvars.ContextVar("run_budget", default=None)
+_NODE: contextvars.ContextVar[Optional[str]] = \
+    contextvars.ContextVar("run_budget_node", default=None)
+
+
+def current() -> Optional[Budget]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def active(budget: Budget) -> Iterator[Budget]:
+    token = _CURRENT.set(budget)
+    try:
+        yield budget
+    finally:
+        _CURRENT.reset(token)
+
+
+def charge(**amounts: float) -> None:
+    b = _CURRENT.get()
+    if b is not None:
+        b.charge(**amounts)
+
+
+def check(**upcoming: float) -> None:
+    b = _CURRENT.get()
+    if b is not None:
+        b.check(**upcoming)
+
+
+def limit_chunks(k: int) -> int:
+    b = _CURRENT.get()
+    return k if b is None else b.chunks(k)
+
+
+def pick_model(name: str) -> str:
+    b = _CURRENT.get()
+    return name if b is None else b.model(name)
+
+
+__all__ = [
+    "Budget",
+    "BudgetExceeded",
+    "active",
+    "current",
+    "charge",
+    "check",
+    "limit_chunks",
+    "pick_model",
+]
@@ -0,0 +1,148 @@
+"""
+backend.chain_registry
+----------------------
+Lazy, dict-like registry of processor chains.
+
+`REG[chain_id]` resolves in three steps:
+
+1. static entries (built-ins, or anything assigned with `REG[k] = v`)
+2. the bounded LRU of chains already loaded from `processor_chains`
+3. otherwise: fetch that one row, validate + compile it, cache it
+
+Loaded entries are re-checked after `ttl` seconds: the row is fetched
+again and the chain is rebuilt only if its `chain_json` hash changed;
+if that fetch fails, the cached chain keeps serving for another TTL.
+Unknown ids are negatively cached for the same TTL so a typo does not
+hit the database on every request. `invalidate(chain_id)` drops a single
+chain; `invalidate()` drops every dynamic one.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+from backend.json_executor import spec_hash
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LazyRegistry(MutableMapping):
+    def __init__(
+        self,
+        fetch: Callable[[str], Optional[Dict[str, Any]]],
+        build: Callable[[Dict[str, Any]], Any],
+        *,
+        list_ids: Callable[[], List[str]] | None = None,
+        ttl: float = 60.0,
+        max_items: int = 256,
+    ):
+        self._fetch     = fetch
+        self._build     = build
+        self._list_ids  = list_ids
+        self.ttl        = ttl
+        self.max_items  = max_items
+
+        self._static: Dict[str, Any] = {}
+        # chain_id → (runnable | _MISSING, chain_json hash | None, checked_at)
+        self._loaded: "OrderedDict[str, Tuple[Any, Optional[str], float]]" = OrderedDict()
+        self._ids: Tuple[List[str], float] | None = None
+        self._lock = threading.RLock()
+        self.loads = 0
+
+    # ── mapping protocol ──
+    def __getitem__(self, chain_id: str) -> Any:
+        if chain_id in self._static:
+            return self._static[chain_id]
+
+        with self._lock:
+            hit = self._loaded.get(chain_id)
+            now = time.monotonic()
+            if hit is not None and now - hit[2] < self.ttl:
+                self._loaded.move_to_end(chain_id)
+                if hit[0] is _MISSING:
+                    raise KeyError(chain_id)
+                return hit[0]
+
+        value, digest = self._load(chain_id, hit)
+
+        with self._lock:
+            self._loaded[chain_id] = (value, digest, time.monotonic())
+            self._loaded.move_to_end(chain_id)
+            while len(self._loaded) > self.max_items:
+                self._loaded.popitem(last=False)
+        if value is _MISSING:
+            raise KeyError(chain_id)
+        return value
+
+    def __setitem__(self, chain_id: str, value: Any) -> None:
+        self._static[chain_id] = value
+
+    def __delitem__(self, chain_id: str) -> None:
+        with self._lock:
+            found = self._static.pop(chain_id, _MISSING) is not _MISSING
+            found |= self._loaded.pop(chain_id, None) is not None
+        if not found:
+            raise KeyError(chain_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """Static entries plus chains currently loaded (not the whole table)."""
+        with self._lock:
+            loaded = [k for k, v in self._loaded.items() if v[0] is not _MISSING]
+        return iter(list(self._static) + [k for k in loaded if k not in self._static])
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    # ── extras ──
+    def available(self) -> List[str]:
+        """Every chain id that could be served (static + enabled rows)."""
+        ids: List[str] = []
+        if self._list_ids is not None:
+            with self._lock:
+                if self._ids is None or time.monotonic() - self._ids[1] >= self.ttl:
+                    self._ids = (list(self._list_ids()), time.monotonic())
+                ids = self._ids[0]
+        return sorted(set(self._static) | set(ids))
+
+    def invalidate(self, chain_id: str | None = None) -> None:
+        """Drop one loaded chain (or all of them) so the next lookup refetches."""
+        with self._lock:
+            if chain_id is None:
+                self._loaded.clear()
+                self._ids = None
+            else:
+                self._loaded.pop(chain_id, None)
+
+    # ── internals ──
+    def _load(self, chain_id: str, prev: Tuple[Any, Optional[str], float] | None
+              ) -> Tuple[Any, Optional[str]]:
+        try:
+            row = self._fetch(chain_id)
+        except Exception as e:
+            if prev is None or prev[0] is _MISSING:
+                raise
+            log.warning("Re-checking chain %s failed, serving cached: %s", chain_id, e)
+            return prev[0], prev[1]                 # stale for another TTL
+        if not row:
+            return _MISSING, None
+
+        digest = spec_hash(row.get("chain_json") or {})
+        if prev is not None and prev[0] is not _MISSING and prev[1] == digest:
+            return prev[0], digest                  # unchanged → keep compiled chain
+
+        try:
+            value = self._build(row)
+        except Exception as e:                      # bad row → behave as unknown
+            log.error("Skipping chain %s: %s", chain_id, e)
+            return _MISSING, None
+        self.loads += 1
+        log.info("Loaded chain %s", chain_id)
+        return value, digest
+
+
+__all__ = ["LazyRegistry"]
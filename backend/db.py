@@ -4,6 +4,8 @@ load_dotenv()  # pulls vars from .env
 import os
 from supabase import create_client, Client
 
+from backend.tracing import supabase_options
+
 _SUPA_URL = os.environ["SUPABASE_URL"]
 _SUPA_KEY = (
     os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
@@ -11,5 +13,5 @@ _SUPA_KEY = (
     or os.environ["SUPABASE_SERVICE_KEY"]         # matches your .env
 )
 
-supabase: Client = create_client(_SUPA_URL, _SUPA_KEY)
+supabase: Client = create_client(_SUPA_URL, _SUPA_KEY, options=supabase_options())
 sb = supabase  # legacy alias
@@ -12,12 +12,13 @@ from __future__ import annotations
 
 import json
 import os
-from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 from supabase import Client, create_client
 
+from backend.versioned_cache import VersionedCache
+
 
 # ────────────────────────────────────────────────────────────────────────────
 # 1.  Supabase client (singleton)
@@ -30,8 +31,9 @@ def _make_client() -> Client:
     )
     if not url or not key:
         raise RuntimeError("SUPABASE_URL / KEY env vars must be set")
-    # ⚠️  old supabase-py versions accept only (url, key)
-    return create_client(url, key)
+    # ⚠️  old supabase-py versions accept only (url, key) — options is None there
+    from backend.tracing import supabase_options
+    return create_client(url, key, options=supabase_options())
 
 
 _sb: Client | None = None
@@ -68,29 +70,62 @@ def _to_vec(raw) -> np.ndarray:
     return np.asarray(arr, dtype=np.float32)
 
 
+def table_version(table: str, client: Client | None = None,
+                  **eq: Any) -> Tuple[int, Optional[str]]:
+    """
+    Cheap change signal for *table* (optionally only rows matching `eq`
+    filters, e.g. doc_id=...): (row count, max updated_at).
+    One request, one row of payload; any insert, update or delete moves it.
+    """
+    q = (client or sb()).table(table).select("updated_at", count="exact")
+    for col, val in eq.items():
+        q = q.eq(col, val)
+    res = q.order("updated_at", desc=True).limit(1).execute()
+    latest = res.data[0]["updated_at"] if res.data else None
+    return int(res.count or 0), latest
+
+
 # ────────────────────────────────────────────────────────────────────────────
 # 3.  Public API
 # ────────────────────────────────────────────────────────────────────────────
-@lru_cache(maxsize=1)
+def _load_task_index() -> List[Dict[str, Any]]:
+    return [
+        {
+            "task_id":   r["task_id"],
+            "helper_py": r["helper_py"],
+            "embedding": _to_vec(r["embedding"]),
+            "enabled":   bool(r["enabled"]),
+        }
+        for r in _rows("task_index_view")
+    ]
+
+
+# refreshed in the background whenever task_manifest (behind the view) changes
+_TASK_INDEX: VersionedCache[List[Dict[str, Any]]] = VersionedCache(
+    _load_task_index,
+    lambda: table_version("task_manifest"),
+    name="task_index",
+)
+
+
 def task_index(enabled_only: bool = True) -> List[Dict[str, Any]]:
     """
     Return task rows for routing.
     Assumes a view `task_index_view` with columns:
       task_id, helper_py, embedding, enabled
+    Rows come from a versioned snapshot, so newly published tasks show up
+    within SNAPSHOT_POLL_SEC without a restart.
     """
-    rows = _rows("task_index_view")
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        if enabled_only and not r["enabled"]:
-            continue
-        out.append(
-            {
-                "task_id":   r["task_id"],
-                "helper_py": r["helper_py"],
-                "embedding": _to_vec(r["embedding"]),
-            }
-        )
-    return out
+    return [
+        {"task_id": r["task_id"], "helper_py": r["helper_py"], "embedding": r["embedding"]}
+        for r in _TASK_INDEX.get()
+        if r["enabled"] or not enabled_only
+    ]
+
+
+def invalidate_task_index() -> None:
+    """Called after a local publish so the next lookup sees the new task."""
+    _TASK_INDEX.invalidate()
 
 
 def processor_chain(chain_id: str) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,133 @@
+"""
+backend.embed_batch
+-------------------
+Cross-request micro-batching for embedding calls.
+
+Streamlit runs each session on its own thread, so concurrent users each
+fire a one-string embedding request. `MicroBatcher` parks those single
+requests for a few milliseconds, coalesces whatever arrived in that
+window (deduplicated) into one upstream `embed_many` call and hands every
+caller its own vector back.
+
+    _BATCHER = MicroBatcher(_embed_many_remote)
+    vec = _BATCHER.submit("create an SOW")       # blocks until its batch returns
+
+Environment vars
+----------------
+EMBED_BATCH_WINDOW_MS   – collection window (default: 5; 0 disables batching)
+EMBED_BATCH_MAX         – max texts per upstream call (default: 64)
+EMBED_BATCH_INFLIGHT    – concurrent upstream calls (default: 4)
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, List, Sequence, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+MAX_BATCH = int(os.getenv("EMBED_BATCH_MAX", "64"))
+INFLIGHT  = int(os.getenv("EMBED_BATCH_INFLIGHT", "4"))
+
+T = TypeVar("T")
+
+
+class MicroBatcher(Generic[T]):
+    """Coalesce concurrent single-item calls into batched `batch_fn` calls."""
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], Sequence[T]],
+        *,
+        window_ms: float = WINDOW_MS,
+        max_batch: int = MAX_BATCH,
+        inflight: int = INFLIGHT,
+        name: str = "embed",
+    ):
+        self.batch_fn  = batch_fn
+        self.window    = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.name      = name
+        self.requests  = 0            # single-item submissions
+        self.calls     = 0            # upstream batch_fn invocations
+
+        self._q: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._pool   = ThreadPoolExecutor(max_workers=max(1, inflight),
+                                          thread_name_prefix=f"{name}-batch")
+        self._worker: threading.Thread | None = None
+        self._lock   = threading.Lock()
+
+    # ── public API ──
+    def submit(self, item: str) -> T:
+        """Return the result for *item*; blocks until its batch completes."""
+        return self.submit_async(item).result()
+
+    def submit_async(self, item: str) -> "Future[T]":
+        with self._lock:
+            self.requests += 1
+        fut: Future = Future()
+        if self.window <= 0:                  # batching disabled
+            self._run_batch([(item, fut)])
+            return fut
+        self._ensure_worker()
+        self._q.put((item, fut))
+        return fut
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "calls": self.calls,
+                    "queued": self._q.qsize()}
+
+    # ── internals ──
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._collect, name=f"{self.name}-collector", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        unique = list(dict.fromkeys(item for item, _ in batch))
+        with self._lock:
+            self.calls += 1
+        try:
+            results = list(self.batch_fn(unique))
+            if len(results) != len(unique):
+                raise RuntimeError(
+                    f"{self.name}: batch_fn returned {len(results)} results "
+                    f"for {len(unique)} inputs"
+                )
+        except Exception as e:                # propagate to every waiter
+            log.warning("%s batch of %d failed: %s", self.name, len(unique), e)
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        by_item: Dict[Any, T] = dict(zip(unique, results))
+        for item, fut in batch:
+            fut.set_result(by_item[item])
+
+
+__all__ = ["MicroBatcher"]
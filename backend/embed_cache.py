@@ -0,0 +1,199 @@
+"""
+backend.embed_cache
+-------------------
+Disk-backed, content-addressed cache for embedding vectors.
+
+Every embed path (edge function, OpenAI SDK, re-embed script) funnels
+through `cached_embed` / `cached_embed_many`, so a prompt we have seen
+before costs one SQLite lookup instead of an HTTP round trip.
+
+• Key    – sha256(model + NUL + normalised text)
+• Value  – raw float32 bytes (1536 dims → 6 KiB per row)
+• LRU    – rows carry a `last_used` stamp; once the table grows past
+           EMBED_CACHE_MAX_ITEMS the oldest tenth is evicted in one go
+• Stats  – `stats()` returns hit / miss / size counters
+• Store  – the SQLite / LRU plumbing is backend.sqlite_lru.SQLiteLRU
+
+Environment vars
+----------------
+EMBED_CACHE_PATH        – SQLite file (default: ~/.cache/i2i/embeddings.sqlite)
+EMBED_CACHE_MAX_ITEMS   – row cap before eviction (default: 50000)
+EMBED_CACHE_DISABLED    – "1" / "true" bypasses the cache entirely
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.sqlite_lru import SQLiteLRU
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_PATH = Path.home() / ".cache" / "i2i" / "embeddings.sqlite"
+CACHE_PATH    = os.getenv("EMBED_CACHE_PATH", str(_DEFAULT_PATH))
+MAX_ITEMS     = int(os.getenv("EMBED_CACHE_MAX_ITEMS", "50000"))
+ENABLED       = os.getenv("EMBED_CACHE_DISABLED", "").lower() not in {"1", "true", "yes"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    dim        INTEGER NOT NULL,
+    vec        BLOB NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used);
+"""
+
+
+# ────────── key helpers ────────────────────────────────────────────────
+def normalize(text: str) -> str:
+    """NFC-normalise and collapse whitespace so trivial variants share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    raw = f"{model}\0{normalize(text)}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+# ────────── cache class ────────────────────────────────────────────────
+class EmbeddingCache(SQLiteLRU):
+    """Thread-safe SQLite store of float32 vectors with LRU eviction."""
+
+    def __init__(self, path: str | Path = CACHE_PATH, max_items: int = MAX_ITEMS):
+        super().__init__(path, table="embeddings", schema=_SCHEMA,
+                         max_items=max_items, name="embed cache")
+
+    # ── reads ──
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [cache_key(model, t) for t in texts]
+        with self._lock:
+            found: Dict[str, np.ndarray] = {}
+            for key in set(keys):
+                row = self._db.execute(
+                    "SELECT vec FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32)
+            if found:
+                self._touch(found)
+            out = [found.get(k) for k in keys]
+            hit = sum(v is not None for v in out)
+            self.hits   += hit
+            self.misses += len(out) - hit
+        return out
+
+    # ── writes ──
+    def put(self, model: str, text: str, vec: Sequence[float]) -> None:
+        self.put_many(model, [text], [vec])
+
+    def put_many(self, model: str, texts: Sequence[str],
+                 vecs: Sequence[Sequence[float]]) -> None:
+        now  = time.time()
+        rows = []
+        for t, v in zip(texts, vecs):
+            arr = np.asarray(v, dtype=np.float32)
+            rows.append((cache_key(model, t), model, arr.shape[0], arr.tobytes(), now))
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings(key, model, dim, vec, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._added(self._db.total_changes - before)
+
+
+# ────────── process-wide singleton ─────────────────────────────────────
+_CACHE: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    global _CACHE                        # pylint: disable=global-statement
+    if _CACHE is None:
+        with _cache_lock:
+            if _CACHE is None:
+                _CACHE = EmbeddingCache()
+    return _CACHE
+
+
+def cached_embed(model: str, text: str,
+                 embed_fn: Callable[[str], Sequence[float]]) -> List[float]:
+    """
+    Return the vector for *text*, calling *embed_fn* only on a cache miss.
+    Cache failures (locked file, full disk…) degrade to a plain call.
+    """
+    if not ENABLED:
+        return list(embed_fn(text))
+    try:
+        hit = get_cache().get(model, text)
+    except sqlite3.Error as e:
+        log.warning("embed cache read failed: %s", e)
+        return list(embed_fn(text))
+    if hit is not None:
+        return hit.tolist()
+
+    vec = list(embed_fn(text))
+    try:
+        get_cache().put(model, text, vec)
+    except sqlite3.Error as e:
+        log.warning("embed cache write failed: %s", e)
+    return vec
+
+
+def cached_embed_many(model: str, texts: Sequence[str],
+                      embed_many_fn: Callable[[List[str]], Sequence[Sequence[float]]],
+                      ) -> List[List[float]]:
+    """
+    Batch counterpart of `cached_embed`: only the (deduplicated) misses are
+    sent to *embed_many_fn*, in one call, and results keep input order.
+    """
+    if not texts:
+        return []
+    if not ENABLED:
+        return [list(v) for v in embed_many_fn(list(texts))]
+    try:
+        hits = get_cache().get_many(model, texts)
+    except sqlite3.Error as e:
+        log.warning("embed cache read failed: %s", e)
+        return [list(v) for v in embed_many_fn(list(texts))]
+
+    misses = list(dict.fromkeys(t for t, h in zip(texts, hits) if h is None))
+    fresh: Dict[str, List[float]] = {}
+    if misses:
+        vecs = [list(v) for v in embed_many_fn(misses)]
+        fresh = dict(zip(misses, vecs))
+        try:
+            get_cache().put_many(model, misses, vecs)
+        except sqlite3.Error as e:
+            log.warning("embed cache write failed: %s", e)
+
+    return [h.tolist() if h is not None else fresh[t] for t, h in zip(texts, hits)]
+
+
+def stats() -> Dict[str, int]:
+    return get_cache().stats() if ENABLED else {"hits": 0, "misses": 0, "size": 0}
+
+
+__all__ = [
+    "EmbeddingCache",
+    "cached_embed",
+    "cached_embed_many",
+    "get_cache",
+    "normalize",
+    "stats",
+]
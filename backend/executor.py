@@ -1,64 +1,37 @@
 """
-JSONGraphExecutor v0.5 – linear-chain executor
-
-• Dynamically inspects each runnable’s .run() method and passes the
-  correct number of positional arguments (state  *or*  ctx+state).
-• Keeps the call-stack scan so '__main__.A' and similar test helpers resolve.
+JSONGraphExecutor – compiled-plan wrapper for json_graph specs
+
+• Thin wrapper over backend.json_executor: the spec is compiled once into
+  a cached GraphPlan (resolved classes, precomputed .run() arity, the
+  `nodes`/`next` DAG in topological order), so steady-state runs do no
+  imports or reflection; independent branches run concurrently.
+• Checks `type == "json_graph"` and defaults `entry` to the first node.
+• `run(context)` starts from an empty state, as it always has; the
+  spec's `cost_guard` budget applies to `run()` and `invoke()` alike.
 """
 from __future__ import annotations
-import importlib, inspect, logging, sys
-from typing import Any, Dict, Mapping
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+from backend.budget import Budget
+from backend.json_executor import JSONGraphExecutor as _CompiledExecutor
 
 logger = logging.getLogger(__name__)
 
 
-class JSONGraphExecutor:
+class JSONGraphExecutor(_CompiledExecutor):
     def __init__(self, spec: Mapping[str, Any]):
         if spec.get("type") != "json_graph":
             raise ValueError("spec.type must be 'json_graph'")
-        self.nodes = spec["nodes"]
-        self.entry = spec.get("entry") or next(iter(self.nodes))
+        if not spec.get("entry"):
+            spec = {**spec, "entry": next(iter(spec["nodes"]))}
+        super().__init__(spec)
 
     # ─────────────────────────── run
-    def run(self, context: Dict[str, Any] | None = None) -> Dict[str, Any]:
-        ctx, state, cur, seen = context or {}, {}, self.entry, set()
-        while cur:
-            if cur in seen:
-                raise RuntimeError(f"cycle detected at node '{cur}'")
-            seen.add(cur)
-
-            meta   = self.nodes[cur]
-            runobj = self._resolve(meta["type"], meta.get("params", {}))
-
-            # ── NEW: inspect signature to decide how many args to pass ──
-            sig = inspect.signature(runobj.run)
-            if len(sig.parameters) == 1:
-                state[cur] = runobj.run(state)
-            else:
-                state[cur] = runobj.run(ctx, state)
-
-            nxt = meta.get("next") or []
-            cur = nxt[0] if nxt else None
-        return state
-
-    # ─────────────────────────── resolver
-    def _resolve(self, dotted: str, params: Dict[str, Any]):
-        """Import runnable class; works for test-local classes too."""
-        mod_path, _, attr = dotted.rpartition(".")
-        if not mod_path:
-            raise ValueError(f"Invalid runnable path '{dotted}'")
-
-        if mod_path == "__main__":
-            # 1) global in the test module
-            mod = sys.modules["__main__"]
-            if hasattr(mod, attr):
-                return getattr(mod, attr)(**params)
-            # 2) class defined inside a test function (walk call-stack)
-            for frame in inspect.stack():
-                if attr in frame.frame.f_locals:
-                    return frame.frame.f_locals[attr](**params)
-            raise AttributeError(f"'{mod_path}' has no attribute '{attr}'")
-
-        mod = importlib.import_module(mod_path)
-        cls = getattr(mod, attr)
-        return cls(**params)
+    def run(
+        self,
+        context: Dict[str, Any] | None = None,
+        state:   Dict[str, Any] | None = None,
+        budget:  Optional[Budget] = None,
+    ) -> Dict[str, Any]:
+        return super().run(context, {} if state is None else state, budget)
@@ -1,12 +1,48 @@
+"""
+backend.graph
+-------------
+The request pipeline: Intent → Gather → (Process) → Deliver.
+
+Two interchangeable engines run the same node functions and edges:
+
+• langgraph – a compiled LangGraph StateGraph over WorkflowState
+• fast      – FastPipeline, a plain loop over the same transition table;
+              no Pregel scheduling, channel bookkeeping or per-step state
+              validation (see scripts/bench_workflow_engine.py)
+
+Environment vars
+----------------
+WORKFLOW_ENGINE   – "langgraph" or "fast" (default: langgraph)
+
+Every run gets a run id (WorkflowState.run_id) that is also its trace id;
+each node runs in a backend.tracing span. Request / chain latency, outcome,
+embedding calls and tokens per request go to backend.metrics.
+"""
 from __future__ import annotations
 
+import os
 import threading
-from typing import Any, Dict, Mapping
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
 
 from pydantic import BaseModel, Extra
 from langgraph.graph import StateGraph
 from langgraph.pregel import Pregel
-from langchain.schema.runnable import Runnable
+from langchain_core.runnables import Runnable
+
+from backend import metrics
+from backend.tracing import attach, run_context, span, traced
+
+_REQ_SECONDS   = metrics.histogram("workflow_request_seconds",
+                                   "run_workflow latency", ["chain_id"])
+_REQUESTS      = metrics.counter("workflow_requests_total",
+                                 "run_workflow calls by final ui_event", ["chain_id", "ui_event"])
+_EMBEDS        = metrics.histogram("workflow_embed_calls_per_request",
+                                   "embedding lookups per run", buckets=metrics.COUNT_BUCKETS)
+_CHAIN_SECONDS = metrics.histogram("chain_seconds", "processor chain latency", ["chain_id"])
+_CHAIN_TOKENS  = metrics.counter("chain_tokens_total", "OpenAI tokens spent per chain", ["chain_id"])
 
 
 class WorkflowState(BaseModel, extra=Extra.allow):
@@ -14,11 +50,16 @@ class WorkflowState(BaseModel, extra=Extra.allow):
     answers: Dict[str, Any] | None = None
     manifest: Dict[str, Any] | None = None
     event: Dict[str, Any] | None = None
+    query_vec: List[float] | None = None    # prompt embedding, computed once
+    run_id: str | None = None               # trace id; a form hands it back to resume
 
 
+@traced()
 def intent_node(state: WorkflowState, *_: Any) -> WorkflowState:
-    from backend.supabase import fetch_manifest
-    _, manifest = fetch_manifest(state.prompt)
+    from backend.supabase import _embed, fetch_manifest
+    if state.query_vec is None:
+        state.query_vec = _embed(state.prompt)
+    _, manifest = fetch_manifest(state.prompt, q_vec=state.query_vec)
     state.manifest = manifest or {
         "processor_chain_id": "policy_qna_chain",
         "required_fields": [],
@@ -27,13 +68,23 @@ def intent_node(state: WorkflowState, *_: Any) -> WorkflowState:
     return state
 
 
+@traced()
 def gather_node(state: WorkflowState, *_: Any) -> WorkflowState:
+    from backend.run_store import RUNS
+
     required = state.manifest.get("required_fields", [])
     if required and not state.answers:
-        state.event = {"ui_event": "form", "fields": required}
+        # checkpoint Intent's work; the resubmission resumes here
+        state.run_id = RUNS.save(
+            {"prompt": state.prompt, "manifest": state.manifest,
+             "query_vec": state.query_vec},
+            state.run_id,
+        )
+        state.event = {"ui_event": "form", "fields": required, "run_id": state.run_id}
     return state
 
 
+@traced()
 def process_node(state: WorkflowState, *_: Any) -> WorkflowState:
     import backend.processors as processors
 
@@ -47,32 +98,76 @@ def process_node(state: WorkflowState, *_: Any) -> WorkflowState:
         "prompt": state.prompt,
         "inputs": state.answers or {},
         "metadata": state.manifest.get("metadata", {}),
+        "query_vec": state.query_vec,
     }
-    state.event = chain.invoke(payload)
+    with _CHAIN_SECONDS.time(chain_id=chain_id):
+        state.event = chain.invoke(payload)
     return state
 
 
+@traced()
 def deliver_node(state: WorkflowState, *_: Any) -> WorkflowState:
     return state
 
 
+# ────────── topology (shared by both engines) ──────────────────────────
+_NODES: Dict[str, Callable[..., WorkflowState]] = {
+    "Intent":  intent_node,
+    "Gather":  gather_node,
+    "Process": process_node,
+    "Deliver": deliver_node,
+}
+
+
+def _entry(state: WorkflowState) -> str:
+    # a resumed run arrives with its pinned manifest → skip Intent
+    return "Gather" if state.manifest is not None else "Intent"
+
+
+def _after_gather(state: WorkflowState) -> str:
+    return "Process" if state.event is None else "Deliver"
+
+
+_NEXT: Dict[str, Callable[[WorkflowState], Optional[str]]] = {
+    "Intent":  lambda s: "Gather",
+    "Gather":  _after_gather,
+    "Process": lambda s: "Deliver",
+    "Deliver": lambda s: None,
+}
+
+ENGINE = os.getenv("WORKFLOW_ENGINE", "langgraph")
+
+
+class FastPipeline:
+    """
+    The workflow as a plain state machine: same nodes, same transitions,
+    one WorkflowState mutated in place. `invoke` returns the final state
+    as a dict, like the compiled LangGraph does.
+    """
+
+    def invoke(self, state: WorkflowState) -> Dict[str, Any]:
+        node: Optional[str] = _entry(state)
+        while node is not None:
+            state = _NODES[node](state)
+            node = _NEXT[node](state)
+        return dict(state)
+
+
 _graph_lock = threading.RLock()
-_GRAPH: Pregel | None = None
+_GRAPH: Pregel | FastPipeline | None = None
 
 
 def build_graph() -> Pregel:
     sg = StateGraph(WorkflowState)
 
-    sg.add_node("Intent", intent_node)
-    sg.add_node("Gather", gather_node)
-    sg.add_node("Process", process_node)
-    sg.add_node("Deliver", deliver_node)
+    for name, fn in _NODES.items():
+        sg.add_node(name, fn)
 
-    sg.set_entry_point("Intent")
+    sg.set_conditional_entry_point(_entry, {"Intent": "Intent", "Gather": "Gather"})
     sg.add_edge("Intent", "Gather")
     sg.add_conditional_edges(
         "Gather",
-        lambda s: "Process" if s.event is None else "Deliver",
+        _after_gather,
         {"Process": "Process", "Deliver": "Deliver"},
     )
     sg.add_edge("Process", "Deliver")
@@ -80,23 +175,99 @@ def build_graph() -> Pregel:
     return sg.compile()
 
 
-def reload_graph() -> None:
-    global _GRAPH
+def reload_graph(engine: str | None = None) -> None:
+    """(Re)build the pipeline; *engine* overrides WORKFLOW_ENGINE."""
+    global _GRAPH, ENGINE
+    engine = engine or ENGINE
+    if engine not in ("langgraph", "fast"):
+        raise ValueError(f"unknown WORKFLOW_ENGINE '{engine}'")
     with _graph_lock:
-        _GRAPH = build_graph()      # no recursive call into processors
+        ENGINE = engine
+        # no recursive call into processors
+        _GRAPH = FastPipeline() if engine == "fast" else build_graph()
 
 
 reload_graph()      # build once at import
 
 
-def run_workflow(prompt: str, answers: Dict[str, Any] | None = None) -> Dict[str, Any]:
+def _initial_state(prompt: str, answers: Dict[str, Any] | None,
+                   run_id: str | None) -> WorkflowState:
+    """Fresh state, or the checkpoint of a run paused on a form."""
+    from backend.run_store import RUNS
+
+    checkpoint = RUNS.load(run_id) if run_id else None
+    if checkpoint is None or checkpoint.get("prompt") != prompt:
+        return WorkflowState(prompt=prompt, answers=answers, run_id=uuid.uuid4().hex)
+    return WorkflowState(prompt=prompt, answers=answers, run_id=run_id,
+                         manifest=checkpoint["manifest"],
+                         query_vec=checkpoint.get("query_vec"))
+
+
+def run_workflow(prompt: str, answers: Dict[str, Any] | None = None,
+                 run_id: str | None = None, *,
+                 profile: bool | str = False) -> Dict[str, Any]:
+    """
+    Run the workflow for *prompt*. `run_id` is the id from a previous
+    `form` event: the run resumes at Gather with that run's manifest
+    and prompt embedding (unknown / expired ids start over).
+
+    `profile=True` adds a "profile" entry to the returned event: per-node
+    wall / CPU / network time, call counts, bytes and tokens (see
+    backend.profiling); `profile="cpu"` also captures cProfile per node.
+    """
+    from backend.profiling import Profiler
+    from backend.run_store import RUNS
+
     if _GRAPH is None:
         raise RuntimeError("Graph not initialised – call reload_graph() first")
 
-    init_state = WorkflowState(prompt=prompt, answers=answers)
-    result_dict = _GRAPH.invoke(init_state)        # AddableValuesDict
+    profiler = None
+    if profile:
+        profiler = Profiler((fn.__name__ for fn in _NODES.values()), cpu=profile == "cpu")
+
+    init_state = _initial_state(prompt, answers, run_id)
+    t0 = time.perf_counter()
+    with run_context(init_state.run_id), metrics.request_scope() as tally, \
+            (attach(profiler) if profiler else nullcontext()), \
+            span("run_workflow", engine=ENGINE,
+                 resumed=init_state.manifest is not None) as sp:
+        try:
+            result_dict = _GRAPH.invoke(init_state)    # AddableValuesDict
+        except Exception:
+            _REQUESTS.inc(chain_id="", ui_event="exception")
+            raise
+        event = result_dict.get("event")
+        sp.set(ui_event=(event or {}).get("ui_event"))
+
+    chain_id = (result_dict.get("manifest") or {}).get("processor_chain_id") or ""
+    _REQ_SECONDS.observe(time.perf_counter() - t0, chain_id=chain_id)
+    _REQUESTS.inc(chain_id=chain_id, ui_event=(event or {}).get("ui_event") or "none")
+    _EMBEDS.observe(tally.get("embed", 0))
+    if tally.get("tokens"):
+        _CHAIN_TOKENS.inc(tally["tokens"], chain_id=chain_id)
 
-    event = result_dict.get("event")
     if not event:
-        return {"ui_event": "error", "content": "No event produced"}
+        event = {"ui_event": "error", "content": "No event produced"}
+    elif run_id and event.get("ui_event") != "form":
+        RUNS.discard(run_id)                       # finished, nothing to resume
+    if profiler is not None:
+        event = {**event, "profile": profiler.report(tally)}
     return event
+
+
+def run_workflow_stream(prompt: str, answers: Dict[str, Any] | None = None,
+                        run_id: str | None = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming `run_workflow`: yields {"ui_event": "partial", "delta": …,
+    "content": <text so far>} while an LLM-backed chain generates, then
+    the final event (same dict `run_workflow` returns).
+    """
+    from backend.streaming import iter_tokens
+
+    text = ""
+    for kind, value in iter_tokens(run_workflow, prompt, answers, run_id):
+        if kind == "token":
+            text += value
+            yield {"ui_event": "partial", "delta": value, "content": text}
+        else:
+            yield value
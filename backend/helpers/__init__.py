@@ -1,9 +1,11 @@
 from backend.helpers.echo import repeat as echo_repeat
 from backend.helpers.policy_qna import run as policy_qna_run
 from backend.helpers.sow_draft import generate as sow_draft_generate
+from backend.helpers.mail_merge import generate as mail_merge_generate
 
 helpers_registry = {
     "echo_chain": echo_repeat,
     "policy_qna_chain": policy_qna_run,
     "doc_draft_chain": sow_draft_generate,
+    "mail_merge_chain": mail_merge_generate,
 }
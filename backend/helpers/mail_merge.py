@@ -0,0 +1,38 @@
+"""
+backend.helpers.mail_merge
+--------------------------
+Bulk variant of sow_draft: fills one DOCX template for many records.
+Designed to be invoked via the Generic Function Runner.
+
+Expected kwargs (gathered from the form):
+    template_id   – template name in the `templates` bucket
+    rows          – list of field dicts, or the same as a JSON string
+    as_zip        – one archive instead of per-document links (default: True)
+    name_field    – field used to name each file, e.g. "client" (optional)
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List
+
+from backend.tools.docx_render import DocxRender
+
+
+def _rows(rows: Any) -> List[Dict[str, Any]]:
+    if isinstance(rows, str):
+        rows = json.loads(rows)
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ValueError("rows must be a list of objects")
+    return rows
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() not in {"", "0", "false", "no"}
+    return bool(value)
+
+
+def generate(template_id: str, rows: Any, as_zip: Any = True,
+             name_field: str | None = None, **_) -> Dict[str, Any]:
+    return DocxRender(template_id).batch(
+        _rows(rows), as_zip=_flag(as_zip), name_field=name_field or None)
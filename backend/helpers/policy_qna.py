@@ -2,24 +2,40 @@
 backend.helpers.policy_qna
 --------------------------
 Reusable helper for Employee Handbook Q&A using RAG and DB-backed prompt.
-Expected fields: question (str), doc_id (optional, default 'handbook_2024')
+Expected fields: question (str), doc_id (optional, default 'handbook_2024'),
+                 query_vec (optional, precomputed embedding of question)
 Returns: dict ({"ui_event": "text", "content": ..., "preview": [...]})
+
+Answers are served from backend.answer_cache when a near-identical
+question about the same doc version was answered before. The completion
+itself runs at temperature 0 through backend.llm_cache, so an identical
+question + retrieved context never pays for a second API call.
 """
 from textwrap import shorten
-from backend.vector_search import SupaRetriever
+from backend.answer_cache import cached_answer
+from backend.vector_search import SupaRetriever, embed_text
 from backend.llm import call_llm
 
-def run(question: str, doc_id: str = "handbook_2024", **kwargs):
+def run(question: str, doc_id: str = "handbook_2024", query_vec=None, **kwargs):
+    q_vec = query_vec if query_vec is not None else embed_text(question)
+    return cached_answer(question, doc_id, q_vec,
+                         lambda: _answer(question, doc_id, q_vec))
+
+
+def _answer(question: str, doc_id: str, query_vec):
     # Retrieve relevant context chunks from vector DB
     retriever = SupaRetriever("vector_chunks", doc_id=doc_id, k=6)
-    docs = retriever.get_relevant_documents(question)
+    docs = retriever.get_relevant_documents(question, q_vec=query_vec)
 
     context = "\n\n---\n".join(d.page_content for d in docs) if docs else ""
 
-    # Call universal LLM helper with DB-backed prompt
+    # Call universal LLM helper with DB-backed prompt; answers strictly
+    # from context are deterministic, so they can be cached
     answer = call_llm(
         "policy_qa",
-        {"CONTEXT": context, "QUESTION": question}
+        {"CONTEXT": context, "QUESTION": question},
+        temperature=0,
+        cache=True,
     )
 
     # Chunk preview for UI
@@ -1,72 +1,357 @@
+"""
+backend.json_executor
+---------------------
+Executor for `json_graph` processor chains (GraphDef model or plain dict).
+
+Running a spec is split in two:
+
+• compile_graph(spec) → GraphPlan   (once per distinct chain_json)
+    resolves every node's class, pre-builds instances of classes that
+    declare `stateless = True`, precomputes how many positional args
+    `.run()` takes, and topologically sorts the `nodes`/`next` DAG
+    reachable from `entry` — cycles and dangling `next` names are
+    rejected here, not half-way through a run.
+    Plans are cached by a hash of the canonical spec JSON.
+• GraphPlan.run(ctx, state)          (every request)
+    no imports, no reflection, no stack walks. A plain chain runs as a
+    loop; a graph with branches runs every node as soon as all of its
+    predecessors finished, independent branches concurrently on a shared
+    bounded thread pool (the calling thread always takes one node itself).
+
+Node contract: `run(state)` or `run(ctx, state)`, sync or `async def`
+(an async node called from inside a running event loop is driven on a
+helper thread); the return value is stored under the node's name in `state`. In branching
+graphs each node receives a shallow copy of `state` taken when it is
+scheduled (it always contains its predecessors' results); results are
+joined into the shared `state` by the scheduler only.
+
+Budgets: `GraphDef.cost_guard` becomes a backend.budget.Budget per run.
+It is active (context-local, also in branch threads) while nodes run, so
+LLM / RPC / Storage calls charge it, attributed per node. Hard limits
+are checked before each node and outbound call; a branch still running
+when `max_wall_sec` passes is abandoned. `invoke(payload)` turns a blown
+budget into an error event and attaches the usage report to the result.
+Each node runs in a backend.tracing span ("json_graph.node").
+
+Environment vars
+----------------
+JSON_GRAPH_WORKERS   – size of the shared branch pool (default: 8)
+"""
 from __future__ import annotations
-import importlib, inspect, logging, sys
-from typing import Any, Dict, Mapping
+import asyncio, contextvars, hashlib, importlib, inspect, json, logging, os, sys, threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from backend import budget as budgets, tracing
+from backend.budget import Budget, BudgetExceeded
 
 log = logging.getLogger(__name__)
 
+WORKERS = int(os.getenv("JSON_GRAPH_WORKERS", "8"))
+_POOL   = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="json-graph")
+
+
+# ────────── compiled plan ──────────────────────────────────────────────
+class PlanNode(NamedTuple):
+    name:     str
+    cls:      type
+    params:   Dict[str, Any]
+    instance: Any            # pre-built when cls.stateless is True, else None
+    arity:    int            # positional args .run() expects (1 or 2)
+    is_async: bool           # .run() is a coroutine function
+    deps:     Tuple[str, ...]  # predecessors that must finish first
+    succ:     Tuple[str, ...]  # successors (the node's `next`)
+
+    def call(self, ctx: Dict[str, Any], data: Dict[str, Any]) -> Any:
+        obj = self.instance if self.instance is not None else self.cls(**self.params)
+        out = obj.run(data) if self.arity == 1 else obj.run(ctx, data)
+        return _run_coroutine(out) if self.is_async else out
+
+
+def _run_coroutine(coro: Any) -> Any:
+    """asyncio.run(coro), on a helper thread when this one already runs a loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    box: Dict[str, Any] = {}
+    cv = contextvars.copy_context()             # budget / span stay attached
+
+    def _target() -> None:
+        try:
+            box["result"] = cv.run(asyncio.run, coro)
+        except BaseException as exc:
+            box["error"] = exc
+
+    t = threading.Thread(target=_target, name="json-graph-async", daemon=True)
+    t.start()
+    t.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
+
+
+def _call(node: PlanNode, ctx: Dict[str, Any], data: Dict[str, Any],
+          budget: Optional[Budget]) -> Any:
+    with tracing.span("json_graph.node", node=node.name, type=node.cls.__name__):
+        if budget is None:
+            return node.call(ctx, data)
+        budget.check()
+        with budget.node(node.name):
+            return node.call(ctx, data)
+
+
+class GraphPlan(NamedTuple):
+    key:      str
+    steps:    Tuple[PlanNode, ...]       # topological order
+    parallel: bool                       # any node has >1 successor or predecessor
+    final:    str                        # node whose result is the chain's output
+
+    def run(self, context: Dict[str, Any] | None = None,
+            state: Dict[str, Any] | None = None,
+            budget: Optional[Budget] = None) -> Dict[str, Any]:
+        ctx  = context or {}
+        data = state   or {}
+        if not self.parallel:
+            if budget is None and not tracing.active():    # nothing to meter
+                for node in self.steps:
+                    data[node.name] = node.call(ctx, data)
+                return data
+            for node in self.steps:
+                data[node.name] = _call(node, ctx, data, budget)
+            return data
+        return self._run_dag(ctx, data, budget)
+
+    def _run_dag(self, ctx: Dict[str, Any], data: Dict[str, Any],
+                 budget: Optional[Budget]) -> Dict[str, Any]:
+        by_name = {n.name: n for n in self.steps}
+        waiting = {n.name: len(n.deps) for n in self.steps}
+        ready: List[str] = [n.name for n in self.steps if not n.deps]
+        running: Dict[Future, str] = {}
+
+        def _done(name: str, result: Any) -> None:
+            data[name] = result
+            for nxt in by_name[name].succ:
+                waiting[nxt] -= 1
+                if waiting[nxt] == 0:
+                    ready.append(nxt)
+
+        try:
+            while ready or running:
+                if ready:
+                    # offload all but one ready node, run the last one here
+                    *offload, mine = ready
+                    ready.clear()
+                    for name in offload:
+                        fut = _POOL.submit(contextvars.copy_context().run,
+                                           _call, by_name[name], ctx, dict(data), budget)
+                        running[fut] = name
+                    _done(mine, _call(by_name[mine], ctx, dict(data), budget))
+                    continue
+                timeout = budget.remaining_time() if budget is not None else None
+                finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not finished:
+                    budget.check()                 # wall budget spent → abandon branches
+                for fut in finished:
+                    _done(running.pop(fut), fut.result())
+        except BaseException:
+            for fut in running:
+                fut.cancel()
+            raise
+        return data
+
+
+# ────────── spec helpers ───────────────────────────────────────────────
+def _spec_dict(spec: Mapping[str, Any] | Any) -> Dict[str, Any]:
+    if hasattr(spec, "model_dump"):
+        return spec.model_dump()
+    if hasattr(spec, "dict") and not isinstance(spec, Mapping):
+        return spec.dict()
+    return dict(spec)
+
+
+def spec_hash(spec: Mapping[str, Any] | Any) -> str:
+    """Stable hash of a chain_json (key order and model-vs-dict agnostic)."""
+    canon = json.dumps(_spec_dict(spec), sort_keys=True, default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+def _meta_get(meta: Any, key: str) -> Any:
+    return meta.get(key) if isinstance(meta, dict) else getattr(meta, key, None)
+
+
+def _run_arity(cls: type) -> int:
+    """Same rule as before compilation: 1 param → run(state), else run(ctx, state)."""
+    n = len(inspect.signature(cls.run).parameters)
+    if not isinstance(inspect.getattr_static(cls, "run"), (staticmethod, classmethod)):
+        n -= 1                                   # drop `self`
+    return 1 if n == 1 else 2
+
+
+def _resolve_class(dotted: str) -> Tuple[type, bool]:
+    """Import the runnable class → (cls, found_via_stack_walk)."""
+    mod_path, _, attr = dotted.rpartition(".")
+
+    # Shorthand: backend.helpers.<Class>
+    if not mod_path:
+        try:
+            mod = importlib.import_module("backend.helpers")
+            if hasattr(mod, attr):
+                return getattr(mod, attr), False
+        except ModuleNotFoundError:
+            pass
+        raise ValueError(f"Invalid runnable path '{dotted}'")
+
+    if mod_path == "__main__":
+        mod = sys.modules["__main__"]
+        if hasattr(mod, attr):
+            return getattr(mod, attr), False
+        for frame in inspect.stack():
+            if attr in frame.frame.f_locals:
+                return frame.frame.f_locals[attr], True
+        raise AttributeError(f"'{mod_path}' has no attribute '{attr}'")
+
+    mod = importlib.import_module(mod_path)
+    return getattr(mod, attr), False
+
+
+# ────────── compiler (+ plan cache) ────────────────────────────────────
+_PLANS: Dict[str, GraphPlan] = {}
+_plans_lock = threading.Lock()
+
+
+def compile_graph(spec: Mapping[str, Any] | Any) -> GraphPlan:
+    """Return the cached plan for *spec*, compiling it on first sight."""
+    key = spec_hash(spec)
+    plan = _PLANS.get(key)
+    if plan is not None:
+        return plan
+
+    nodes = spec.nodes if hasattr(spec, "nodes") else spec["nodes"]
+    entry = spec.entry if hasattr(spec, "entry") else spec["entry"]
+
+    # ── reachable sub-graph and its edges ──
+    succ: Dict[str, List[str]] = {}
+    stack = [entry]
+    while stack:
+        cur = stack.pop()
+        if cur in succ:
+            continue
+        if cur not in nodes:
+            raise ValueError(f"json_graph references unknown node '{cur}'")
+        succ[cur] = list(dict.fromkeys(_meta_get(nodes[cur], "next") or []))
+        stack.extend(succ[cur])
+
+    deps: Dict[str, List[str]] = {n: [] for n in succ}
+    for n, outs in succ.items():
+        for m in outs:
+            deps[m].append(n)
+
+    # ── Kahn topological sort (leftovers ⇒ cycle) ──
+    indeg = {n: len(d) for n, d in deps.items()}
+    order, queue = [], [n for n in succ if indeg[n] == 0]
+    while queue:
+        n = queue.pop(0)
+        order.append(n)
+        for m in succ[n]:
+            indeg[m] -= 1
+            if indeg[m] == 0:
+                queue.append(m)
+    if len(order) != len(succ):
+        stuck = next(n for n in succ if indeg[n] > 0)
+        raise RuntimeError(f"cycle detected at node '{stuck}'")
+
+    # ── resolve classes once ──
+    steps, cacheable = [], True
+    for name in order:
+        meta   = nodes[name]
+        params = _meta_get(meta, "params") or {}
+        cls, from_stack = _resolve_class(_meta_get(meta, "type"))
+        cacheable &= not from_stack          # test-local classes differ per call site
+
+        instance = cls(**params) if getattr(cls, "stateless", False) else None
+        steps.append(PlanNode(
+            name, cls, params, instance, _run_arity(cls),
+            inspect.iscoroutinefunction(cls.run),
+            tuple(deps[name]), tuple(succ[name]),
+        ))
+
+    parallel = any(len(n.succ) > 1 or len(n.deps) > 1 for n in steps)
+    final = next((n for n in order if _meta_get(nodes[n], "end")), order[-1])
+    plan = GraphPlan(key, tuple(steps), parallel, final)
+    if cacheable:
+        with _plans_lock:
+            plan = _PLANS.setdefault(key, plan)
+    return plan
+
+
+def clear_plan_cache() -> None:
+    with _plans_lock:
+        _PLANS.clear()
+
+
+# ────────── executor (public API unchanged) ────────────────────────────
 class JSONGraphExecutor:
     """Execute a json_graph spec (GraphDef model or plain dict)."""
 
     def __init__(self, spec: Mapping[str, Any] | Any):
         # Accept either a pydantic GraphDef or raw dict
+        self.spec  = spec
         self.nodes = spec.nodes if hasattr(spec, "nodes") else spec["nodes"]
         self.entry = spec.entry if hasattr(spec, "entry") else spec["entry"]
+        self.cost_guard: Dict[str, Any] = dict(
+            (spec.cost_guard if hasattr(spec, "cost_guard") else spec.get("cost_guard")) or {})
+        self._plan: Optional[GraphPlan] = None
+
+    @property
+    def plan(self) -> GraphPlan:
+        # compiled lazily so a bad class path fails the run, not registry load
+        if self._plan is None:
+            self._plan = compile_graph(self.spec)
+        return self._plan
 
     # ------------------------------------------------------------------
     def run(
         self,
         context: Dict[str, Any] | None = None,
-        state:   Dict[str, Any] | None = None
+        state:   Dict[str, Any] | None = None,
+        budget:  Optional[Budget] = None,
     ) -> Dict[str, Any]:
-        ctx   = context or {}
-        data  = state   or {}
-        cur   = self.entry
-        seen  = set()
-
-        while cur:
-            if cur in seen:
-                raise RuntimeError(f"cycle detected at node '{cur}'")
-            seen.add(cur)
-
-            meta = self.nodes[cur]
-            m_get = meta.get if isinstance(meta, dict) else lambda k: getattr(meta, k)
+        """Run the graph; raises BudgetExceeded when cost_guard is blown."""
+        if budget is None and self.cost_guard:
+            budget = Budget(self.cost_guard)
+        if budget is None:
+            return self.plan.run(context, state)
+        with budgets.active(budget):
+            return self.plan.run(context, state, budget)
 
-            runobj = self._resolve(m_get("type"), m_get("params") or {})
-
-            sig = inspect.signature(runobj.run)
-            data[cur] = (
-                runobj.run(data) if len(sig.parameters) == 1
-                else runobj.run(ctx, data)
-            )
-
-            nxt = m_get("next") or []
-            cur = nxt[0] if nxt else None
-
-        return data
+    def invoke(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Chain entry point (same as the RunnableLambda chains): the final
+        node's result is the ui_event, with the run's usage attached.
+        """
+        budget = Budget(self.cost_guard)
+        try:
+            data = self.run(payload, dict(payload), budget)
+        except BudgetExceeded as e:
+            log.warning("json_graph %s stopped: %s", self.plan.key[:12], e)
+            return {"ui_event": "error", "content": f"Chain stopped: {e}",
+                    "usage": budget.report()}
+        event = data.get(self.plan.final)
+        if not isinstance(event, dict):
+            event = {"ui_event": "text", "content": "" if event is None else str(event)}
+        return {**event, "usage": budget.report()}
 
     # ------------------------------------------------------------------
     def _resolve(self, dotted: str, params: Dict[str, Any]):
-        mod_path, _, attr = dotted.rpartition(".")
-
-        # Shorthand: backend.helpers.<Class>
-        if not mod_path:
-            try:
-                mod = importlib.import_module("backend.helpers")
-                if hasattr(mod, attr):
-                    return getattr(mod, attr)(**params)
-            except ModuleNotFoundError:
-                pass
-            raise ValueError(f"Invalid runnable path '{dotted}'")
-
-        if mod_path == "__main__":
-            mod = sys.modules["__main__"]
-            if hasattr(mod, attr):
-                return getattr(mod, attr)(**params)
-            for frame in inspect.stack():
-                if attr in frame.frame.f_locals:
-                    return frame.frame.f_locals[attr](**params)
-            raise AttributeError(f"'{mod_path}' has no attribute '{attr}'")
-
-        mod = importlib.import_module(mod_path)
-        cls = getattr(mod, attr)
-        return cls(**params)
+        """Legacy helper: import and instantiate one runnable."""
+        return _resolve_class(dotted)[0](**params)
+
+
+__all__ = [
+    "JSONGraphExecutor",
+    "GraphPlan",
+    "compile_graph",
+    "clear_plan_cache",
+    "spec_hash",
+]
@@ -1,8 +1,50 @@
+import logging
 import os
+import sqlite3
+import threading
+import time
+
 import openai
 
+from backend import budget, llm_cache, metrics, streaming
+from backend.openai_scheduler import openai_client
 from backend.prompts import get_prompt
 
+log = logging.getLogger(__name__)
+
+# One client per process: its httpx pool keeps connections to the API alive,
+# and every request goes through the shared rate-limit scheduler.
+_CLIENT: openai.OpenAI | None = None
+_client_lock = threading.Lock()
+
+
+def _client() -> openai.OpenAI:
+    global _CLIENT
+    if _CLIENT is None:
+        with _client_lock:
+            if _CLIENT is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise RuntimeError("OPENAI_API_KEY environment variable not set.")
+                _CLIENT = openai_client(api_key=api_key)
+    return _CLIENT
+
+
+# ── metrics ──
+_CALLS   = metrics.counter("llm_calls_total", "call_llm invocations", ["model", "cache"])
+_SECONDS = metrics.histogram("llm_call_seconds", "call_llm latency (API calls only)", ["model"])
+
+
+def _cache_stat(field: str) -> float:
+    cache = llm_cache._CACHE                   # never open the SQLite file just to scrape
+    return cache.stats()[field] if cache is not None else 0
+
+
+metrics.callback("llm_cache_hits_total", lambda: _cache_stat("hits"),
+                 "LLM response cache hits", kind="counter")
+metrics.callback("llm_cache_misses_total", lambda: _cache_stat("misses"),
+                 "LLM response cache misses", kind="counter")
+
 
 def _substitute(template: str, variables: dict[str, str] | None) -> str:
     """
@@ -21,6 +63,22 @@ def _substitute(template: str, variables: dict[str, str] | None) -> str:
                          "was not supplied in `variables`.") from None
 
 
+def _complete(request: dict, stream: bool) -> str:
+    t0 = time.perf_counter()
+    try:
+        if not stream:
+            return _client().chat.completions.create(**request).choices[0].message.content
+        parts = []
+        for chunk in _client().chat.completions.create(**request, stream=True):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                streaming.emit(delta)
+        return "".join(parts)
+    finally:
+        _SECONDS.observe(time.perf_counter() - t0, model=request["model"])
+
+
 def call_llm(
     prompt_name: str,
     variables: dict[str, str] | None = None,
@@ -29,6 +87,8 @@ def call_llm(
     version: int | None = None,
     max_tokens: int = 512,
     temperature: float = 0.2,
+    cache: bool | None = None,
+    stream: bool | None = None,
 ) -> str:
     """
     Universal OpenAI chat‑completion helper.
@@ -36,22 +96,51 @@ def call_llm(
     • Prompts are fetched from the DB via `get_prompt`.
     • Placeholders use *single braces* (e.g. {CONTEXT}).
     • Values are injected with Python’s `str.format(**variables)`.
+    • temperature == 0 responses are served from backend.llm_cache when
+      `cache=True` (or LLM_CACHE_ENABLED and `cache` left as None);
+      any other temperature always calls the API.
+    • Inside a json_graph run whose cost_guard is nearly spent the
+      budget's fallback model replaces `model` (backend.budget).
+    • With a token sink installed (backend.streaming) — or `stream=True` —
+      the completion is streamed and each delta emitted as it arrives;
+      the full text is still returned.
     """
+    model = budget.pick_model(model)           # cheaper model once a run budget is tight
     prompt_text = get_prompt(prompt_name, version)
     prompt_text = _substitute(prompt_text, variables)
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY environment variable not set.")
-
-    client = openai.OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
+    request = dict(
         model=model,
         messages=[{"role": "system", "content": prompt_text}],
         max_tokens=max_tokens,
         temperature=temperature,
     )
-    return response.choices[0].message.content
+    if stream is None:
+        stream = streaming.active()
+    use_cache = temperature == 0 and (llm_cache.ENABLED if cache is None else cache)
+    if not use_cache:
+        _CALLS.inc(model=model, cache="off")
+        return _complete(request, stream)
+
+    key = llm_cache.request_key(**request)
+    try:
+        hit = llm_cache.get_cache().get(key)
+    except sqlite3.Error as e:
+        log.warning("llm cache read failed: %s", e)
+        hit = None
+    if hit is not None:
+        _CALLS.inc(model=model, cache="hit")
+        streaming.emit(hit)
+        return hit
+
+    _CALLS.inc(model=model, cache="miss")
+    answer = _complete(request, stream)
+    if answer is not None:
+        try:
+            llm_cache.get_cache().put(key, model, answer)
+        except sqlite3.Error as e:
+            log.warning("llm cache write failed: %s", e)
+    return answer
 
 
 # --------------------------------------------------------------------------- #
@@ -0,0 +1,112 @@
+"""
+backend.llm_cache
+-----------------
+Disk-backed exact-response cache for deterministic chat completions.
+
+`call_llm` consults it only when temperature == 0, so a cached answer is
+exactly what the model would have returned anyway (modulo model updates,
+which the TTL bounds).
+
+• Key    – sha256 of canonical JSON {model, messages, sampling params}
+• Value  – response text
+• TTL    – rows older than LLM_CACHE_TTL_SEC are ignored and overwritten
+• LRU    – once past LLM_CACHE_MAX_ITEMS the oldest tenth is evicted
+           (store: backend.sqlite_lru.SQLiteLRU, shared with embed_cache)
+
+Environment vars
+----------------
+LLM_CACHE_ENABLED     – "1" / "true" turns the cache on for every
+                        temperature-0 call (default: off; callers can
+                        still opt in with `call_llm(..., cache=True)`)
+LLM_CACHE_PATH        – SQLite file (default: ~/.cache/i2i/llm_responses.sqlite)
+LLM_CACHE_MAX_ITEMS   – row cap before eviction (default: 20000)
+LLM_CACHE_TTL_SEC     – max age of a cached response (default: 86400)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from backend.sqlite_lru import SQLiteLRU
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_PATH = Path.home() / ".cache" / "i2i" / "llm_responses.sqlite"
+CACHE_PATH    = os.getenv("LLM_CACHE_PATH", str(_DEFAULT_PATH))
+MAX_ITEMS     = int(os.getenv("LLM_CACHE_MAX_ITEMS", "20000"))
+TTL_SEC       = float(os.getenv("LLM_CACHE_TTL_SEC", "86400"))
+ENABLED       = os.getenv("LLM_CACHE_ENABLED", "").lower() in {"1", "true", "yes"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    response   TEXT NOT NULL,
+    created    REAL NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used);
+"""
+
+
+def request_key(**request: Any) -> str:
+    """Hash of everything that determines a deterministic completion."""
+    canon = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(SQLiteLRU):
+    """Thread-safe SQLite store of completion texts with TTL + LRU eviction."""
+
+    def __init__(self, path: str | Path = CACHE_PATH, max_items: int = MAX_ITEMS,
+                 ttl: float = TTL_SEC):
+        super().__init__(path, table="responses", schema=_SCHEMA,
+                         max_items=max_items, ttl=ttl, name="llm cache")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM responses WHERE key = ? AND created > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touch([key])
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            exists = self._db.execute(
+                "SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses(key, model, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._added(int(not exists))
+
+
+# ────────── process-wide singleton ─────────────────────────────────────
+_CACHE: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    global _CACHE                        # pylint: disable=global-statement
+    if _CACHE is None:
+        with _cache_lock:
+            if _CACHE is None:
+                _CACHE = ResponseCache()
+    return _CACHE
+
+
+__all__ = ["ResponseCache", "get_cache", "request_key", "ENABLED"]
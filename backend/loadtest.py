@@ -0,0 +1,316 @@
+"""
+backend.loadtest
+----------------
+Replay-driven load generator for the workflow
+(CLI: scripts/loadtest_workflow.py).
+
+• Sessions come from JSONL, one per line: {"prompt": …, "answers": {…}}
+  ("answers" optional). A session replays what the UI does: run the
+  prompt; when a form comes back and the line has answers, resubmit
+  them with the form's run_id. Every run_workflow call is one request
+• Targets:
+    InProcessTarget – calls run_workflow(profile=True) in this process
+    HttpTarget      – POSTs {"prompt", "answers", "run_id", "profile"}
+                      to a service endpoint and expects the event JSON
+• Load models:
+    closed loop – `concurrency` workers, each starting its next session
+                  when the previous one finishes
+    open loop   – sessions arrive at `rate` per second (Poisson or
+                  uniform) whatever the completions; latency counts from
+                  the scheduled arrival, so queueing shows up in the
+                  percentiles instead of slowing the generator down
+• `Report`: throughput, latency percentiles, error rate and kinds,
+  ui_event mix and — from the per-request profile — per-stage (graph
+  node) wall / CPU / network percentiles plus calls, bytes and tokens
+  per request
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+log = logging.getLogger(__name__)
+
+Target = Callable[[str, Optional[Dict[str, Any]], Optional[str]], Dict[str, Any]]
+
+
+def load_sessions(path: str | Path) -> List[Dict[str, Any]]:
+    sessions = []
+    with open(path, encoding="utf-8") as fh:
+        for n, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not row.get("prompt"):
+                raise ValueError(f"{path}:{n}: session without a prompt")
+            sessions.append(row)
+    if not sessions:
+        raise ValueError(f"{path}: no sessions")
+    return sessions
+
+
+# ────────── targets ────────────────────────────────────────────────────
+class InProcessTarget:
+    def __init__(self, profile: bool = True):
+        self.profile = profile
+
+    def __call__(self, prompt: str, answers: Dict[str, Any] | None,
+                 run_id: str | None) -> Dict[str, Any]:
+        from backend.graph import run_workflow
+        return run_workflow(prompt, answers, run_id, profile=self.profile)
+
+
+class HttpTarget:
+    def __init__(self, url: str, timeout: float = 120.0, profile: bool = True):
+        import httpx
+        self.url     = url
+        self.profile = profile
+        self._http   = httpx.Client(timeout=timeout)
+
+    def __call__(self, prompt: str, answers: Dict[str, Any] | None,
+                 run_id: str | None) -> Dict[str, Any]:
+        resp = self._http.post(self.url, json={"prompt": prompt, "answers": answers,
+                                               "run_id": run_id, "profile": self.profile})
+        resp.raise_for_status()
+        return resp.json()
+
+
+# ────────── samples ────────────────────────────────────────────────────
+class Sample:
+    """One request: `latency` from (scheduled) start, `service` from send."""
+    __slots__ = ("step", "latency", "service", "ui_event", "error", "profile", "done")
+
+    def __init__(self, step: str):
+        self.step = step
+        self.latency = self.service = 0.0
+        self.ui_event: Optional[str] = None
+        self.error: Optional[str] = None
+        self.profile: Optional[Dict[str, Any]] = None
+        self.done = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _request(target: Target, step: str, scheduled: float, prompt: str,
+             answers: Dict[str, Any] | None, run_id: str | None) -> tuple:
+    s = Sample(step)
+    sent = time.perf_counter()
+    event: Dict[str, Any] = {}
+    try:
+        event = target(prompt, answers, run_id) or {}
+    except Exception as e:                      # recorded, the run goes on
+        s.error = f"{type(e).__name__}: {e}"[:200]
+    s.done     = time.perf_counter()
+    s.service  = s.done - sent
+    s.latency  = s.done - scheduled
+    s.profile  = event.pop("profile", None) if isinstance(event, dict) else None
+    s.ui_event = event.get("ui_event") if isinstance(event, dict) else None
+    if s.error is None and s.ui_event == "error":
+        s.error = f"ui_event error: {str(event.get('content', ''))[:120]}"
+    return s, event
+
+
+def play_session(target: Target, session: Dict[str, Any],
+                 scheduled: float | None = None) -> List[Sample]:
+    """Run one session (prompt, then the form resubmission if any)."""
+    scheduled = time.perf_counter() if scheduled is None else scheduled
+    prompt, answers = session["prompt"], session.get("answers")
+    first, event = _request(target, "prompt", scheduled, prompt, None, None)
+    samples = [first]
+    if first.ok and first.ui_event == "form" and answers:
+        resumed, _ = _request(target, "resume", time.perf_counter(), prompt,
+                              answers, event.get("run_id"))
+        samples.append(resumed)
+    return samples
+
+
+# ────────── load models ────────────────────────────────────────────────
+def _feed(sessions: List[Dict[str, Any]], total: int | None,
+          duration: float | None) -> Iterator[Dict[str, Any]]:
+    """Sessions in file order, cycled up to *total* (one pass by default)."""
+    if total is None and duration is not None:
+        return itertools.cycle(sessions)
+    return itertools.islice(itertools.cycle(sessions), total or len(sessions))
+
+
+def run(sessions: List[Dict[str, Any]], target: Target, *,
+        concurrency: int | None = None, rate: float | None = None,
+        arrival: str = "poisson", total: int | None = None,
+        duration: float | None = None, warmup: int = 0,
+        max_inflight: int = 256, seed: int | None = None) -> "Report":
+    """
+    Replay *sessions* against *target*: closed loop with `concurrency`
+    workers, or open loop at `rate` sessions/s. Stops after `total`
+    sessions (default: one pass over the file) or `duration` seconds.
+    """
+    if (concurrency is None) == (rate is None):
+        raise ValueError("pass exactly one of concurrency / rate")
+    if arrival not in ("poisson", "uniform"):
+        raise ValueError(f"unknown arrival process '{arrival}'")
+
+    for session in sessions[:warmup]:           # caches, imports, pools
+        play_session(target, session)
+
+    feed = _feed(sessions, total, duration)
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + duration if duration is not None else None
+
+    def record(got: List[Sample]) -> None:
+        with lock:
+            samples.extend(got)
+
+    if concurrency is not None:
+        def worker() -> None:
+            while deadline is None or time.perf_counter() < deadline:
+                with lock:
+                    session = next(feed, None)
+                if session is None:
+                    return
+                record(play_session(target, session))
+
+        threads = [threading.Thread(target=worker, name=f"loadtest-{i}", daemon=True)
+                   for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        mode = {"model": "closed", "concurrency": concurrency}
+    else:
+        rnd = random.Random(seed)
+        gap = (lambda: rnd.expovariate(rate)) if arrival == "poisson" else (lambda: 1.0 / rate)
+        at = t0
+        with ThreadPoolExecutor(max_inflight, thread_name_prefix="loadtest") as pool:
+            for session in feed:
+                if deadline is not None and at >= deadline:
+                    break
+                delay = at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(play_session, target, session, at).add_done_callback(
+                    lambda f: record(f.result()))
+                at += gap()
+        mode = {"model": "open", "rate": rate, "arrival": arrival,
+                "max_inflight": max_inflight}
+
+    return Report(samples, time.perf_counter() - t0, mode)
+
+
+# ────────── report ─────────────────────────────────────────────────────
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of *values* (q in 0…100)."""
+    if not values:
+        return float("nan")
+    xs = sorted(values)
+    pos = (len(xs) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _dist(values: List[float]) -> Dict[str, float]:
+    out = {f"p{q}": round(percentile(values, q), 3) for q in PERCENTILES}
+    out["max"]  = round(max(values), 3) if values else float("nan")
+    out["mean"] = round(sum(values) / len(values), 3) if values else float("nan")
+    return out
+
+
+class Report:
+    def __init__(self, samples: List[Sample], elapsed: float, mode: Dict[str, Any]):
+        self.samples = samples
+        self.elapsed = elapsed
+        self.mode    = mode
+
+    def to_dict(self) -> Dict[str, Any]:
+        s = self.samples
+        n = len(s)
+        errors = [x for x in s if not x.ok]
+        profiles = [x.profile for x in s if x.profile]
+
+        stages: Dict[str, Dict[str, List[float]]] = {}
+        calls: Counter = Counter()
+        sent = received = tokens = 0
+        for p in profiles:
+            for node, row in (p.get("nodes") or {}).items():
+                st = stages.setdefault(node, {"wall_ms": [], "cpu_ms": [], "network_ms": []})
+                for k in st:
+                    st[k].append(row.get(k, 0.0))
+            calls.update(p.get("calls") or {})
+            sent     += (p.get("bytes") or {}).get("sent", 0)
+            received += (p.get("bytes") or {}).get("received", 0)
+            tokens   += p.get("tokens") or 0
+        per_req = lambda v: round(v / len(profiles), 3) if profiles else 0.0  # noqa: E731
+
+        return {
+            "mode":       self.mode,
+            "elapsed_s":  round(self.elapsed, 3),
+            "requests":   n,
+            "sessions":   sum(1 for x in s if x.step == "prompt"),
+            "throughput_rps": round(n / self.elapsed, 3) if self.elapsed else 0.0,
+            "latency_ms": _dist([x.latency * 1000 for x in s]),
+            "service_ms": _dist([x.service * 1000 for x in s]),
+            "by_step":    {step: _dist([x.latency * 1000 for x in s if x.step == step])
+                           for step in sorted({x.step for x in s})},
+            "errors":     len(errors),
+            "error_rate": round(len(errors) / n, 4) if n else 0.0,
+            "error_kinds": dict(Counter(e.error.split(":")[0] for e in errors).most_common(10)),
+            "ui_events":  dict(Counter(x.ui_event or "none" for x in s)),
+            "stages":     {node: {k: _dist(v) for k, v in st.items()}
+                           for node, st in stages.items()},
+            "per_request": {"calls": {k: per_req(v) for k, v in sorted(calls.items())},
+                            "bytes_sent": per_req(sent), "bytes_received": per_req(received),
+                            "tokens": per_req(tokens)},
+        }
+
+    def format(self) -> str:
+        d = self.to_dict()
+        mode = ", ".join(f"{k}={v}" for k, v in d["mode"].items())
+        lat, svc = d["latency_ms"], d["service_ms"]
+        lines = [
+            f"{mode}",
+            f"{d['requests']} requests ({d['sessions']} sessions) in {d['elapsed_s']:.1f} s"
+            f"  → {d['throughput_rps']:.2f} req/s",
+            f"latency ms   p50 {lat['p50']:.1f}  p90 {lat['p90']:.1f}  p95 {lat['p95']:.1f}"
+            f"  p99 {lat['p99']:.1f}  max {lat['max']:.1f}",
+            f"service ms   p50 {svc['p50']:.1f}  p95 {svc['p95']:.1f}  p99 {svc['p99']:.1f}",
+            f"errors       {d['errors']} ({d['error_rate']:.2%})"
+            + (f"  {d['error_kinds']}" if d["error_kinds"] else ""),
+            f"ui_events    {d['ui_events']}",
+        ]
+        if d["stages"]:
+            lines.append(f"{'stage':16} {'wall p50':>9} {'wall p95':>9} {'cpu p50':>9}"
+                         f" {'net p50':>9}")
+            for node, st in d["stages"].items():
+                lines.append(f"{node:16} {st['wall_ms']['p50']:9.1f} {st['wall_ms']['p95']:9.1f}"
+                             f" {st['cpu_ms']['p50']:9.1f} {st['network_ms']['p50']:9.1f}")
+            pr = d["per_request"]
+            lines.append("per request  " + ", ".join(f"{k}={v}" for k, v in pr["calls"].items())
+                         + f"; bytes {pr['bytes_sent']:.0f} out / {pr['bytes_received']:.0f} in"
+                         + f"; tokens {pr['tokens']:.0f}")
+        return "\n".join(lines)
+
+
+__all__ = [
+    "InProcessTarget",
+    "HttpTarget",
+    "Sample",
+    "Report",
+    "load_sessions",
+    "play_session",
+    "run",
+    "percentile",
+]
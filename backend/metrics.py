@@ -0,0 +1,337 @@
+"""
+backend.metrics
+---------------
+In-process metrics registry with a Prometheus text endpoint.
+
+• Counter / Gauge / Histogram with optional label names; get-or-create
+  through the module helpers, so instrumenting a module is one line
+• Callback metrics read an existing `stats()` at scrape time (cache
+  hit/miss counters, queue depths) instead of double-counting
+• Per-request tallies: `request_scope()` opens a tally for one workflow
+  run, `tally("embed")` counts into it from anywhere below (the tally
+  follows the ContextVar into LangGraph / json_graph worker threads)
+• `render()` → Prometheus text exposition format (0.0.4); `serve()` runs
+  a tiny HTTP server answering GET /metrics on a daemon thread
+• Python API for tests and tools: `get(name).value(**labels)`,
+  `Histogram.quantile(q, **labels)` (interpolated like PromQL's
+  histogram_quantile), `snapshot()`
+
+Environment vars
+----------------
+METRICS_PORT   – app.py starts the endpoint on this port (default: off)
+METRICS_ADDR   – bind address for the endpoint (default: 127.0.0.1)
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS   = (0, 1, 2, 3, 5, 10, 20, 50)
+
+Labels = Tuple[str, ...]
+
+
+# ────────── metric types ───────────────────────────────────────────────
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str = "", labels: Sequence[str] = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._lock  = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = "", labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, n: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + n
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield self.name, dict(zip(self.labels, key)), v
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, v: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(v)
+
+    def dec(self, n: float = 1.0, **labels: Any) -> None:
+        self.inc(-n, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts (+Inf last), sum, count]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, v: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            row[0][i] += 1
+            row[1] += v
+            row[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels: Any) -> int:
+        row = self._values.get(self._key(labels))
+        return row[2] if row else 0
+
+    def sum(self, **labels: Any) -> float:
+        row = self._values.get(self._key(labels))
+        return row[1] if row else 0.0
+
+    def quantile(self, q: float, **labels: Any) -> float:
+        """Bucket-interpolated quantile (NaN without observations)."""
+        row = self._values.get(self._key(labels))
+        if not row or not row[2]:
+            return math.nan
+        rank, seen, lower = q * row[2], 0, 0.0
+        for bound, n in zip(self.buckets, row[0]):
+            if seen + n >= rank and n:
+                return lower + (bound - lower) * (rank - seen) / n
+            seen, lower = seen + n, bound
+        return self.buckets[-1] if self.buckets else math.nan
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(k, (list(r[0]), r[1], r[2])) for k, r in self._values.items()]
+        for key, (counts, total, n) in items:
+            base = dict(zip(self.labels, key))
+            cum = 0
+            for bound, c in zip(self.buckets, counts):
+                cum += c
+                yield f"{self.name}_bucket", {**base, "le": _fmt(bound)}, cum
+            yield f"{self.name}_bucket", {**base, "le": "+Inf"}, n
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, n
+
+
+class CallbackMetric(_Metric):
+    """
+    Value read at scrape time: `fn()` returns a number, or a dict of
+    label-value tuples → number for labelled metrics.
+    """
+
+    def __init__(self, name: str, fn: Callable[[], Any], help: str = "",
+                 kind: str = "gauge", labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn   = fn
+
+    def value(self, **labels: Any) -> float:
+        got = self.fn()
+        return float(got if not isinstance(got, dict) else got.get(self._key(labels), 0.0))
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        try:
+            got = self.fn()
+        except Exception as e:                  # a broken source must not kill the scrape
+            log.warning("metric %s callback failed: %s", self.name, e)
+            return
+        if not isinstance(got, dict):
+            got = {(): got}
+        for key, v in got.items():
+            yield self.name, dict(zip(self.labels, key)), float(v)
+
+
+# ────────── registry ───────────────────────────────────────────────────
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, name: str, factory: Callable[[], _Metric]) -> Any:
+        m = self._metrics.get(name)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(name)
+                if m is None:
+                    m = self._metrics[name] = factory()
+        return m
+
+    def counter(self, name: str, help: str = "", labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(name, lambda: Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str = "", labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_add(name, lambda: Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str = "", labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_add(name, lambda: Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, fn: Callable[[], Any], help: str = "",
+                 kind: str = "gauge", labels: Sequence[str] = ()) -> CallbackMetric:
+        with self._lock:                         # re-registering replaces the source
+            m = self._metrics[name] = CallbackMetric(name, fn, help, kind, labels)
+        return m
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for name in sorted(self._metrics):
+            m = self._metrics[name]
+            if m.help:
+                out.append(f"# HELP {name} {m.help}")
+            out.append(f"# TYPE {name} {m.kind}")
+            for sample, labels, v in m.samples():
+                out.append(f"{sample}{_labels(labels)} {_fmt(v)}")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """{sample name{labels}: value} — handy in tests and debug scripts."""
+        snap: Dict[str, Dict[str, float]] = {}
+        for name, m in list(self._metrics.items()):
+            snap[name] = {f"{s}{_labels(l)}": v for s, l, v in m.samples()}
+        return snap
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = lambda s: s.replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+REGISTRY = Registry()
+counter   = REGISTRY.counter
+gauge     = REGISTRY.gauge
+histogram = REGISTRY.histogram
+callback  = REGISTRY.callback
+get       = REGISTRY.get
+render    = REGISTRY.render
+snapshot  = REGISTRY.snapshot
+
+
+# ────────── per-request tallies ────────────────────────────────────────
+_TALLY: contextvars.ContextVar[Optional[Dict[str, float]]] = \
+    contextvars.ContextVar("metrics_tally", default=None)
+
+
+@contextmanager
+def request_scope() -> Iterator[Dict[str, float]]:
+    tally_: Dict[str, float] = {}
+    token = _TALLY.set(tally_)
+    try:
+        yield tally_
+    finally:
+        _TALLY.reset(token)
+
+
+def tally(kind: str, n: float = 1) -> None:
+    t = _TALLY.get()
+    if t is not None:
+        t[kind] = t.get(kind, 0) + n
+
+
+# ────────── HTTP endpoint ──────────────────────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:                   # noqa: N802 (http.server API)
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_: Any) -> None:    # scrapes are not worth a log line
+        pass
+
+
+_SERVER: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def serve(port: int | None = None, addr: str = METRICS_ADDR) -> ThreadingHTTPServer:
+    """Start the /metrics endpoint once per process (port 0 → any free port)."""
+    global _SERVER
+    with _server_lock:
+        if _SERVER is None:
+            port = int(METRICS_PORT or 9464) if port is None else port
+            _SERVER = ThreadingHTTPServer((addr, port), _Handler)
+            threading.Thread(target=_SERVER.serve_forever, name="metrics-http",
+                             daemon=True).start()
+            log.info("metrics endpoint on http://%s:%d/metrics", addr, _SERVER.server_port)
+    return _SERVER
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "CallbackMetric",
+    "Registry",
+    "REGISTRY",
+    "counter",
+    "gauge",
+    "histogram",
+    "callback",
+    "get",
+    "render",
+    "snapshot",
+    "request_scope",
+    "tally",
+    "serve",
+]
@@ -0,0 +1,331 @@
+"""
+backend.offline
+---------------
+Stubbed OpenAI and Supabase backends: the workflow runs without network
+(load tests, demos, CI).
+
+    from backend import offline
+    offline.install(recordings="replay.jsonl", latency_ms=40)
+
+• Plugs in below TracedTransport and ScheduledTransport
+  (`set_inner_transport` in backend.tracing / backend.openai_scheduler),
+  so spans, metrics, rate limiting and budgets all still run
+• Responses, first match wins:
+    1. recordings – exchanges captured with `install(record=path)`
+       against the live services; embeddings are kept per text (batches
+       coalesce differently from run to run), everything else by
+       method + path + body, then by method + path
+    2. defaults   – deterministic hash embeddings, a canned chat
+       completion (SSE when streamed), empty PostgREST results, a few
+       placeholder chunks for match_vectors, 404 for Storage
+• `latency_ms` (± `jitter` of it) is slept per stubbed call to mimic
+  network time
+• `install(record=path)` passes calls through to the network and appends
+  what came back to *path*; `uninstall()` restores the network path
+
+Point EMBED_CACHE_PATH / LLM_CACHE_PATH at scratch files for offline runs
+so stub vectors never land in the real caches.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from backend import openai_scheduler, tracing
+
+log = logging.getLogger(__name__)
+
+DIMS        = 1536                              # text-embedding-3-small
+CHAT_ANSWER = "Offline stub answer."
+
+Exchange = Tuple[int, Dict[str, str], bytes]    # status, headers, body
+
+
+def _json_body(raw: bytes) -> Any:
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def _body_key(raw: bytes) -> str:
+    data = _json_body(raw)
+    canon = json.dumps(data, sort_keys=True).encode() if data is not None else raw
+    return hashlib.sha1(canon).hexdigest()
+
+
+def _embed_texts(path: str, data: Any) -> Optional[List[str]]:
+    """Texts of an embedding request (edge function or OpenAI), else None."""
+    if not isinstance(data, dict):
+        return None
+    if path.endswith("/functions/v1/embed"):
+        return list(data.get("texts") or [])
+    if path.endswith("/embeddings"):
+        texts = data.get("input")
+        return [texts] if isinstance(texts, str) else list(texts or [])
+    return None
+
+
+def hash_vector(text: str, dims: int = DIMS) -> List[float]:
+    """Deterministic unit vector for *text* (same text → same vector)."""
+    rnd = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vec = [rnd.gauss(0.0, 1.0) for _ in range(dims)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+# ────────── recordings ─────────────────────────────────────────────────
+class Recordings:
+    """
+    JSONL of recorded exchanges. Lines are either
+      {"text": …, "vector": […]}                               (embedding)
+      {"method", "path", "body_key", "status", "headers", "body"}  (other)
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.vectors: Dict[str, List[float]] = {}
+        self.exact:   Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.by_path: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path is not None and Path(path).exists():
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        self.add(json.loads(line))
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if "vector" in entry:
+                self.vectors[entry["text"]] = entry["vector"]
+                return
+            key = (entry["method"], entry["path"])
+            self.exact[(*key, entry.get("body_key", ""))] = entry
+            self.by_path[key] = entry
+
+    def lookup(self, method: str, path: str, raw: bytes) -> Optional[Dict[str, Any]]:
+        return (self.exact.get((method, path, _body_key(raw)))
+                or self.by_path.get((method, path)))
+
+    def __len__(self) -> int:
+        return len(self.vectors) + len(self.exact)
+
+
+class StubBackend:
+    """Answers requests from recordings, then from built-in defaults."""
+
+    def __init__(self, recordings: Recordings | None = None,
+                 latency_ms: float = 0.0, jitter: float = 0.5):
+        self.recordings = recordings or Recordings()
+        self.latency_ms = latency_ms
+        self.jitter     = jitter
+
+    def respond(self, method: str, path: str, raw: bytes) -> Exchange:
+        if self.latency_ms > 0:
+            spread = self.latency_ms * self.jitter
+            time.sleep(max(0.0, self.latency_ms + random.uniform(-spread, spread)) / 1000.0)
+
+        data = _json_body(raw)
+        texts = _embed_texts(path, data)
+        if texts is not None:
+            return self._embeddings(path, data, texts)
+        rec = self.recordings.lookup(method, path, raw)
+        if rec is not None:
+            body = rec.get("body")
+            return (rec.get("status", 200), rec.get("headers") or {},
+                    body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode())
+        if path.endswith("/chat/completions"):
+            return self._chat(data or {})
+        if path.startswith("/rest/"):
+            return self._rest(method, path)
+        return _json(404, {"error": "not_found", "message": f"offline: no stub for {path}"})
+
+    # ── defaults ──
+    def _vector(self, text: str) -> List[float]:
+        return self.recordings.vectors.get(text) or hash_vector(text)
+
+    def _embeddings(self, path: str, data: Dict[str, Any], texts: List[str]) -> Exchange:
+        vecs = [self._vector(t) for t in texts]
+        if path.endswith("/functions/v1/embed"):
+            return _json(200, {"embeddings": vecs})
+        b64 = data.get("encoding_format") == "base64"
+        tokens = sum(len(t) // 4 + 1 for t in texts)
+        return _json(200, {
+            "object": "list", "model": data.get("model", ""),
+            "data": [{"object": "embedding", "index": i,
+                      "embedding": base64.b64encode(struct.pack(f"<{len(v)}f", *v)).decode()
+                      if b64 else v}
+                     for i, v in enumerate(vecs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, data: Dict[str, Any]) -> Exchange:
+        model = data.get("model", "")
+        prompt_tokens = len(json.dumps(data.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 4,
+                 "total_tokens": prompt_tokens + 4}
+        if not data.get("stream"):
+            return _json(200, {
+                "id": "chatcmpl-offline", "object": "chat.completion", "created": 0,
+                "model": model, "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": CHAT_ANSWER}}],
+            })
+        first, *rest = CHAT_ANSWER.split(" ")
+        chunks = [{"delta": {"role": "assistant", "content": ""}, "finish_reason": None}]
+        chunks += [{"delta": {"content": piece}, "finish_reason": None}
+                   for piece in [first] + [" " + w for w in rest]]
+        chunks += [{"delta": {}, "finish_reason": "stop"}]
+        events = [json.dumps({"id": "chatcmpl-offline", "object": "chat.completion.chunk",
+                              "created": 0, "model": model,
+                              "choices": [{"index": 0, **c}]}) for c in chunks]
+        body = "".join(f"data: {e}\n\n" for e in events) + "data: [DONE]\n\n"
+        return 200, {"content-type": "text/event-stream"}, body.encode()
+
+    def _rest(self, method: str, path: str) -> Exchange:
+        if path.endswith("/rpc/match_vectors"):
+            rows = [{"payload": {"content": f"Offline placeholder chunk {i + 1}.",
+                                 "metadata": {}, "doc_id": "offline"},
+                     "score": 0.8 - 0.05 * i} for i in range(3)]
+            return _json(200, rows)
+        status = 201 if method == "POST" and "/rpc/" not in path else 200
+        return status, {"content-type": "application/json", "content-range": "*/0"}, b"[]"
+
+
+def _json(status: int, body: Any) -> Exchange:
+    return status, {"content-type": "application/json"}, json.dumps(body).encode()
+
+
+# ────────── recording (live passthrough) ───────────────────────────────
+class Recorder:
+    """Appends live exchanges to a recordings JSONL."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def record(self, method: str, path: str, raw: bytes, status: int,
+               headers: Dict[str, str], body: bytes) -> None:
+        entries: List[Dict[str, Any]] = []
+        texts = _embed_texts(path, _json_body(raw))
+        if texts is not None and status == 200:
+            entries = [{"text": t, "vector": v}
+                       for t, v in zip(texts, _response_vectors(path, _json_body(body)))]
+        elif texts is None:
+            parsed = _json_body(body)
+            entries = [{"method": method, "path": path, "body_key": _body_key(raw),
+                        "status": status,
+                        "headers": {k: v for k, v in headers.items()
+                                    if k.lower() in ("content-type", "content-range")},
+                        "body": parsed if parsed is not None else body.decode("utf-8", "replace")}]
+        with self._lock:
+            for e in entries:
+                self._fh.write(json.dumps(e) + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+def _response_vectors(path: str, data: Any) -> List[List[float]]:
+    if not isinstance(data, dict):
+        return []
+    if path.endswith("/functions/v1/embed"):
+        return data.get("embeddings") or []
+    out = []
+    for d in sorted(data.get("data") or [], key=lambda d: d.get("index", 0)):
+        emb = d.get("embedding")
+        if isinstance(emb, str):                # encoding_format="base64"
+            raw = base64.b64decode(emb)
+            emb = list(struct.unpack(f"<{len(raw) // 4}f", raw))
+        out.append(emb)
+    return out
+
+
+# ────────── transports (one per httpx flavour) ─────────────────────────
+def _stub_transport(mod: Any, backend: StubBackend) -> Any:
+    class _Stub(mod.BaseTransport):
+        def handle_request(self, request: Any) -> Any:
+            status, headers, body = backend.respond(request.method, request.url.path,
+                                                    request.read())
+            return mod.Response(status, headers=headers, content=body, request=request)
+    return _Stub()
+
+
+def _recording_transport(mod: Any, recorder: Recorder) -> Any:
+    class _Recording(mod.BaseTransport):
+        def __init__(self) -> None:
+            self.inner = mod.HTTPTransport()
+
+        def handle_request(self, request: Any) -> Any:
+            resp = self.inner.handle_request(request)
+            body = resp.read()
+            recorder.record(request.method, request.url.path, request.read(),
+                            resp.status_code, dict(resp.headers), body)
+            return resp
+    return _Recording()
+
+
+_STATE: Dict[str, Any] = {}
+_state_lock = threading.Lock()
+
+
+def install(recordings: str | Path | None = None, *, record: str | Path | None = None,
+            latency_ms: float = 0.0, jitter: float = 0.5) -> StubBackend | Recorder:
+    """Route OpenAI and Supabase calls to stubs (or through a recorder)."""
+    with _state_lock:
+        _uninstall()
+        if record is not None:
+            handler: StubBackend | Recorder = Recorder(record)
+            make: Callable[[Any, Any], Any] = _recording_transport
+        else:
+            handler = StubBackend(Recordings(recordings), latency_ms, jitter)
+            make = _stub_transport
+        tracing.set_inner_transport(make(httpx, handler))
+        openai_scheduler.set_inner_transport(make(openai_scheduler.httpx, handler))
+        _STATE["handler"] = handler
+        log.info("offline backends installed (%s)",
+                 f"recording to {record}" if record is not None else
+                 f"{len(handler.recordings)} recorded exchanges")
+        return handler
+
+
+def _uninstall() -> None:
+    handler = _STATE.pop("handler", None)
+    tracing.set_inner_transport(None)
+    openai_scheduler.set_inner_transport(None)
+    if isinstance(handler, Recorder):
+        handler.close()
+
+
+def uninstall() -> None:
+    """Back to the network."""
+    with _state_lock:
+        _uninstall()
+
+
+def installed() -> bool:
+    return "handler" in _STATE
+
+
+__all__ = [
+    "Recordings",
+    "StubBackend",
+    "Recorder",
+    "hash_vector",
+    "install",
+    "uninstall",
+    "installed",
+]
@@ -0,0 +1,492 @@
+"""
+backend.openai_scheduler
+------------------------
+One rate-limit budget for every OpenAI call in the process.
+
+• token buckets per model: requests/min and tokens/min (estimated from
+  the request body: ~4 chars per token + max_tokens)
+• priority classes: INTERACTIVE (default) is always admitted before
+  BATCH (re-embedding, bulk jobs) — `with priority(BATCH): ...`
+• bounded concurrency: at most OPENAI_MAX_CONCURRENCY calls in flight;
+  a streamed (SSE) response keeps its slot until its body is closed
+• 429 / 5xx / connection errors are retried with jittered exponential
+  backoff (honouring Retry-After), re-queued at the same priority so a
+  retry storm cannot jump the line
+
+The scheduler is an asyncio loop on a daemon thread. Sync callers block
+on `SCHEDULER.call(...)`; async callers `await SCHEDULER.acall(...)`.
+
+Every SDK is hooked at the HTTP layer: `http_client()` is an httpx client
+whose transport routes each request through the scheduler, so
+`openai_client()`, ChatOpenAI(http_client=…) and the embeddings calls
+share the same buckets. SDK-level retries are switched off there
+(`max_retries=0`) — the scheduler owns retrying. Each call is traced as
+an "openai.request" span (backend.tracing) and, inside a budgeted
+json_graph run, checked against and charged to that run's cost_guard
+(backend.budget).
+
+Environment vars
+----------------
+OPENAI_RPM               – default requests/min per model (default: 500)
+OPENAI_TPM               – default tokens/min per model (default: 200000)
+OPENAI_LIMITS            – JSON per-model overrides, e.g.
+                           {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+OPENAI_MAX_CONCURRENCY   – calls in flight (default: 8)
+OPENAI_MAX_RETRIES       – attempts after the first (default: 5)
+OPENAI_RETRY_BASE_SEC    – first backoff step (default: 0.5)
+OPENAI_RETRY_MAX_SEC     – backoff cap (default: 20)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:                                   # newer openai SDKs ship on the httpx2 fork
+    import httpx2 as httpx
+except ImportError:                    # pragma: no cover
+    import httpx
+
+from backend import budget, metrics, tracing
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH       = 1
+
+DEFAULT_RPM     = float(os.getenv("OPENAI_RPM", "500"))
+DEFAULT_TPM     = float(os.getenv("OPENAI_TPM", "200000"))
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+MAX_RETRIES     = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+RETRY_BASE_SEC  = float(os.getenv("OPENAI_RETRY_BASE_SEC", "0.5"))
+RETRY_MAX_SEC   = float(os.getenv("OPENAI_RETRY_MAX_SEC", "20"))
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class Limits(NamedTuple):
+    rpm: float
+    tpm: float
+
+
+def _limits_from_env() -> Dict[str, Limits]:
+    raw = json.loads(os.getenv("OPENAI_LIMITS") or "{}")
+    return {m: Limits(float(v.get("rpm", DEFAULT_RPM)), float(v.get("tpm", DEFAULT_TPM)))
+            for m, v in raw.items()}
+
+
+# ────────── token bucket ───────────────────────────────────────────────
+class TokenBucket:
+    """Refills `per_minute / 60` units per second up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate     = per_minute / 60.0
+        self.capacity = per_minute
+        self.level    = per_minute
+        self._ts      = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def wait_time(self, n: float) -> float:
+        """Seconds until *n* units are available (0 → now)."""
+        self._refill()
+        n = min(n, self.capacity)                # huge requests wait for a full bucket
+        return 0.0 if self.level >= n else (n - self.level) / self.rate
+
+    def take(self, n: float) -> None:
+        self._refill()
+        self.level -= min(n, self.capacity)
+
+
+# ────────── scheduler ──────────────────────────────────────────────────
+class Retry(Exception):
+    """
+    Raised by a scheduled callable to request another attempt. When the
+    retries are exhausted the caller gets `fallback` (if given) instead
+    of this exception — e.g. the last 429 response for the SDK to raise.
+    """
+
+    def __init__(self, fallback: Any = None, after: Optional[float] = None):
+        super().__init__("retry requested")
+        self.fallback = fallback
+        self.after    = after
+
+
+class Held:
+    """
+    Returned by a scheduled callable whose work outlives the call — a
+    streamed response still being read. The caller gets this object back
+    and the concurrency slot stays taken until `release()`.
+    """
+
+    def __init__(self, value: Any):
+        self.value = value
+        self._release: Callable[[], None] | None = None
+        self._done = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+            fn = self._release
+        if fn is not None:
+            fn()
+
+
+class _Job:
+    __slots__ = ("fn", "model", "tokens", "priority", "future", "attempt")
+
+    def __init__(self, fn, model, tokens, priority, future):
+        self.fn, self.model, self.tokens = fn, model, tokens
+        self.priority, self.future, self.attempt = priority, future, 0
+
+
+class Scheduler:
+    def __init__(
+        self,
+        *,
+        limits: Dict[str, Limits] | None = None,
+        default: Limits = Limits(DEFAULT_RPM, DEFAULT_TPM),
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        retry_base: float = RETRY_BASE_SEC,
+        retry_max: float = RETRY_MAX_SEC,
+    ):
+        self.limits          = dict(limits or {})
+        self.default         = default
+        self.max_concurrency = max_concurrency
+        self.max_retries     = max_retries
+        self.retry_base      = retry_base
+        self.retry_max       = retry_max
+        self.counters        = {"calls": 0, "retries": 0, "waited_sec": 0.0}
+
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._heap: List[Tuple[int, int, _Job]] = []
+        self._seq  = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._start_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="openai-call")
+
+    # ── public ──
+    def submit(self, fn: Callable[[], Any], *, model: str, tokens: float = 0,
+               priority: int = INTERACTIVE) -> Future:
+        future: Future = Future()
+        job  = _Job(fn, model, tokens, priority, future)
+        loop = self._ensure_loop()
+        loop.call_soon_threadsafe(self._push, job)
+        return future
+
+    def call(self, fn: Callable[[], Any], *, model: str, tokens: float = 0,
+             priority: int = INTERACTIVE) -> Any:
+        return self.submit(fn, model=model, tokens=tokens, priority=priority).result()
+
+    async def acall(self, fn: Callable[[], Any], *, model: str, tokens: float = 0,
+                    priority: int = INTERACTIVE) -> Any:
+        return await asyncio.wrap_future(
+            self.submit(fn, model=model, tokens=tokens, priority=priority))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters, queued=len(self._heap))
+
+    # ── loop plumbing ──
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def _main() -> None:
+                        asyncio.set_event_loop(loop)
+                        self._wakeup = asyncio.Event()
+                        self._slots  = asyncio.Semaphore(self.max_concurrency)
+                        loop.create_task(self._dispatch())
+                        ready.set()
+                        loop.run_forever()
+
+                    threading.Thread(target=_main, name="openai-scheduler",
+                                     daemon=True).start()
+                    ready.wait()
+                    self._loop = loop
+        return self._loop
+
+    def _push(self, job: _Job) -> None:
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _bucket(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        b = self._buckets.get(model)
+        if b is None:
+            lim = self.limits.get(model, self.default)
+            b = self._buckets[model] = (TokenBucket(lim.rpm), TokenBucket(lim.tpm))
+        return b
+
+    def _delay(self, job: _Job) -> float:
+        req, tok = self._bucket(job.model)
+        return max(req.wait_time(1), tok.wait_time(job.tokens))
+
+    async def _dispatch(self) -> None:
+        while True:
+            while not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self._slots.acquire()
+            while True:
+                job = self._heap[0][2]              # best priority, FIFO within it
+                delay = self._delay(job)
+                if delay <= 0:
+                    break
+                self.counters["waited_sec"] += delay
+                self._wakeup.clear()                # a better job may arrive meanwhile
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            heapq.heappop(self._heap)
+            req, tok = self._bucket(job.model)
+            req.take(1)
+            tok.take(job.tokens)
+            asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job: _Job) -> None:
+        loop = asyncio.get_running_loop()
+        released = False
+        try:
+            self.counters["calls"] += 1
+            result = await loop.run_in_executor(self._pool, job.fn)
+        except Exception as e:                     # noqa: BLE001 — decide below
+            retry_after = _retry_after(e)
+            if retry_after is False or job.attempt >= self.max_retries:
+                if isinstance(e, Retry) and e.fallback is not None:
+                    job.future.set_result(e.fallback)
+                else:
+                    job.future.set_exception(e)
+                return
+            job.attempt += 1
+            self.counters["retries"] += 1
+            self._slots.release()
+            released = True
+            backoff = min(self.retry_max, self.retry_base * 2 ** (job.attempt - 1))
+            delay = max(retry_after or 0.0, backoff * random.uniform(0.5, 1.5))
+            log.warning("openai %s: retry %d in %.2fs (%s)", job.model, job.attempt, delay, e)
+            await asyncio.sleep(delay)
+            self._push(job)
+        else:
+            if isinstance(result, Held):             # slot goes back on release()
+                result._release = lambda: loop.call_soon_threadsafe(self._slots.release)
+                released = True
+            job.future.set_result(result)
+        finally:
+            if not released:
+                self._slots.release()
+
+
+def _retry_after(exc: BaseException) -> float | None | bool:
+    """Retry hint for *exc*: seconds, None (use backoff) or False (give up)."""
+    if isinstance(exc, Retry):
+        return exc.after
+    if isinstance(exc, httpx.TransportError):
+        return None
+    status = getattr(exc, "status_code", None)
+    if status in _RETRY_STATUS:
+        return _header_delay(getattr(getattr(exc, "response", None), "headers", {}))
+    return False
+
+
+def _header_delay(headers: Any) -> float | None:
+    value = headers.get("retry-after-ms") if headers else None
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after") if headers else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# ────────── priority context ───────────────────────────────────────────
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("openai_priority",
+                                                                default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Run OpenAI calls made in this block at *level* (e.g. BATCH)."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+SCHEDULER = Scheduler(limits=_limits_from_env())
+
+_REQUESTS = metrics.counter("openai_requests_total", "OpenAI HTTP requests", ["model", "status"])
+_TOKENS   = metrics.counter("openai_tokens_total",
+                            "OpenAI tokens (reported usage, else estimate)", ["model"])
+metrics.callback("openai_queue_depth", lambda: SCHEDULER.stats()["queued"],
+                 "OpenAI calls waiting for a rate-limit slot")
+metrics.callback("openai_retries_total", lambda: SCHEDULER.counters["retries"],
+                 "OpenAI calls retried by the scheduler", kind="counter")
+
+
+# ────────── HTTP-layer hook ────────────────────────────────────────────
+def _estimate(body: bytes) -> Tuple[str, float]:
+    """(model, token estimate) from an OpenAI JSON request body."""
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return "unknown", len(body) / 4
+    completion = data.get("max_tokens") or data.get("max_completion_tokens") or 0
+    return str(data.get("model") or "unknown"), len(body) / 4 + float(completion)
+
+
+def _usage_tokens(resp: httpx.Response) -> Optional[float]:
+    """`usage.total_tokens` of a JSON response (streams are not buffered)."""
+    if not resp.headers.get("content-type", "").startswith("application/json"):
+        return None
+    try:
+        usage = json.loads(resp.read()).get("usage") or {}
+    except (ValueError, AttributeError):
+        return None
+    return usage.get("total_tokens")
+
+
+_INNER_OVERRIDE: httpx.BaseTransport | None = None
+
+
+def set_inner_transport(transport: httpx.BaseTransport | None) -> httpx.BaseTransport | None:
+    """
+    Send every ScheduledTransport's requests to *transport* instead of the
+    network (None restores it); scheduling, budgets and metrics still
+    apply. Returns the previous override (see backend.offline).
+    """
+    global _INNER_OVERRIDE
+    prev, _INNER_OVERRIDE = _INNER_OVERRIDE, transport
+    return prev
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives the scheduler slot back when closed."""
+
+    def __init__(self, inner: Any, held: Held):
+        self.inner = inner
+        self.held  = held
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.inner
+
+    def close(self) -> None:
+        try:
+            self.inner.close()
+        finally:
+            self.held.release()
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """httpx transport that admits every request through the scheduler."""
+
+    def __init__(self, inner: httpx.BaseTransport | None = None,
+                 scheduler: Scheduler | None = None):
+        self.inner     = inner or httpx.HTTPTransport()
+        self.scheduler = scheduler or SCHEDULER
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        model, tokens = _estimate(body)
+
+        def _send() -> httpx.Response:
+            resp = (_INNER_OVERRIDE or self.inner).handle_request(request)
+            if resp.status_code in _RETRY_STATUS:
+                resp.read()                      # buffered, safe to hand back later
+                raise Retry(fallback=resp, after=_header_delay(resp.headers))
+            if (resp.headers.get("content-type", "").startswith("text/event-stream")
+                    and not resp.is_closed):     # a body already in memory holds nothing
+                return Held(resp)                # in flight until the stream is closed
+            return resp
+
+        run_budget = budget.current()            # json_graph cost_guard, if any
+        if run_budget is not None:
+            run_budget.check(calls=1, tokens=tokens)
+        status = "error"
+        try:
+            with tracing.span("openai.request", model=model, path=request.url.path,
+                              est_tokens=round(tokens)) as sp:
+                resp = self.scheduler.call(_send, model=model, tokens=tokens,
+                                           priority=_PRIORITY.get())
+                if isinstance(resp, Held):
+                    held, resp = resp, resp.value
+                    resp.stream = _ReleasingStream(resp.stream, held)
+                status = str(resp.status_code)
+                used = _usage_tokens(resp) or tokens
+                sp.set(status=resp.status_code, tokens=round(used),
+                       bytes_out=len(body), bytes_in=tracing.body_size(resp))
+        finally:
+            _REQUESTS.inc(model=model, status=status)
+
+        _TOKENS.inc(used, model=model)
+        metrics.tally("tokens", used)
+        if run_budget is not None:
+            run_budget.charge(calls=1, tokens=used)
+        return resp
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+_HTTP: httpx.Client | None = None
+_http_lock = threading.Lock()
+
+
+def http_client() -> httpx.Client:
+    """Shared httpx client (keep-alive pool) routed through the scheduler."""
+    global _HTTP
+    if _HTTP is None:
+        with _http_lock:
+            if _HTTP is None:
+                import openai
+                _HTTP = openai.DefaultHttpxClient(transport=ScheduledTransport())
+    return _HTTP
+
+
+def openai_client(**kwargs: Any):
+    """`openai.OpenAI` sharing the scheduler's budget (SDK retries off)."""
+    import openai
+    kwargs.setdefault("max_retries", 0)
+    return openai.OpenAI(http_client=http_client(), **kwargs)
+
+
+__all__ = [
+    "INTERACTIVE",
+    "BATCH",
+    "Limits",
+    "TokenBucket",
+    "Retry",
+    "Held",
+    "Scheduler",
+    "ScheduledTransport",
+    "set_inner_transport",
+    "SCHEDULER",
+    "priority",
+    "http_client",
+    "openai_client",
+]
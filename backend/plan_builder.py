@@ -3,8 +3,10 @@ from typing import Dict, List
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 import backend.processors as processors
+from backend.openai_scheduler import http_client
 
-_llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+_llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0,
+                  http_client=http_client(), max_retries=0)
 
 _prompt = ChatPromptTemplate.from_messages([
     (
@@ -18,7 +20,7 @@ _prompt = ChatPromptTemplate.from_messages([
 ])
 
 def generate_plan(goal: str) -> List[Dict[str, str]]:
-    palette = ", ".join(sorted(processors.REG.keys()))
+    palette = ", ".join(processors.REG.available())
     resp = _llm.invoke(_prompt.format(goal=goal, palette=palette))
     try:
         return eval(resp.content)   # ← quick-and-dirty JSON parse
@@ -1,21 +1,123 @@
+"""
+backend.processors
+──────────────────
+Processor-chain registry used by the Process node.
+
+• Built-ins (doc_draft_chain, generic_function_chain, policy_qna_chain)
+  are registered statically.
+• Rows from `processor_chains` are fetched, validated and compiled the
+  first time their chain_id is requested, then cached with a TTL check
+  (see backend.chain_registry). Nothing touches the network at import.
+
+Environment vars
+----------------
+PROCESSOR_CHAIN_TTL_SEC   – re-check interval for loaded chains (default: 60)
+PROCESSOR_CHAIN_MAX       – max dynamic chains kept in memory (default: 256)
+"""
 from __future__ import annotations
-import logging, os
-from typing import Dict, Any
+import logging, os, threading
+from typing import Dict, Any, List, Optional
 
 from pydantic import ValidationError
 from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from supabase import create_client
 
+from backend import metrics, streaming
+from backend.answer_cache  import ANSWERS, cached_answer
+from backend.chain_registry import LazyRegistry
 from backend.schema        import ChainDef, GraphDef
 from backend.json_executor import JSONGraphExecutor
+from backend.openai_scheduler import http_client
+from backend.tracing       import supabase_options
 from backend.tools.docx_render      import DocxRender
 from backend.tools.function_runner  import run as function_runner
 from backend.vector_search          import SupaRetriever
 
 log = logging.getLogger(__name__)
 
-REG: Dict[str, Any] = {}
+# ───────────────────── lazy loader from Supabase ───────────────────────
+_SB = None
+_sb_lock = threading.Lock()
+
+def _sb():
+    global _SB
+    if _SB is None:
+        with _sb_lock:
+            if _SB is None:
+                _SB = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"),
+                                    options=supabase_options())
+    return _SB
+
+def _creds() -> bool:
+    if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"):
+        return True
+    log.warning("SUPABASE creds not set; external chains unavailable")
+    return False
+
+def _fetch_chain(chain_id: str) -> Optional[Dict[str, Any]]:
+    if not _creds():
+        return None
+    rows = (_sb().table("processor_chains")
+              .select("*")
+              .eq("chain_id", chain_id)
+              .eq("enabled", True)
+              .eq("type", "chain")
+              .limit(1)
+              .execute()
+              .data or [])
+    return rows[0] if rows else None
+
+def _list_chain_ids() -> List[str]:
+    if not _creds():
+        return []
+    rows = (_sb().table("processor_chains")
+              .select("chain_id")
+              .eq("enabled", True)
+              .eq("type", "chain")
+              .execute()
+              .data or [])
+    return [r["chain_id"] for r in rows]
+
+_BUILDS = metrics.counter("processor_chain_builds_total",
+                          "dynamic chains compiled from processor_chains", ["type", "result"])
+metrics.callback("answer_cache_hits_total", lambda: ANSWERS.stats()["hits"],
+                 "policy Q&A semantic cache hits", kind="counter")
+metrics.callback("answer_cache_misses_total", lambda: ANSWERS.stats()["misses"],
+                 "policy Q&A semantic cache misses", kind="counter")
+
+def _compile_chain(cj: Dict[str, Any]) -> Any:
+    try:
+        if cj.get("type") == "json_graph":
+            ex = JSONGraphExecutor(GraphDef(**cj))
+            ex.plan                                # compile now, fail fast
+            return ex
+        spec = ChainDef(**cj)
+        return RunnableLambda(
+            lambda payload, s=spec: function_runner(
+                s.steps[0].class_path, **(payload.get("inputs") or {}))
+        )
+    except ValidationError as e:
+        raise ValueError(f"invalid chain_json: {e}") from e
+
+def _build_chain(row: Dict[str, Any]) -> Any:
+    cj = row["chain_json"]
+    kind = cj.get("type") or "function"
+    try:
+        chain = _compile_chain(cj)
+    except ValueError:
+        _BUILDS.inc(type=kind, result="invalid")
+        raise
+    _BUILDS.inc(type=kind, result="ok")
+    return chain
+
+REG = LazyRegistry(
+    _fetch_chain,
+    _build_chain,
+    list_ids=_list_chain_ids,
+    ttl=float(os.getenv("PROCESSOR_CHAIN_TTL_SEC", "60")),
+    max_items=int(os.getenv("PROCESSOR_CHAIN_MAX", "256")),
+)
 
 # ────────────────────────── built-in chains ────────────────────────────
 def _doc_chain(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -28,49 +130,39 @@ def _generic_chain(payload: Dict[str, Any]) -> Dict[str, Any]:
     return function_runner(fp, **(payload.get("inputs") or {}))
 REG["generic_function_chain"] = RunnableLambda(_generic_chain)
 
-_LLM = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+_LLM: ChatOpenAI | None = None
+def _llm() -> ChatOpenAI:
+    global _LLM
+    if _LLM is None:
+        _LLM = ChatOpenAI(model_name="gpt-4o-mini", temperature=0,
+                          http_client=http_client(), max_retries=0)
+    return _LLM
+
 def _policy_qna(payload: Dict[str, Any]) -> Dict[str, Any]:
     q = payload.get("prompt") or "(no question)"
-    retr = SupaRetriever("vector_chunks", doc_id="handbook_2024", k=6)
-    ctx  = "\n\n".join(d.page_content for d in retr.get_relevant_documents(q))
-    ans  = _LLM.invoke(f"Answer strictly from context.\n\nQuestion: {q}\n\nContext:\n{ctx}").content
-    return {"ui_event":"text","content":ans}
+    qv = payload.get("query_vec") if payload.get("prompt") else None
+    def _rag() -> Dict[str, Any]:
+        retr = SupaRetriever("vector_chunks", doc_id="handbook_2024", k=6)
+        ctx  = "\n\n".join(d.page_content for d in retr.get_relevant_documents(q, q_vec=qv))
+        msg  = f"Answer strictly from context.\n\nQuestion: {q}\n\nContext:\n{ctx}"
+        if streaming.active():                  # push tokens to the UI as they come
+            parts = []
+            for chunk in _llm().stream(msg):
+                streaming.emit(chunk.content)
+                parts.append(chunk.content)
+            ans = "".join(parts)
+        else:
+            ans = _llm().invoke(msg).content
+        return {"ui_event":"text","content":ans}
+    return cached_answer(q, "handbook_2024", qv, _rag)
 REG["policy_qna_chain"] = RunnableLambda(_policy_qna)
 
-# ───────────────────── dynamic loader from Supabase ─────────────────────
-def _load_external_chains() -> None:
-    url = os.getenv("SUPABASE_URL"); key = os.getenv("SUPABASE_KEY")
-    if not url or not key:
-        log.warning("SUPABASE creds not set; external chains skipped")
-        return
-    sb   = create_client(url, key)
-    rows = (sb.table("processor_chains")
-              .select("*")
-              .eq("enabled", True)
-              .eq("type", "chain")
-              .execute()
-              .data or [])
-    for row in rows:
-        cid, cj = row["chain_id"], row["chain_json"]
-        if cid in REG:
-            continue
-        try:
-            if cj.get("type") == "json_graph":
-                spec = GraphDef(**cj)
-                REG[cid] = JSONGraphExecutor(spec)
-            else:
-                spec = ChainDef(**cj)
-                REG[cid] = RunnableLambda(
-                    lambda payload, s=spec: function_runner(
-                        s.steps[0].class_path, **(payload.get("inputs") or {}))
-                )
-            log.info("Loaded chain %s", cid)
-        except ValidationError as e:
-            log.error("Skipping chain %s: %s", cid, e)
-
-_load_external_chains()
-
 # ───────────────────── back-compat shim (legacy callers) ─────────────────
 from backend.graph import reload_graph as _reload_graph
 def reload_registry() -> None:        # legacy alias
+    REG.invalidate()
     _reload_graph()
+
+def invalidate_chain(chain_id: str) -> None:
+    """Drop one cached chain, e.g. right after its row was edited."""
+    REG.invalidate(chain_id)
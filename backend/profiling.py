@@ -0,0 +1,180 @@
+"""
+backend.profiling
+-----------------
+Cost / latency breakdown of one workflow run — what
+`run_workflow(..., profile=True)` returns under "profile".
+
+• Built on backend.tracing: a `Profiler` is attached as a span sink for
+  the run, so it sees the graph-node spans and every outbound call in
+  them, including the ones made from LangGraph / json_graph threads
+• Per node: wall time, CPU time of the node's thread
+  (`time.thread_time`), network time (outbound spans below the node)
+• Per run: wall / CPU / network time, call counts (embedding lookups,
+  LLM and other OpenAI requests, Supabase RPC / REST / Storage /
+  Functions), bytes sent and received, OpenAI tokens, and the slowest
+  outbound calls
+• `cpu=True` also runs cProfile inside each node (in the thread that
+  executes it) and adds the top functions by cumulative time
+
+Remote embeddings coalesced by the edge-embed micro-batcher run on the
+batcher's thread and are not attributed to the request.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend import tracing
+
+CPU_TOP = 25                                    # functions listed per node profile
+
+
+def _outbound(sp: tracing.Span) -> bool:
+    return sp.name == "openai.request" or sp.name.startswith("supabase.")
+
+
+class Profiler:
+    """
+    Span sink for one run. *nodes* are the span names treated as
+    workflow nodes (the graph's node functions).
+    """
+
+    def __init__(self, nodes: Iterable[str], cpu: bool = False):
+        self.nodes = frozenset(nodes)
+        self.cpu   = cpu
+        self.spans: List[tracing.Span] = []
+        self._open: Dict[str, tuple] = {}       # span_id → (thread_time, profiler)
+        self._cpu_ms: Dict[str, float] = {}
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    # ── sink protocol (called in the thread running the span) ──
+    def on_start(self, sp: tracing.Span) -> None:
+        if sp.name not in self.nodes:
+            return
+        prof = None
+        if self.cpu:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:                  # another profiler owns this thread
+                prof = None
+        self._open[sp.span_id] = (time.thread_time(), prof)
+
+    def on_end(self, sp: tracing.Span) -> None:
+        opened = self._open.pop(sp.span_id, None)
+        with self._lock:
+            self.spans.append(sp)
+            if opened is None:
+                return
+            t0, prof = opened
+            self._cpu_ms[sp.span_id] = (time.thread_time() - t0) * 1000.0
+            if prof is not None:
+                prof.disable()
+                if sp.name in self._stats:
+                    self._stats[sp.name].add(prof)
+                else:
+                    self._stats[sp.name] = pstats.Stats(prof)
+
+    # ── report ──
+    def report(self, tally: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        by_id = {sp.span_id: sp for sp in spans}
+
+        def owner(sp: tracing.Span) -> Optional[tracing.Span]:
+            """Nearest node ancestor; None when *sp* sits below another call."""
+            parent = by_id.get(sp.parent_id) if sp.parent_id else None
+            while parent is not None:
+                if _outbound(parent):
+                    return None
+                if parent.name in self.nodes:
+                    return parent
+                parent = by_id.get(parent.parent_id) if parent.parent_id else None
+            return sp                           # outside any node: still counted
+
+        nodes: Dict[str, Dict[str, float]] = {}
+        for sp in spans:
+            if sp.name in self.nodes:
+                row = nodes.setdefault(sp.name, {"wall_ms": 0.0, "cpu_ms": 0.0,
+                                                 "network_ms": 0.0})
+                row["wall_ms"] += sp.duration_ms
+                row["cpu_ms"]  += self._cpu_ms.get(sp.span_id, 0.0)
+
+        calls: Dict[str, int] = {"embed": 0, "llm": 0, "openai": 0, "supabase": 0, "rpc": 0}
+        sent = received = 0
+        network_ms = 0.0
+        outbound: List[tracing.Span] = []
+        for sp in spans:
+            if sp.name == "embed":
+                calls["embed"] += 1
+            if not _outbound(sp):
+                continue
+            kind = sp.name.split(".", 1)[1]
+            if sp.name == "openai.request":
+                calls["openai"] += 1
+                if "chat/completions" in str(sp.attrs.get("path", "")):
+                    calls["llm"] += 1
+            else:
+                calls["supabase"] += 1
+                calls[kind] = calls.get(kind, 0) + 1
+            node = owner(sp)
+            if node is None:                    # nested in another outbound call
+                continue
+            outbound.append(sp)
+            network_ms += sp.duration_ms
+            sent       += int(sp.attrs.get("bytes_out") or 0)
+            received   += int(sp.attrs.get("bytes_in") or 0)
+            if node is not sp:
+                nodes[node.name]["network_ms"] += sp.duration_ms
+
+        root = next((sp for sp in spans if sp.name == "run_workflow"), None)
+        report: Dict[str, Any] = {
+            "run_id":     root.trace_id if root else None,
+            "wall_ms":    round(root.duration_ms, 3) if root else None,
+            "cpu_ms":     round(sum(n["cpu_ms"] for n in nodes.values()), 3),
+            "network_ms": round(network_ms, 3),
+            "nodes":      {k: {f: round(v, 3) for f, v in row.items()}
+                           for k, row in nodes.items()},
+            "calls":      calls,
+            "bytes":      {"sent": sent, "received": received},
+            "tokens":     round((tally or {}).get("tokens", 0)),
+            "slowest":    [{"name": sp.name, "ms": round(sp.duration_ms, 3), **sp.attrs}
+                           for sp in sorted(outbound, key=lambda s: -s.duration_ms)[:5]],
+        }
+        if self.cpu:
+            report["cpu_profile"] = {name: _top(stats) for name, stats in self._stats.items()}
+        return report
+
+
+def _top(stats: pstats.Stats, limit: int = CPU_TOP) -> str:
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Plain-text rendering for terminals and logs."""
+    lines = [f"run {report['run_id']}: {report['wall_ms']:.1f} ms wall, "
+             f"{report['cpu_ms']:.1f} ms CPU, {report['network_ms']:.1f} ms network"]
+    lines.append(f"{'node':16} {'wall ms':>10} {'cpu ms':>10} {'net ms':>10}")
+    for name, row in report["nodes"].items():
+        lines.append(f"{name:16} {row['wall_ms']:10.1f} {row['cpu_ms']:10.1f} "
+                     f"{row['network_ms']:10.1f}")
+    lines.append("calls  " + ", ".join(f"{k}={v}" for k, v in report["calls"].items()))
+    lines.append(f"bytes  sent={report['bytes']['sent']} received={report['bytes']['received']}"
+                 f"   tokens={report['tokens']}")
+    for s in report["slowest"]:
+        detail = s.get("fn") or s.get("table") or s.get("path") or s.get("model") or ""
+        lines.append(f"  {s['ms']:9.1f} ms  {s['name']} {detail}")
+    for name, text in report.get("cpu_profile", {}).items():
+        lines += ["", f"── cProfile: {name} ──", text.rstrip()]
+    return "\n".join(lines)
+
+
+__all__ = ["Profiler", "format_report"]
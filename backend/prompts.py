@@ -1,28 +1,160 @@
+"""
+backend.prompts
+---------------
+Prompt texts from the `prompts` table, served from memory.
+
+• connections come from a small psycopg2 ThreadedConnectionPool, opened
+  on first use — no handshake per `get_prompt`; callers beyond
+  PROMPT_DB_POOL_MAX wait for a free connection (the pool itself would
+  raise PoolError)
+• texts are cached per (name, version) for PROMPT_CACHE_TTL_SEC;
+  `version=None` ("latest") is cached as its own key
+• `preload_prompts()` fills the cache with one query (call at startup)
+• `invalidate_prompts(name)` after editing a prompt row
+
+Environment vars
+----------------
+DATABASE_URL           – Postgres DSN
+PROMPT_DB_POOL_MIN     – connections kept open (default: 1)
+PROMPT_DB_POOL_MAX     – max concurrent connections (default: 4)
+PROMPT_CACHE_TTL_SEC   – seconds a cached text is trusted (default: 300)
+"""
+from __future__ import annotations
+
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+log = logging.getLogger(__name__)
+
+POOL_MIN  = int(os.getenv("PROMPT_DB_POOL_MIN", "1"))
+POOL_MAX  = int(os.getenv("PROMPT_DB_POOL_MAX", "4"))
+CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL_SEC", "300"))
+
+
+# ────────── connection pool ────────────────────────────────────────────
+_POOL: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)   # one per pooled connection
+
+
+def _pool() -> ThreadedConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _pool_lock:
+            if _POOL is None:
+                _POOL = ThreadedConnectionPool(POOL_MIN, POOL_MAX, os.getenv("DATABASE_URL"))
+    return _POOL
+
+
+@contextmanager
+def _connection() -> Iterator["psycopg2.extensions.connection"]:
+    """Borrow a pooled connection; broken ones are closed, not returned."""
+    pool = _pool()
+    with _slots:                              # getconn() raises when exhausted
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken and not conn.closed:
+                try:
+                    conn.rollback()           # read-only: end the implicit txn
+                except psycopg2.Error:
+                    broken = True
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def _query(sql: str, args: tuple) -> list:
+    # one retry on a fresh connection: pooled ones may have been dropped server-side
+    for attempt in (1, 2):
+        try:
+            with _connection() as conn, conn.cursor() as cur:
+                cur.execute(sql, args)
+                return cur.fetchall()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if attempt == 2:
+                raise
+            log.warning("prompts: stale DB connection, retrying")
+    return []
+
+
+# ────────── prompt cache ───────────────────────────────────────────────
+_CACHE: Dict[Tuple[str, Optional[int]], Tuple[str, float]] = {}
+_cache_lock = threading.Lock()
+
+
+def _remember(name: str, version: Optional[int], text: str) -> None:
+    with _cache_lock:
+        _CACHE[(name, version)] = (text, time.monotonic() + CACHE_TTL)
+
 
 def get_prompt(name, version=None):
-    # Connect using DATABASE_URL from environment
-    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
-    cur = conn.cursor()
+    hit = _CACHE.get((name, version))
+    if hit is not None and hit[1] > time.monotonic():
+        return hit[0]
+
     if version:
-        cur.execute(
+        rows = _query(
             "SELECT text FROM prompts WHERE name=%s AND version=%s ORDER BY updated_at DESC LIMIT 1",
             (name, version)
         )
     else:
-        cur.execute(
+        rows = _query(
             "SELECT text FROM prompts WHERE name=%s ORDER BY version DESC, updated_at DESC LIMIT 1",
             (name,)
         )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    if row:
-        return row[0]
+    if rows:
+        _remember(name, version, rows[0][0])
+        return rows[0][0]
     else:
         raise ValueError(f"Prompt '{name}' not found in DB.")
 
+
+def preload_prompts(names: Iterable[str] | None = None) -> int:
+    """
+    Cache every (name, version) — and each name's latest version — with a
+    single query. Returns the number of prompt versions loaded.
+    """
+    sql = ("SELECT DISTINCT ON (name, version) name, version, text FROM prompts "
+           "{where} ORDER BY name, version DESC, updated_at DESC")
+    if names is None:
+        rows = _query(sql.format(where=""), ())
+    else:
+        rows = _query(sql.format(where="WHERE name = ANY(%s)"), (list(names),))
+
+    seen = set()
+    for name, version, text in rows:             # highest version first per name
+        _remember(name, version, text)
+        if name not in seen:
+            _remember(name, None, text)
+            seen.add(name)
+    log.info("prompts: preloaded %d versions of %d prompts", len(rows), len(seen))
+    return len(rows)
+
+
+def invalidate_prompts(name: str | None = None) -> None:
+    """Forget cached texts for *name* (all versions), or everything."""
+    with _cache_lock:
+        if name is None:
+            _CACHE.clear()
+        else:
+            for key in [k for k in _CACHE if k[0] == name]:
+                del _CACHE[key]
+
+
+__all__ = ["get_prompt", "preload_prompts", "invalidate_prompts"]
+
+
 # Test Harness
 if __name__ == "__main__":
     try:
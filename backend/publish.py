@@ -3,6 +3,8 @@ import os, uuid
 from typing import Dict, Any
 from supabase import create_client
 
+from backend.router_index import invalidate_routing as _invalidate_routing
+
 url, key   = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
 TENANT     = os.getenv("TENANT_ID", "default")
 _SB        = create_client(url, key) if url and key else None
@@ -54,6 +56,8 @@ def publish_draft(draft_id: str) -> str:
         "tenant_id":          TENANT
     }).execute()
 
+    _invalidate_routing()
+
     # mark draft finished (no published_at column)
     _SB.table("wizard_drafts").update({"step": 99}).eq("draft_id", draft_id).execute()
 
@@ -0,0 +1,255 @@
+"""
+backend.router_index
+--------------------
+In-process nearest-neighbour index over `task_manifest`.
+
+The manifest table only holds tens to hundreds of rows, so instead of a
+`match_task_manifest_vec` RPC (plus a follow-up `select *`) per prompt we
+keep every enabled row in memory:
+
+• one C-contiguous float32 matrix of L2-normalised embeddings per tenant
+• top-k = a single mat-vec + `np.argpartition`
+• hits carry the full manifest row (minus the bulky embedding) plus
+  `sim` / `dist`, exactly what the Intent node needs
+
+    idx  = get_index()
+    hits = idx.search(q_vec, tenant="default", k=1, min_similarity=0.30)
+    sim, row = hits[0]
+
+The shared snapshot is a `VersionedCache`: it polls task_manifest's
+(row count, max updated_at) and merges only the changed rows, so newly
+published tasks become routable without a restart.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from backend.db_router import _to_vec, table_version
+from backend.versioned_cache import VersionedCache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+# ────────── per-tenant partition ───────────────────────────────────────
+class _Partition:
+    __slots__ = ("rows", "matrix")
+
+    def __init__(self, rows: List[Dict[str, Any]], vecs: List[np.ndarray]):
+        self.rows   = rows
+        mat         = np.ascontiguousarray(np.vstack(vecs), dtype=np.float32)
+        norms       = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0                 # zero rows stay zero
+        self.matrix = mat / norms
+
+    def search(self, q: np.ndarray, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        sims = self.matrix @ q
+        n    = sims.shape[0]
+        if k < n:
+            top = np.argpartition(-sims, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(float(sims[i]), self.rows[i]) for i in top]
+
+
+# ────────── public index ───────────────────────────────────────────────
+class RouterIndex:
+    """
+    Immutable snapshot of manifest rows + embeddings, partitioned by tenant.
+
+    Rows without a usable embedding are skipped; rows without a
+    `tenant_id` land in the "default" partition.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        *,
+        vec_key: str = "embedding",
+        tenant_key: str = "tenant_id",
+    ):
+        buckets: Dict[str, Tuple[List[Dict[str, Any]], List[np.ndarray]]] = {}
+        dim: int | None = None
+        for r in rows:
+            raw = r.get(vec_key)
+            if raw is None:
+                continue
+            try:
+                vec = raw if isinstance(raw, np.ndarray) else _to_vec(raw)
+            except (TypeError, ValueError) as e:
+                log.warning("router index: bad embedding for %s: %s",
+                            r.get("task") or r.get("task_id"), e)
+                continue
+            if dim is None:
+                dim = vec.shape[0]
+            elif vec.shape[0] != dim:
+                log.warning("router index: skipping %s (dim %d != %d)",
+                            r.get("task") or r.get("task_id"), vec.shape[0], dim)
+                continue
+            tenant = r.get(tenant_key) or DEFAULT_TENANT
+            row = {k: v for k, v in r.items() if k != vec_key}
+            bucket = buckets.setdefault(tenant, ([], []))
+            bucket[0].append(row)
+            bucket[1].append(vec)
+
+        self.dim = dim
+        self._parts: Dict[str, _Partition] = {
+            t: _Partition(rs, vs) for t, (rs, vs) in buckets.items()
+        }
+
+    def __len__(self) -> int:
+        return sum(len(p.rows) for p in self._parts.values())
+
+    @property
+    def tenants(self) -> List[str]:
+        return sorted(self._parts)
+
+    def search(
+        self,
+        q_vec: Sequence[float] | np.ndarray,
+        *,
+        tenant: str = DEFAULT_TENANT,
+        k: int = 1,
+        min_similarity: float = -1.0,
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Return up to *k* (similarity, row) pairs, best first, whose cosine
+        similarity is ≥ *min_similarity*. Rows come back with `sim` and
+        `dist` (= 1 − sim) keys added. An empty index (no embedded rows,
+        so no dim) has no hits for any query.
+        """
+        part = self._parts.get(tenant)
+        if part is None or self.dim is None or k <= 0:
+            return []
+        q = np.asarray(q_vec, dtype=np.float32)
+        if q.shape[0] != self.dim:
+            raise ValueError(f"query has dim {q.shape[0]}, index has {self.dim}")
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        return [
+            (sim, row | {"sim": sim, "dist": 1.0 - sim})
+            for sim, row in part.search(q, k)
+            if sim >= min_similarity
+        ]
+
+
+# ────────── process-wide snapshot ──────────────────────────────────────
+class _Snapshot(NamedTuple):
+    index: RouterIndex
+    rows:  Dict[str, Dict[str, Any]]      # enabled rows by task key
+    keys:  FrozenSet[str]                 # every key seen, enabled or not
+
+
+def _key(row: Dict[str, Any]) -> str:
+    return str(row.get("task") or row.get("task_id") or row.get("id"))
+
+
+def _client():
+    from backend.supabase import _SB
+    return _SB
+
+
+def load_manifest_rows() -> List[Dict[str, Any]]:
+    """Fetch every enabled task_manifest row (embedding included)."""
+    return (
+        _client().table("task_manifest")
+           .select("*")
+           .eq("enabled", True)
+           .execute()
+           .data
+        or []
+    )
+
+
+def _full_snapshot() -> _Snapshot:
+    rows = _client().table("task_manifest").select("*").execute().data or []
+    enabled = {_key(r): r for r in rows if r.get("enabled", True)}
+    return _Snapshot(RouterIndex(enabled.values()), enabled,
+                     frozenset(_key(r) for r in rows))
+
+
+def _delta_snapshot(prev: _Snapshot, old: Tuple[int, Any],
+                    new: Tuple[int, Any]) -> _Snapshot | None:
+    """
+    Fetch only rows touched since the previous max(updated_at) and merge
+    them in. Returns None (→ full reload) when deletes are suspected, i.e.
+    the row count no longer matches the keys we know about.
+    """
+    if old[1] is None:
+        return None
+    changed = (_client().table("task_manifest")
+                 .select("*")
+                 .gte("updated_at", old[1])   # re-merging is idempotent
+                 .execute()
+                 .data or [])
+    rows = dict(prev.rows)
+    keys = set(prev.keys)
+    for r in changed:
+        k = _key(r)
+        keys.add(k)
+        if r.get("enabled", True):
+            rows[k] = r
+        else:
+            rows.pop(k, None)
+    if len(keys) != new[0]:
+        return None
+    return _Snapshot(RouterIndex(rows.values()), rows, frozenset(keys))
+
+
+def _manifest_version() -> Tuple[int, Any]:
+    return table_version("task_manifest", _client())
+
+
+_SNAPSHOT: VersionedCache[_Snapshot] = VersionedCache(
+    _full_snapshot,
+    _manifest_version,
+    delta_loader=_delta_snapshot,
+    name="router_index",
+)
+
+
+def get_index() -> RouterIndex:
+    """Return the current snapshot; refreshes in the background on change."""
+    return _SNAPSHOT.get().index
+
+
+def reload_index() -> RouterIndex:
+    """Check the version now and rebuild if needed (blocking)."""
+    return _SNAPSHOT.refresh().index
+
+
+def invalidate() -> None:
+    """Called after a local publish so routing sees the new task at once."""
+    _SNAPSHOT.invalidate()
+
+
+def invalidate_routing() -> None:
+    """
+    Invalidate every routing snapshot in this process (router index,
+    db_router.task_index, backend.workflow's index if loaded). Other
+    processes pick the change up through their version polls.
+    """
+    import sys
+    from backend.db_router import invalidate_task_index
+
+    invalidate()
+    invalidate_task_index()
+    wf = sys.modules.get("backend.workflow")
+    if wf is not None:
+        wf.TASK_INDEX.invalidate()
+
+
+__all__ = [
+    "RouterIndex",
+    "get_index",
+    "reload_index",
+    "invalidate",
+    "invalidate_routing",
+    "load_manifest_rows",
+]
@@ -0,0 +1,73 @@
+"""
+backend.run_store
+-----------------
+Checkpoints for workflow runs that pause on a form.
+
+When Gather asks the user for fields, the state that Intent produced —
+the pinned manifest and the prompt embedding — is saved under a run id
+that travels with the `form` event. The resubmission passes the id back
+and the graph resumes at Gather, so the prompt is not re-embedded and
+the manifest is not re-queried (and cannot drift to another task if the
+manifest table changed in between).
+
+• In-process and thread-safe (one Streamlit server process)
+• Checkpoints expire after RUN_CHECKPOINT_TTL_SEC; the oldest are
+  dropped past RUN_CHECKPOINT_MAX
+• A missing / expired id is not an error — the run just starts over
+
+Environment vars
+----------------
+RUN_CHECKPOINT_TTL_SEC   – lifetime of a paused run (default: 3600)
+RUN_CHECKPOINT_MAX       – paused runs kept (default: 1024)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+TTL_SEC   = float(os.getenv("RUN_CHECKPOINT_TTL_SEC", "3600"))
+MAX_ITEMS = int(os.getenv("RUN_CHECKPOINT_MAX", "1024"))
+
+
+class RunStore:
+    def __init__(self, ttl: float = TTL_SEC, max_items: int = MAX_ITEMS):
+        self.ttl       = ttl
+        self.max_items = max_items
+        self._runs: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, checkpoint: Dict[str, Any], run_id: str | None = None) -> str:
+        run_id = run_id or uuid.uuid4().hex
+        with self._lock:
+            self._runs[run_id] = (dict(checkpoint), time.monotonic() + self.ttl)
+            self._runs.move_to_end(run_id)
+            while len(self._runs) > self.max_items:
+                self._runs.popitem(last=False)
+        return run_id
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hit = self._runs.get(run_id)
+            if hit is None:
+                return None
+            if hit[1] < time.monotonic():
+                del self._runs[run_id]
+                return None
+            return dict(hit[0])
+
+    def discard(self, run_id: str) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+
+RUNS = RunStore()
+
+
+__all__ = ["RunStore", "RUNS"]
@@ -0,0 +1,102 @@
+"""
+backend.sqlite_lru
+------------------
+Shared SQLite store behind the on-disk caches (backend.embed_cache,
+backend.llm_cache). Subclasses own their table layout and key / value
+encoding; this class owns everything else:
+
+• connection – one WAL-mode connection (synchronous=NORMAL) shared by
+               every thread, serialised by `_lock`
+• LRU        – tables carry `key TEXT PRIMARY KEY` and an indexed
+               `last_used` stamp; `_touch(keys)` bumps it on a hit and
+               `_added(n)` evicts down to 90 % of `max_items` once the
+               table grows past it
+• TTL        – with `ttl` set, the table also needs a `created` column;
+               eviction drops expired rows first
+• Stats      – hit / miss / size counters (`stats()`), `clear()`, `close()`
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class SQLiteLRU:
+    """Thread-safe SQLite table with LRU (and optional TTL) eviction."""
+
+    def __init__(self, path: str | Path, *, table: str, schema: str, max_items: int,
+                 ttl: Optional[float] = None, name: str = "cache"):
+        self.path      = str(path)
+        self.table     = table
+        self.name      = name
+        self.max_items = max_items
+        self.ttl       = ttl
+        self.hits      = 0
+        self.misses    = 0
+        self._lock     = threading.Lock()
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(schema)
+        self._size = self._count()
+
+    # ── for subclasses (call with `_lock` held) ──
+    def _count(self) -> int:
+        return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _touch(self, keys: Iterable[str]) -> None:
+        """Mark *keys* as just used and commit."""
+        now = time.time()
+        self._db.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                             [(now, k) for k in keys])
+        self._db.commit()
+
+    def _added(self, n: int) -> None:
+        """Account for *n* new rows, evict if over the cap, and commit."""
+        self._size += n
+        if self._size > self.max_items:
+            self._evict()
+        self._db.commit()
+
+    def _evict(self) -> None:
+        """Drop expired rows, then the least-recently-used down to 90 % of the cap."""
+        if self.ttl is not None:
+            self._db.execute(f"DELETE FROM {self.table} WHERE created <= ?",
+                             (time.time() - self.ttl,))
+        excess = self._count() - int(self.max_items * 0.9)
+        if excess > 0:
+            self._db.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"  SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+        self._size = self._count()
+        log.info("%s evicted down to %d rows", self.name, self._size)
+
+    # ── housekeeping ──
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": self._size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table}")
+            self._db.commit()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["SQLiteLRU"]
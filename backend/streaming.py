@@ -0,0 +1,77 @@
+"""
+backend.streaming
+-----------------
+Token streaming without changing every call signature.
+
+A *sink* (callback taking a text delta) is stored in a ContextVar.
+Producers deep in the stack — `call_llm`, the policy_qna chain — check
+`active()` and, when a sink is installed, request a streamed completion
+and `emit()` each delta. Everything else keeps returning full results,
+so non-streaming callers are unaffected. LangChain / LangGraph copy the
+context into their worker threads, so the sink follows the call.
+
+    for kind, value in iter_tokens(run_workflow, prompt):
+        if kind == "token": ...      # text delta
+        else: ...                    # "done": fn's return value
+"""
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+_SINK: contextvars.ContextVar[Optional[Callable[[str], None]]] = \
+    contextvars.ContextVar("token_sink", default=None)
+
+
+def active() -> bool:
+    """True when someone is listening for tokens in this context."""
+    return _SINK.get() is not None
+
+
+def emit(text: str) -> None:
+    sink = _SINK.get()
+    if sink is not None and text:
+        sink(text)
+
+
+@contextmanager
+def token_sink(callback: Callable[[str], None]) -> Iterator[None]:
+    token = _SINK.set(callback)
+    try:
+        yield
+    finally:
+        _SINK.reset(token)
+
+
+def iter_tokens(fn: Callable[..., Any], *args: Any, **kwargs: Any
+                ) -> Iterator[Tuple[str, Any]]:
+    """
+    Run `fn(*args, **kwargs)` in a worker thread with a sink installed and
+    yield ("token", delta) as they are emitted, then ("done", result).
+    Exceptions from *fn* are re-raised in the consumer.
+    """
+    q: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+
+    def _target() -> None:
+        with token_sink(lambda t: q.put(("token", t))):
+            try:
+                q.put(("done", fn(*args, **kwargs)))
+            except BaseException as e:          # hand over to the consumer
+                q.put(("error", e))
+
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(_target,), name="token-stream",
+                     daemon=True).start()
+    while True:
+        kind, value = q.get()
+        if kind == "error":
+            raise value
+        yield kind, value
+        if kind == "done":
+            return
+
+
+__all__ = ["active", "emit", "token_sink", "iter_tokens"]
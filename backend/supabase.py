@@ -5,24 +5,60 @@ Supabase DB and embedding helpers.
 
 Exposes:
 - _SB: sync supabase client
-- _embed: embedding function (calls edge function)
+- _embed: embedding function (calls edge function, disk-cached)
+- embed_many: batched embeddings (one edge-function call for all misses)
 - fetch_manifest: finds best task manifest for an input prompt
+  (in-process RouterIndex by default; ROUTER_MODE=rpc uses the
+  match_task_manifest_vec RPC instead)
 """
 from dotenv import load_dotenv
 load_dotenv()
 
+import logging
 import os
-import requests
+import threading
 from supabase import create_client, Client
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
+
+from backend import embed_cache, metrics, tracing
+from backend.embed_batch import MicroBatcher
+from backend.embed_cache import cached_embed, cached_embed_many
 
 _SB_URL = os.environ.get("SUPABASE_URL")
 _SB_KEY = os.environ.get("SUPABASE_KEY") or os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
-_SB: Client = create_client(_SB_URL, _SB_KEY)
+_SB: Client = create_client(_SB_URL, _SB_KEY, options=tracing.supabase_options())
+
+_EMBED_MODEL = "text-embedding-3-small"   # must match supabase/functions/embed
+_ROUTER_MODE = os.environ.get("ROUTER_MODE", "local").lower()   # local | rpc
+
+log = logging.getLogger(__name__)
 
 def _embed(text: str) -> list:
     """
-    Calls the /embed edge function for text embedding.
+    Embeds text via the /embed edge function, served from the local
+    embedding cache when the same text was embedded before.
+    """
+    metrics.tally("embed")
+    with tracing.span("embed", model=_EMBED_MODEL, chars=len(text)):
+        return cached_embed(_EMBED_MODEL, text, _embed_remote)
+
+def embed_many(texts: list) -> list:
+    """
+    Embeds a list of texts; cached ones are served locally and the rest go
+    to the edge function in a single request. Order matches *texts*.
+    """
+    return cached_embed_many(_EMBED_MODEL, texts, _embed_many_remote)
+
+def _embed_remote(text: str) -> list:
+    """
+    Single-text miss: coalesced with concurrent sessions' misses into one
+    edge-function call by the micro-batcher.
+    """
+    return _BATCHER.submit(text)
+
+def _embed_many_remote(texts: list) -> list:
+    """
+    Calls the /embed edge function for a batch of texts.
     """
     base_url = os.environ.get("SUPABASE_URL")
     if not base_url:
@@ -32,25 +68,72 @@ def _embed(text: str) -> list:
     if not openai_api_key:
         raise RuntimeError("OPENAI_API_KEY environment variable not set.")
 
-    resp = requests.post(
-        embed_url,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('SUPABASE_KEY') or os.environ.get('SUPABASE_SERVICE_KEY') or os.environ.get('SUPABASE_ANON_KEY')}",
-            "x-openai-key": openai_api_key
-        },
-        json={"text": text}
-    )
-    resp.raise_for_status()
-    return resp.json()["embedding"]
-
-def fetch_manifest(prompt: str, min_similarity: float = 0.30, tenant: str = "default") -> Tuple[str, Dict[str, Any]]:
+    _EDGE_TEXTS.inc(len(texts))
+    with _EDGE_SECONDS.time():             # span: supabase.functions (TracedTransport)
+        resp = _edge_http().post(
+            embed_url,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {os.environ.get('SUPABASE_KEY') or os.environ.get('SUPABASE_SERVICE_KEY') or os.environ.get('SUPABASE_ANON_KEY')}",
+                "x-openai-key": openai_api_key
+            },
+            json={"texts": texts}
+        )
+        resp.raise_for_status()
+    return resp.json()["embeddings"]
+
+_EDGE_HTTP = None
+_edge_lock = threading.Lock()
+
+def _edge_http():
+    """Keep-alive client for edge functions, traced like the Supabase client."""
+    global _EDGE_HTTP
+    if _EDGE_HTTP is None:
+        with _edge_lock:
+            if _EDGE_HTTP is None:
+                _EDGE_HTTP = tracing.traced_client(timeout=60.0)
+    return _EDGE_HTTP
+
+_BATCHER = MicroBatcher(_embed_many_remote, name="edge-embed")
+
+# ── metrics ──
+_EDGE_TEXTS   = metrics.counter("edge_embed_texts_total", "texts sent to the /embed edge function")
+_EDGE_SECONDS = metrics.histogram("edge_embed_seconds", "/embed edge-function latency")
+_MANIFEST     = metrics.counter("manifest_lookups_total",
+                                "fetch_manifest calls by path and result", ["mode", "result"])
+metrics.callback("embed_cache_hits_total", lambda: embed_cache.stats()["hits"],
+                 "embedding cache hits", kind="counter")
+metrics.callback("embed_cache_misses_total", lambda: embed_cache.stats()["misses"],
+                 "embedding cache misses", kind="counter")
+metrics.callback("embed_batch_queue_depth", lambda: _BATCHER.stats()["queued"],
+                 "texts waiting in the edge-embed micro-batcher")
+
+def fetch_manifest(prompt: str, min_similarity: float = 0.30, tenant: str = "default",
+                   q_vec: List[float] | None = None) -> Tuple[str, Dict[str, Any]]:
     """
-    Embeds the input prompt and finds the closest matching task manifest row
-    by calling the 'match_task_manifest_vec' RPC. Returns (task_id, manifest dict).
-    Aborts if cosine distance is above the min_similarity threshold.
+    Embeds the input prompt and finds the closest matching task manifest row.
+    Returns (task_id, manifest dict), or ("", {}) when no row reaches
+    min_similarity. Pass `q_vec` when the prompt was already embedded.
+
+    Routing runs against the in-process RouterIndex (full row, no network);
+    if the index cannot be built we fall back to the
+    'match_task_manifest_vec' RPC.
     """
-    vec = _embed(prompt)
+    vec = q_vec if q_vec is not None else _embed(prompt)
+
+    if _ROUTER_MODE != "rpc":
+        from backend.router_index import get_index
+        try:
+            hits = get_index().search(vec, tenant=tenant, k=1,
+                                      min_similarity=min_similarity)
+        except Exception as e:          # index unavailable → RPC path below
+            log.warning("router index unavailable, using RPC: %s", e)
+        else:
+            _MANIFEST.inc(mode="local", result="hit" if hits else "miss")
+            if not hits:
+                return "", {}
+            return _task_id(hits[0][1]), hits[0][1]
+
     rpc_result = _SB.rpc(
         "match_task_manifest_vec",
         {
@@ -61,8 +144,12 @@ def fetch_manifest(prompt: str, min_similarity: float = 0.30, tenant: str = "def
     ).execute()
 
     if not rpc_result.data or not rpc_result.data[0]:
+        _MANIFEST.inc(mode="rpc", result="miss")
         return "", {}
+    _MANIFEST.inc(mode="rpc", result="hit")
 
     row = rpc_result.data[0]
-    task_id = row.get("task_id") or row.get("id") or row.get("task") or ""
-    return task_id, row
+    return _task_id(row), row
+
+def _task_id(row: Dict[str, Any]) -> str:
+    return row.get("task_id") or row.get("id") or row.get("task") or ""
@@ -1,36 +1,145 @@
+"""
+backend.templates
+-----------------
+Template upload + placeholder discovery.
+
+`scan_template(bytes, ext)` is a single pass over only the parts that can
+carry merge fields — word/document.xml, headers, footers, foot/endnotes
+and ppt slides (+ notes). Other members (media, styles, layouts) are never
+decompressed. Text nodes are walked in order and joined per paragraph
+only, so `{{field}}` split across runs is found without building a
+tag-stripped copy of the document. Each hit records where its pieces sit
+in the part XML (`Span`), which the DOCX merge engine
+(backend.tools.docx_merge) compiles directly.
+
+Results are cached by sha256 of the template bytes.
+
+Environment vars
+----------------
+TEMPLATE_SCAN_CACHE_MAX   – scanned templates kept in memory (default: 128)
+"""
 from __future__ import annotations
-import re, io, os, uuid, zipfile, mimetypes
-from typing import List
+import re, io, os, uuid, zipfile, mimetypes, hashlib, threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple
+
+SCAN_CACHE_MAX = int(os.getenv("TEMPLATE_SCAN_CACHE_MAX", "128"))
 
 # ────────────────────────── placeholder regex ───────────────────────────
 _PLACEHOLDER_RE = re.compile(r"\{\{\s*([a-zA-Z0-9_]+?)\s*\}\}")
 
-# ────────────────────────── helper to strip XML tags ────────────────────
-def _strip_xml(text: str) -> str:
-    """Remove all <w:*> tags so placeholders that span runs join up."""
-    return re.sub(r"<[^>]+>", "", text)
+# zip members that may hold merge fields
+_TEXT_PARTS_RE = re.compile(
+    r"^(word/(document|header\d*|footer\d*|footnotes|endnotes)"
+    r"|ppt/(slides/slide\d+|notesSlides/notesSlide\d+))\.xml$"
+)
 
-# ────────────────────────── public: extract_placeholders ────────────────
-def extract_placeholders(file_bytes: bytes, ext: str) -> List[str]:
-    """
-    Return a sorted list of unique placeholder names (`{{name}}`)
-    found in the uploaded template.
-    Handles DOCX/PPTX (unzips and scans XML) as well as plain text/HTML/MD.
-    """
-    names: set[str] = set()
+# paragraph boundaries + text nodes (WordprocessingML w:, DrawingML a:)
+_TOKEN_RE = re.compile(r"<[wa]:p(?=[\s>/])|</[wa]:p>|(<([wa]):t(?:\s[^>]*)?>)([^<]*)</\2:t>")
+
+
+# ────────────────────────── scan results ────────────────────────────────
+class Span(NamedTuple):
+    """One text node's share of a placeholder (offsets into the part XML)."""
+    tag_start:  int      # "<w:t …>" starts here
+    text_start: int      # node text starts here (= end of the open tag)
+    text_end:   int      # node text ends here ("</w:t>" starts)
+    lo:         int      # placeholder slice within the node text
+    hi:         int
+
+
+class Placeholder(NamedTuple):
+    name:  str
+    raw:   str                   # text as written, e.g. "{{ client }}"
+    spans: Tuple[Span, ...]      # first span is where a value goes
+
+
+class TemplateScan(NamedTuple):
+    digest:    str
+    names:     Tuple[str, ...]                        # sorted, unique
+    locations: Dict[str, Tuple[Placeholder, ...]]     # part → hits (parts with hits only)
 
+
+def scan_part(xml: str) -> Tuple[Placeholder, ...]:
+    """All placeholders in one part, in document order."""
+    hits: List[Placeholder] = []
+    nodes: List[re.Match] = []
+
+    def _flush() -> None:
+        if not any("{" in n.group(3) for n in nodes):
+            return
+        starts, pos = [], 0
+        for n in nodes:
+            starts.append(pos)
+            pos += len(n.group(3))
+        joined = "".join(n.group(3) for n in nodes)
+        for m in _PLACEHOLDER_RE.finditer(joined):
+            s, e = m.span()
+            spans = tuple(
+                Span(n.start(), n.end(1), n.end(3), max(s, lo) - lo, min(e, lo + len(n.group(3))) - lo)
+                for n, lo in zip(nodes, starts)
+                if lo < e and lo + len(n.group(3)) > s
+            )
+            hits.append(Placeholder(m.group(1), m.group(0), spans))
+
+    for tok in _TOKEN_RE.finditer(xml):
+        if tok.group(1) is None:               # paragraph boundary
+            if nodes:
+                _flush()
+                nodes = []
+            continue
+        nodes.append(tok)
+    if nodes:
+        _flush()
+    return tuple(hits)
+
+
+# ────────────────────────── public: scan_template ───────────────────────
+_SCANS: "OrderedDict[Tuple[str, str], TemplateScan]" = OrderedDict()
+_scans_lock = threading.Lock()
+
+
+def scan_template(file_bytes: bytes, ext: str) -> TemplateScan:
+    """Placeholder names + locations for a template (cached by content)."""
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    with _scans_lock:
+        hit = _SCANS.get((digest, ext))
+        if hit is not None:
+            _SCANS.move_to_end((digest, ext))
+            return hit
+
+    names: set[str] = set()
+    locations: Dict[str, Tuple[Placeholder, ...]] = {}
     if ext in {".docx", ".pptx"}:
         with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf:
             for member in zf.namelist():
-                if member.endswith(".xml"):
-                    xml = zf.read(member).decode("utf-8", errors="ignore")
-                    plain = _strip_xml(xml)
-                    names.update(_PLACEHOLDER_RE.findall(plain))
+                if not _TEXT_PARTS_RE.match(member):
+                    continue
+                found = scan_part(zf.read(member).decode("utf-8", errors="replace"))
+                if found:
+                    locations[member] = found
+                    names.update(p.name for p in found)
     else:
         text = file_bytes.decode("utf-8", errors="ignore")
         names.update(_PLACEHOLDER_RE.findall(text))
 
-    return sorted(names)
+    scan = TemplateScan(digest, tuple(sorted(names)), locations)
+    with _scans_lock:
+        _SCANS[(digest, ext)] = scan
+        while len(_SCANS) > SCAN_CACHE_MAX:
+            _SCANS.popitem(last=False)
+    return scan
+
+
+# ────────────────────────── public: extract_placeholders ────────────────
+def extract_placeholders(file_bytes: bytes, ext: str) -> List[str]:
+    """
+    Return a sorted list of unique placeholder names (`{{name}}`)
+    found in the uploaded template.
+    Handles DOCX/PPTX (text parts only, see scan_template) as well as
+    plain text/HTML/MD.
+    """
+    return list(scan_template(file_bytes, ext).names)
 
 # ────────────────────────── public: upload_template ─────────────────────
 def upload_template(file_bytes: bytes, filename: str, tenant: str) -> str:
@@ -0,0 +1,177 @@
+"""
+backend.tools.docx_merge
+------------------------
+XML-level mail-merge for DOCX templates (no python-docx on the hot path).
+
+• compile once per template version (`MergeTemplate(blob)`):
+    - placeholder locations come from backend.templates.scan_template
+      (document, headers, footers, foot/endnotes; cached by bytes hash);
+      parts with hits are cut into literal byte chunks and value "holes"
+    - `{{field}}` split across several `<w:t>` runs is resolved at compile
+      time: the value goes into the first run, the leftover pieces of the
+      placeholder are cut from the following runs — every run keeps its
+      own formatting (python-docx path collapses the whole paragraph)
+    - every other zip member is kept as its *compressed* bytes
+• render per request (`tpl.render(mapping)`):
+    - one pass joining chunks + escaped values per changed part
+    - unchanged members (media, styles, …) are written back byte-for-byte,
+      no inflate / deflate
+
+    tpl  = MergeTemplate(template_bytes)
+    blob = tpl.render({"client": "ACME", "cost": "10 000"})
+
+Placeholders use the same grammar as backend.templates
+(`{{ name }}`, word characters only). Names missing from the mapping are
+left in the output untouched, like the python-docx renderer does.
+"""
+from __future__ import annotations
+
+import io
+import struct
+import zipfile
+import zlib
+from typing import Any, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from backend.templates import Placeholder, Span, scan_template
+
+_PRESERVE = '<w:t xml:space="preserve">'
+
+
+class _Hole(NamedTuple):
+    name: str
+    raw:  bytes          # original placeholder text, emitted if no value
+
+
+Segment = Union[bytes, _Hole]
+
+
+class _Member(NamedTuple):
+    info:     zipfile.ZipInfo
+    raw:      Optional[bytes]              # compressed bytes (unchanged member)
+    segments: Optional[Tuple[Segment, ...]]  # compiled part (merge target)
+
+
+# ────────── compile ────────────────────────────────────────────────────
+def _compile_part(xml: str, found: Tuple[Placeholder, ...]) -> List[Segment]:
+    """Split one part into literal chunks and holes at the scanned spans."""
+    # per text node: its spans, the first span of each placeholder carries the hole
+    edits: Dict[int, List[Tuple[Span, Optional[_Hole]]]] = {}
+    for ph in found:
+        hole = _Hole(ph.name, ph.raw.encode("utf-8"))
+        for k, span in enumerate(ph.spans):
+            edits.setdefault(span.tag_start, []).append((span, hole if k == 0 else None))
+
+    segs: List[Segment] = []
+    pos = 0
+    for tag_start in sorted(edits):
+        node = sorted(edits[tag_start], key=lambda e: e[0].lo)
+        first = node[0][0]
+        open_tag = xml[tag_start:first.text_start]
+        text     = xml[first.text_start:first.text_end]
+        if any(h is not None for _, h in node) and "xml:space" not in open_tag:
+            open_tag = open_tag[:-1] + ' xml:space="preserve">'
+        segs.append(xml[pos:tag_start].encode("utf-8"))
+        segs.append(open_tag.encode("utf-8"))
+        cur = 0
+        for span, hole in node:
+            segs.append(text[cur:span.lo].encode("utf-8"))
+            if hole is not None:
+                segs.append(hole)
+            cur = span.hi
+        segs.append(text[cur:].encode("utf-8"))
+        pos = first.text_end                    # "</w:t>" stays in the next chunk
+    segs.append(xml[pos:].encode("utf-8"))
+
+    # merge adjacent literals so render is a tight loop
+    merged: List[Segment] = []
+    for s in segs:
+        if isinstance(s, bytes) and merged and isinstance(merged[-1], bytes):
+            merged[-1] += s
+        elif not (isinstance(s, bytes) and not s):
+            merged.append(s)
+    return merged
+
+
+def _raw_member(blob: bytes, info: zipfile.ZipInfo) -> bytes:
+    """Compressed bytes of *info* straight from the local file header."""
+    hdr = blob[info.header_offset:info.header_offset + 30]
+    if hdr[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"bad local header for {info.filename}")
+    n, m = struct.unpack("<HH", hdr[26:30])
+    start = info.header_offset + 30 + n + m
+    return blob[start:start + info.compress_size]
+
+
+# ────────── render ─────────────────────────────────────────────────────
+def _escape(value: Any) -> bytes:
+    s = str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if "\n" in s or "\t" in s:                 # same as python-docx run.text
+        s = (s.replace("\r", "")
+              .replace("\n", "</w:t><w:br/>" + _PRESERVE)
+              .replace("\t", "</w:t><w:tab/>" + _PRESERVE))
+    return s.encode("utf-8")
+
+
+def _dos_time(dt: Tuple[int, ...]) -> Tuple[int, int]:
+    y, mo, d, h, mi, s = dt
+    y = max(y, 1980)
+    return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+
+class MergeTemplate:
+    """A DOCX template compiled for repeated merges."""
+
+    def __init__(self, blob: bytes):
+        scan = scan_template(blob, ".docx")      # shared with the wizard, cached by hash
+        members: List[_Member] = []
+        with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+            for info in zf.infolist():
+                found = scan.locations.get(info.filename)
+                if found:
+                    xml = zf.read(info).decode("utf-8", errors="replace")
+                    members.append(_Member(info, None, tuple(_compile_part(xml, found))))
+                else:
+                    members.append(_Member(info, _raw_member(blob, info), None))
+        self._members = tuple(members)
+        self.fields: FrozenSet[str] = frozenset(scan.names)
+
+    def render(self, mapping: Mapping[str, Any]) -> bytes:
+        out     = io.BytesIO()
+        central = []
+        for m in self._members:
+            info  = m.info
+            name  = info.filename.encode("utf-8" if info.flag_bits & 0x800 else "cp437")
+            flags = info.flag_bits & 0x800
+            if m.segments is None:
+                data, method = m.raw, info.compress_type
+                crc, usize = info.CRC, info.file_size
+            else:
+                plain = b"".join(
+                    s if s.__class__ is bytes else
+                    (_escape(mapping[s.name]) if s.name in mapping else s.raw)
+                    for s in m.segments
+                )
+                comp  = zlib.compressobj(6, zlib.DEFLATED, -15)
+                data  = comp.compress(plain) + comp.flush()
+                method, crc, usize = zipfile.ZIP_DEFLATED, zlib.crc32(plain), len(plain)
+
+            t, d   = _dos_time(info.date_time)
+            offset = out.tell()
+            out.write(struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, flags, method,
+                                  t, d, crc, len(data), usize, len(name), 0))
+            out.write(name)
+            out.write(data)
+            central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags,
+                                       method, t, d, crc, len(data), usize, len(name),
+                                       0, 0, 0, 0, info.external_attr, offset) + name)
+
+        cd_start = out.tell()
+        for entry in central:
+            out.write(entry)
+        cd_size = out.tell() - cd_start
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central),
+                              len(central), cd_size, cd_start, 0))
+        return out.getvalue()
+
+
+__all__ = ["MergeTemplate"]
@@ -2,56 +2,182 @@
 DocxRender — Supabase Storage helper
 ===================================
 
-• Downloads “templates/<template_id>.docx”
+• Downloads “templates/<template_id>.docx” — once per storage version:
+  the raw bytes and the parsed Document are cached (see
+  backend.tools.template_cache) and each render works on a deep copy
 • Replaces every {{merge_field}} (even when Word split it across runs)
-  in body text, tables, headers & footers.
-• Uploads result to “documents/<template_id>/<uuid>.docx”
+  in body text, tables, headers & footers. Two engines:
+    xml          – backend.tools.docx_merge: template compiled once,
+                   one streaming pass per render, run formatting kept
+    python-docx  – the original object walk on a deep copy of the
+                   cached Document (collapses runs of touched paragraphs)
+• Uploads result to “documents/<template_id>/<hash>.docx”, where the
+  hash covers template bytes + engine + canonical inputs. Identical
+  submissions reuse the stored file (one existence check, no render or
+  upload) and a locally cached signed URL until shortly before it expires
 • Returns {"ui_event":"download_link", "url": …}
+• `DocxRender.batch(rows)` mail-merges many input dicts from the same
+  cached template: rendered across a process pool, uploaded
+  concurrently, returned as per-document signed URLs
+  ({"ui_event":"download_links", "urls": […], "names": […]}; each URL
+  carries a readable `download=` file name) or one zip archive
 
 Environment vars
 ----------------
 SUPABASE_DOC_BUCKET   – output bucket name (default: documents)
 URL_EXPIRY_MIN        – signed-URL lifetime in minutes (default: 120)
+DOCX_RENDER_ENGINE    – "xml" or "python-docx" (default: xml)
+URL_REUSE_MARGIN_SEC  – stop reusing a signed URL this long before it
+                        expires (default: 300)
+DOCX_URL_CACHE_MAX    – signed URLs kept in memory (default: 1024)
+DOCX_BATCH_PROCESSES  – render processes for batches (default: CPU count)
+DOCX_BATCH_MIN_PARALLEL – smaller batches render in-process (default: 8)
+DOCX_UPLOAD_WORKERS   – concurrent uploads per batch (default: 8)
+TEMPLATE_CACHE_MAX / TEMPLATE_REVALIDATE_SEC / TEMPLATE_CACHE_DIR
+                      – template cache knobs, see backend.tools.template_cache
 """
 from __future__ import annotations
 
-import io, os, uuid
-from typing import Dict, Any
+import copy, hashlib, io, json, os, re, threading, time, zipfile
+from collections import OrderedDict
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 
 import docx                              # pip install python-docx
+from backend import budget, metrics, tracing
 from backend.db import sb                # Supabase client
+from backend.tools.docx_merge import MergeTemplate
+from backend.tools.template_cache import TemplateCache, TemplateEntry
 
 TEMPLATE_BUCKET = "templates"
 OUTPUT_BUCKET   = os.getenv("SUPABASE_DOC_BUCKET", "documents")
 URL_EXPIRY_SEC  = int(os.getenv("URL_EXPIRY_MIN", "120")) * 60
+ENGINE          = os.getenv("DOCX_RENDER_ENGINE", "xml")
+URL_REUSE_SEC   = max(0, URL_EXPIRY_SEC - int(os.getenv("URL_REUSE_MARGIN_SEC", "300")))
+URL_CACHE_MAX   = int(os.getenv("DOCX_URL_CACHE_MAX", "1024"))
+
+BATCH_PROCESSES    = int(os.getenv("DOCX_BATCH_PROCESSES", str(os.cpu_count() or 1)))
+BATCH_MIN_PARALLEL = int(os.getenv("DOCX_BATCH_MIN_PARALLEL", "8"))
+UPLOAD_WORKERS     = int(os.getenv("DOCX_UPLOAD_WORKERS", "8"))
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MIME  = "application/zip"
 
 
 # ────────── storage helpers ───────────────────────────────────────────
 def _download(bucket: str, path: str) -> bytes:
     """Handle storage3 DownloadFileResponse as well as raw bytes."""
+    budget.charge(calls=1)
     obj = sb.storage.from_(bucket).download(path)
     return obj.file if hasattr(obj, "file") else obj
 
 
-def _upload(bucket: str, key: str, blob: bytes) -> str:
-    store = sb.storage.from_(bucket)
-    store.upload(
-        key,
-        blob,
-        {
-            "content-type":
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        },
-    )
-    signed = store.create_signed_url(key, URL_EXPIRY_SEC)
+def _stat(bucket: str, path: str) -> Optional[str]:
+    """
+    Cheap version probe: ETag (else last-modified) from a folder listing.
+    Returns None when the object or its metadata cannot be found.
+    """
+    budget.charge(calls=1)
+    folder, _, name = path.rpartition("/")
+    items = sb.storage.from_(bucket).list(folder, {"search": name}) or []
+    for it in items:
+        if it.get("name") != name:
+            continue
+        meta = it.get("metadata") or {}
+        return (meta.get("eTag") or meta.get("lastModified")
+                or it.get("updated_at") or None)
+    return None
+
+
+def _sign(bucket: str, key: str) -> str:
+    budget.charge(calls=1)
+    signed = sb.storage.from_(bucket).create_signed_url(key, URL_EXPIRY_SEC)
 
     if isinstance(signed, str):           # very old client
-        return signed
-    if isinstance(signed, dict):          # storage3 ≥0.6
-        return signed.get("signedURL") or signed.get("signed_url")
-    if hasattr(signed, "signed_url"):     # storage3 0.5
-        return signed.signed_url
-    raise RuntimeError("Unknown signed-URL response shape")
+        url = signed
+    elif isinstance(signed, dict):        # storage3 ≥0.6
+        url = signed.get("signedURL") or signed.get("signed_url")
+    elif hasattr(signed, "signed_url"):   # storage3 0.5
+        url = signed.signed_url
+    else:
+        raise RuntimeError("Unknown signed-URL response shape")
+    _remember_url(bucket, key, url)
+    return url
+
+
+def _upload(bucket: str, key: str, blob: bytes, content_type: str = DOCX_MIME) -> str:
+    # keys are content hashes, so overwriting a concurrent twin is harmless
+    budget.charge(calls=1)
+    sb.storage.from_(bucket).upload(key, blob, {"content-type": content_type,
+                                                "upsert": "true"})
+    return _sign(bucket, key)
+
+
+# ────────── output dedup (content keys + signed-URL reuse) ───────────
+_URLS: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+_urls_lock = threading.Lock()
+
+
+def _remember_url(bucket: str, key: str, url: str) -> None:
+    with _urls_lock:
+        _URLS[(bucket, key)] = (url, time.monotonic() + URL_REUSE_SEC)
+        _URLS.move_to_end((bucket, key))
+        while len(_URLS) > URL_CACHE_MAX:
+            _URLS.popitem(last=False)
+
+
+def _existing_url(bucket: str, key: str) -> Optional[str]:
+    """Signed URL for *key* if it is already stored, else None."""
+    with _urls_lock:
+        hit = _URLS.get((bucket, key))
+        if hit is not None and hit[1] > time.monotonic():
+            _URLS.move_to_end((bucket, key))
+            return hit[0]
+    if _stat(bucket, key) is None:
+        return None
+    return _sign(bucket, key)
+
+
+def _template_digest(entry: TemplateEntry) -> str:
+    digest = entry.extra.get("sha256")
+    if digest is None:
+        digest = entry.extra["sha256"] = hashlib.sha256(entry.blob).hexdigest()
+    return digest
+
+
+def _content_key(template_id: str, entry: TemplateEntry, engine: str,
+                 payload: Any, ext: str = ".docx") -> str:
+    canon = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    h = hashlib.sha256(f"{_template_digest(entry)}\0{engine}\0{canon}".encode("utf-8"))
+    return f"{template_id}/{h.hexdigest()[:40]}{ext}"
+
+
+def _parse_docx(blob: bytes):
+    return docx.Document(io.BytesIO(blob))
+
+
+_TEMPLATES = TemplateCache(
+    lambda path: _download(TEMPLATE_BUCKET, path),
+    lambda path: _stat(TEMPLATE_BUCKET, path),
+    parse=_parse_docx,
+)
+
+
+def template_cache_stats() -> Dict[str, int]:
+    return _TEMPLATES.stats()
+
+
+# ────────── metrics ──────────────────────────────────────────────────
+_RENDER_SECONDS = metrics.histogram("docx_render_seconds", "DOCX render time per document",
+                                    ["engine"])
+_OUTPUTS = metrics.counter("docx_outputs_total",
+                           "DocxRender.invoke results: reused stored file or rendered",
+                           ["result"])
+metrics.callback("template_cache_hits_total", lambda: _TEMPLATES.stats()["hits"],
+                 "template cache hits", kind="counter")
+metrics.callback("template_cache_misses_total", lambda: _TEMPLATES.stats()["misses"],
+                 "template cache misses", kind="counter")
 
 
 # ────────── run-splitting safe replacement ───────────────────────────
@@ -73,39 +199,153 @@ def _replace_in_runs(runs, mapping: Dict[str, Any]) -> None:
         r.text = ""           # collapse extra runs
 
 
+# ────────── engines ──────────────────────────────────────────────────
+def _render_xml(entry: TemplateEntry, inputs: Dict[str, Any]) -> bytes:
+    tpl = entry.extra.get("xml")
+    if tpl is None:                        # compiled once per template version
+        tpl = entry.extra["xml"] = MergeTemplate(entry.blob)
+    return tpl.render(inputs)
+
+
+def _render_python_docx(entry: TemplateEntry, inputs: Dict[str, Any]) -> bytes:
+    # parsed once per template version; renders mutate a private copy
+    doc = copy.deepcopy(entry.parsed())
+
+    # replace in body paragraphs + headers & footers
+    parts = [doc] + [sect.header for sect in doc.sections] + \
+            [sect.footer for sect in doc.sections]
+    for part in parts:
+        for para in part.paragraphs:
+            _replace_in_runs(para.runs, inputs)
+
+    # replace inside tables
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    _replace_in_runs(para.runs, inputs)
+
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+_ENGINES = {"xml": _render_xml, "python-docx": _render_python_docx}
+
+
+# ────────── batch rendering (process pool) ──────────────────────────
+_WORKER: Tuple[TemplateEntry, str] | None = None
+
+
+def _worker_init(blob: bytes, engine: str) -> None:
+    """Runs once per pool process: compile the template there, not per row."""
+    global _WORKER
+    _WORKER = (TemplateEntry("batch", None, blob, _parse_docx), engine)
+
+
+def _worker_render(inputs: Dict[str, Any]) -> bytes:
+    entry, engine = _WORKER                    # type: ignore[misc]
+    return _ENGINES[engine](entry, inputs)
+
+
+def render_many(entry: TemplateEntry, engine: str, rows: Sequence[Dict[str, Any]],
+                processes: int | None = None) -> List[bytes]:
+    """Render *rows* against one template; parallel when it pays off."""
+    procs = min(processes or BATCH_PROCESSES, len(rows))
+    if procs <= 1 or len(rows) < BATCH_MIN_PARALLEL:
+        return [_ENGINES[engine](entry, r) for r in rows]
+    with ProcessPoolExecutor(procs, initializer=_worker_init,
+                             initargs=(entry.blob, engine)) as pool:
+        return list(pool.map(_worker_render, rows,
+                             chunksize=max(1, len(rows) // (procs * 4))))
+
+
+def _file_name(template_id: str, i: int, row: Dict[str, Any], name_field: str | None) -> str:
+    label = str(row.get(name_field) or "") if name_field else ""
+    label = re.sub(r"[^\w.-]+", "_", label).strip("._")
+    return f"{i + 1:04d}-{label or template_id}.docx"
+
+
+def _with_download_name(url: str, name: str) -> str:
+    """
+    Storage serves the object as an attachment named *name*. Stored keys
+    are content hashes shared by identical documents, so the readable
+    name lives on the URL and not on the key.
+    """
+    return f"{url}{'&' if '?' in url else '?'}download={quote(name)}"
+
+
 # ────────── main class (LangChain Runnable-friendly) ─────────────────
 class DocxRender:
-    def __init__(self, template_id: str):
+    def __init__(self, template_id: str, engine: str | None = None):
         # allow caller to specify with / without .docx
         self.template_id = template_id.rstrip(".docx")
+        self.engine = engine or ENGINE
+        if self.engine not in _ENGINES:
+            raise ValueError(f"unknown DOCX engine '{self.engine}'")
 
     # LangChain expects .invoke(input_dict) → output_dict
     def invoke(self, inputs: Dict[str, Any], **_) -> Dict[str, Any]:
-        tpl_path = f"{self.template_id}.docx"
-        tpl_blob = _download(TEMPLATE_BUCKET, tpl_path)
+        entry = _TEMPLATES.get(f"{self.template_id}.docx")
+        key   = _content_key(self.template_id, entry, self.engine, inputs)
+        blob  = None
 
-        doc = docx.Document(io.BytesIO(tpl_blob))
+        url = _existing_url(OUTPUT_BUCKET, key)
+        if url is None:
+            with tracing.span("docx.render", template_id=self.template_id,
+                              engine=self.engine) as sp, \
+                    _RENDER_SECONDS.time(engine=self.engine):
+                blob = _ENGINES[self.engine](entry, inputs)
+                sp.set(bytes=len(blob))
+            url = _upload(OUTPUT_BUCKET, key, blob)
+        _OUTPUTS.inc(result="reused" if blob is None else "rendered")
 
-        # replace in body paragraphs + headers & footers
-        parts = [doc] + [sect.header for sect in doc.sections] + \
-                [sect.footer for sect in doc.sections]
-        for part in parts:
-            for para in part.paragraphs:
-                _replace_in_runs(para.runs, inputs)
-
-        # replace inside tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        _replace_in_runs(para.runs, inputs)
+        return {"ui_event": "download_link", "url": url}
 
-        # save to buffer
-        out = io.BytesIO()
-        doc.save(out)
-        out.seek(0)
+    def batch(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        *,
+        as_zip: bool = False,
+        name_field: str | None = None,
+        processes: int | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Mail-merge every dict in *rows*. Returns one signed URL per document
+        (in input order) or, with `as_zip=True`, a single zip archive.
+        Documents are named "<n>-<row[name_field] or template_id>.docx":
+        zip entries carry that name, and so do the links ("names", plus a
+        `download=` parameter on each URL).
+        Documents (or the archive) already stored are not rendered again.
+        """
+        if not rows:
+            raise ValueError("batch needs at least one row")
+        entry = _TEMPLATES.get(f"{self.template_id}.docx")
+        workers = max(1, min(UPLOAD_WORKERS, len(rows)))
 
-        key = f"{self.template_id}/{uuid.uuid4()}.docx"
-        url = _upload(OUTPUT_BUCKET, key, out.read())
+        if as_zip:
+            key = _content_key(self.template_id, entry, self.engine,
+                               {"rows": list(rows), "name_field": name_field}, ".zip")
+            url = _existing_url(OUTPUT_BUCKET, key)
+            if url is None:
+                blobs = render_many(entry, self.engine, rows, processes)
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:   # docx is already deflated
+                    for i, (row, blob) in enumerate(zip(rows, blobs)):
+                        zf.writestr(_file_name(self.template_id, i, row, name_field), blob)
+                url = _upload(OUTPUT_BUCKET, key, buf.getvalue(), ZIP_MIME)
+            return {"ui_event": "download_link", "url": url, "count": len(rows)}
 
-        return {"ui_event": "download_link", "url": url}
+        keys = [_content_key(self.template_id, entry, self.engine, r) for r in rows]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            urls = list(pool.map(lambda k: _existing_url(OUTPUT_BUCKET, k), keys))
+            todo = [i for i, u in enumerate(urls) if u is None]
+            blobs = render_many(entry, self.engine, [rows[i] for i in todo], processes) if todo else []
+            fresh = pool.map(lambda ib: _upload(OUTPUT_BUCKET, keys[ib[0]], ib[1]),
+                             zip(todo, blobs))
+            for i, url in zip(todo, fresh):
+                urls[i] = url
+        names = [_file_name(self.template_id, i, r, name_field) for i, r in enumerate(rows)]
+        return {"ui_event": "download_links",
+                "urls": [_with_download_name(u, n) for u, n in zip(urls, names)],
+                "names": names, "count": len(urls)}
@@ -0,0 +1,161 @@
+"""
+backend.tools.template_cache
+----------------------------
+Bounded cache of template files pulled from Supabase Storage.
+
+Each entry is keyed by template path and remembers the storage version
+(ETag, else last-modified) it was downloaded at. On lookup:
+
+• checked within REVALIDATE_SEC      → served straight from memory
+• older                              → one metadata call (`stat`); the
+                                       blob is re-downloaded only if the
+                                       version moved
+• optional on-disk layer             → survives restarts; files are named
+                                       by path + version, so a stale file
+                                       is never served
+
+Entries can also hold a parsed form of the blob (e.g. a python-docx
+Document) built once by the `parse` callable and reused by callers.
+
+Environment vars
+----------------
+TEMPLATE_CACHE_MAX          – templates kept in memory (default: 32)
+TEMPLATE_REVALIDATE_SEC     – seconds before re-checking the version (default: 30)
+TEMPLATE_CACHE_DIR          – enable the on-disk layer in this directory
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+MAX_ITEMS      = int(os.getenv("TEMPLATE_CACHE_MAX", "32"))
+REVALIDATE_SEC = float(os.getenv("TEMPLATE_REVALIDATE_SEC", "30"))
+CACHE_DIR      = os.getenv("TEMPLATE_CACHE_DIR") or None
+
+
+class TemplateEntry:
+    __slots__ = ("path", "version", "blob", "checked", "_parsed", "_parse", "_lock", "extra")
+
+    def __init__(self, path: str, version: Optional[str], blob: bytes,
+                 parse: Optional[Callable[[bytes], Any]]):
+        self.path    = path
+        self.version = version
+        self.blob    = blob
+        self.checked = time.monotonic()
+        self.extra: Dict[str, Any] = {}      # per-version artefacts (indexes, …)
+        self._parsed = None
+        self._parse  = parse
+        self._lock   = threading.Lock()
+
+    def parsed(self) -> Any:
+        """Parse the blob once per version and keep the result."""
+        if self._parsed is None:
+            if self._parse is None:
+                raise RuntimeError("no parse function configured")
+            with self._lock:
+                if self._parsed is None:
+                    self._parsed = self._parse(self.blob)
+        return self._parsed
+
+
+class TemplateCache:
+    def __init__(
+        self,
+        fetch: Callable[[str], bytes],
+        stat: Callable[[str], Optional[str]],
+        *,
+        parse: Optional[Callable[[bytes], Any]] = None,
+        max_items: int = MAX_ITEMS,
+        revalidate_sec: float = REVALIDATE_SEC,
+        cache_dir: str | Path | None = CACHE_DIR,
+    ):
+        self.fetch          = fetch
+        self.stat           = stat
+        self.parse          = parse
+        self.max_items      = max_items
+        self.revalidate_sec = revalidate_sec
+        self.cache_dir      = Path(cache_dir) if cache_dir else None
+        self.hits = self.misses = self.revalidations = 0
+
+        self._entries: "OrderedDict[str, TemplateEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ── public ──
+    def get(self, path: str) -> TemplateEntry:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                if time.monotonic() - entry.checked < self.revalidate_sec:
+                    self.hits += 1
+                    return entry
+
+        version = self._safe_stat(path)
+        if entry is not None and version is not None and version == entry.version:
+            entry.checked = time.monotonic()
+            with self._lock:
+                self.hits += 1
+                self.revalidations += 1
+            return entry
+
+        entry = self._load(path, version)
+        with self._lock:
+            self.misses += 1
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, path: str | None = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "revalidations": self.revalidations, "size": len(self._entries)}
+
+    # ── internals ──
+    def _safe_stat(self, path: str) -> Optional[str]:
+        try:
+            return self.stat(path)
+        except Exception as e:                  # no metadata → always download
+            log.warning("template stat failed for %s: %s", path, e)
+            return None
+
+    def _disk_path(self, path: str, version: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256(f"{path}\0{version}".encode()).hexdigest()[:32]
+        return self.cache_dir / f"{digest}{Path(path).suffix}"
+
+    def _load(self, path: str, version: Optional[str]) -> TemplateEntry:
+        disk = self._disk_path(path, version) if version else None
+        if disk is not None and disk.exists():
+            return TemplateEntry(path, version, disk.read_bytes(), self.parse)
+
+        blob = self.fetch(path)
+        if disk is not None:
+            try:
+                disk.parent.mkdir(parents=True, exist_ok=True)
+                tmp = disk.with_suffix(disk.suffix + ".tmp")
+                tmp.write_bytes(blob)
+                tmp.replace(disk)
+            except OSError as e:
+                log.warning("template disk cache write failed: %s", e)
+        return TemplateEntry(path, version, blob, self.parse)
+
+
+__all__ = ["TemplateCache", "TemplateEntry"]
@@ -0,0 +1,390 @@
+"""
+backend.tracing
+---------------
+Lightweight spans for the workflow and everything it calls out to.
+
+    with tracing.span("docx.render", template_id=tid) as sp:
+        ...
+        sp.set(bytes=len(blob))
+
+• One trace per workflow run: the trace id is the run id carried in
+  `WorkflowState.run_id` (`run_context(run_id)` sets it), spans nest via
+  a ContextVar, so they follow LangGraph / json_graph worker threads
+• Instrumented: graph nodes (`@traced`), json_graph nodes, OpenAI
+  requests (backend.openai_scheduler), Supabase REST / RPC / Storage /
+  Functions calls (`supabase_options()` → TracedTransport), embedding
+  and DOCX rendering
+• Outbound spans carry `bytes_out` / `bytes_in` (backend.profiling sums
+  them per request)
+• Exporters receive `on_start(span)` / `on_end(span)`:
+    JsonlExporter – one JSON object per finished span, appended to a file
+    OTelExporter  – mirrors spans into OpenTelemetry (needs
+                    opentelemetry-api + an SDK/exporter configured)
+  `collect()` gathers a block's finished spans in memory (tests, tools);
+  `attach(sink)` scopes any sink to one block
+• With no exporter and no collector, `span()` returns a shared no-op
+  object — tracing off costs one function call per span
+
+Environment vars
+----------------
+TRACE_EXPORTERS   – comma list: "jsonl", "otel" (default: none)
+TRACE_FILE        – JSONL path (default: ~/.cache/i2i/traces.jsonl)
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from backend import metrics
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_FILE = Path.home() / ".cache" / "i2i" / "traces.jsonl"
+TRACE_FILE    = os.getenv("TRACE_FILE", str(_DEFAULT_FILE))
+
+
+# ────────── spans ──────────────────────────────────────────────────────
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end",
+                 "attrs", "error", "_t0", "_token", "_sinks")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str],
+                 attrs: Dict[str, Any]):
+        self.name      = name
+        self.trace_id  = trace_id
+        self.span_id   = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs     = attrs
+        self.error: Optional[str] = None
+        self.start     = time.time()
+        self.end: Optional[float] = None
+        self._t0       = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        return 0.0 if self.end is None else (self.end - self.start) * 1000.0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start": self.start,
+                "duration_ms": round(self.duration_ms, 3), "attrs": self.attrs,
+                "error": self.error}
+
+    # context-manager protocol (class based: no generator per span)
+    def __enter__(self) -> "Span":
+        self._token = _SPAN.set(self)
+        for sink in self._sinks:
+            sink.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = self.start + (time.perf_counter() - self._t0)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _SPAN.reset(self._token)
+        for sink in self._sinks:
+            try:
+                sink.on_end(self)
+            except Exception as e:              # never fail the traced call
+                log.warning("trace exporter %r failed: %s", sink, e)
+
+
+class _NoopSpan:
+    __slots__ = ()
+    trace_id = span_id = parent_id = None
+
+    def set(self, **_: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+_SPAN:    contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+_RUN:     contextvars.ContextVar[Optional[str]]  = contextvars.ContextVar("trace_run", default=None)
+_COLLECT: contextvars.ContextVar[tuple] = contextvars.ContextVar("trace_collect", default=())
+
+_EXPORTERS: List[Any] = []
+
+
+def active() -> bool:
+    """True when spans opened here would be recorded somewhere."""
+    return bool(_EXPORTERS) or bool(_COLLECT.get())
+
+
+def span(name: str, **attrs: Any) -> Span | _NoopSpan:
+    """Open a child of the current span (a new root in the current run)."""
+    collectors = _COLLECT.get()
+    if not _EXPORTERS and not collectors:
+        return _NOOP
+    parent = _SPAN.get()
+    trace_id = parent.trace_id if parent else (_RUN.get() or uuid.uuid4().hex)
+    sp = Span(name, trace_id, parent.span_id if parent else None, attrs)
+    sp._sinks = (*_EXPORTERS, *collectors)
+    return sp
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Decorator: run the function inside `span(name or fn.__name__)`."""
+    def deco(fn: Callable) -> Callable:
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def run_context(run_id: str) -> Iterator[None]:
+    """Spans opened inside belong to the trace *run_id*."""
+    token = _RUN.set(run_id)
+    try:
+        yield
+    finally:
+        _RUN.reset(token)
+
+
+def current_run_id() -> Optional[str]:
+    return _RUN.get()
+
+
+# ────────── collectors / exporters ─────────────────────────────────────
+class _Collector:
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def on_start(self, sp: Span) -> None:
+        pass
+
+    def on_end(self, sp: Span) -> None:
+        with self._lock:
+            self.spans.append(sp)
+
+
+@contextmanager
+def attach(sink: Any) -> Iterator[Any]:
+    """Send the spans of this block (and its threads) to *sink* too."""
+    token = _COLLECT.set((*_COLLECT.get(), sink))
+    try:
+        yield sink
+    finally:
+        _COLLECT.reset(token)
+
+
+@contextmanager
+def collect() -> Iterator[List[Span]]:
+    """Collect the spans finished inside the block (in finish order)."""
+    with attach(_Collector()) as c:
+        yield c.spans
+
+
+class JsonlExporter:
+    """Appends one JSON line per finished span."""
+
+    def __init__(self, path: str | Path = TRACE_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def on_start(self, sp: Span) -> None:
+        pass
+
+    def on_end(self, sp: Span) -> None:
+        line = json.dumps(sp.to_dict(), default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class OTelExporter:
+    """Mirrors spans into OpenTelemetry (parentage, attributes, errors)."""
+
+    def __init__(self, tracer: Any = None):
+        from opentelemetry import trace           # pip install opentelemetry-api
+        self._trace  = trace
+        self._tracer = tracer or trace.get_tracer("i2i")
+        self._live: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, sp: Span) -> None:
+        with self._lock:
+            parent = self._live.get(sp.parent_id) if sp.parent_id else None
+        ctx = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel = self._tracer.start_span(sp.name, context=ctx,
+                                       start_time=int(sp.start * 1e9))
+        otel.set_attribute("i2i.run_id", sp.trace_id)
+        with self._lock:
+            self._live[sp.span_id] = otel
+
+    def on_end(self, sp: Span) -> None:
+        with self._lock:
+            otel = self._live.pop(sp.span_id, None)
+        if otel is None:
+            return
+        for k, v in sp.attrs.items():
+            otel.set_attribute(k, v if isinstance(v, (str, bool, int, float)) else str(v))
+        if sp.error:
+            from opentelemetry.trace import Status, StatusCode
+            otel.set_status(Status(StatusCode.ERROR, sp.error))
+        otel.end(end_time=int(sp.end * 1e9))
+
+
+def add_exporter(exporter: Any) -> None:
+    _EXPORTERS.append(exporter)
+
+
+def remove_exporter(exporter: Any) -> None:
+    if exporter in _EXPORTERS:
+        _EXPORTERS.remove(exporter)
+
+
+def configure_from_env() -> None:
+    for name in filter(None, (s.strip() for s in os.getenv("TRACE_EXPORTERS", "").split(","))):
+        try:
+            add_exporter({"jsonl": JsonlExporter, "otel": OTelExporter}[name]())
+        except KeyError:
+            log.warning("unknown trace exporter %r", name)
+        except ImportError as e:
+            log.warning("trace exporter %r unavailable: %s", name, e)
+
+
+# ────────── outbound HTTP (Supabase clients) ───────────────────────────
+def body_size(message: Any) -> int:
+    """Bytes of an httpx request/response body; Content-Length if unread."""
+    try:
+        return len(message.content)
+    except Exception:                           # streaming body, not read (yet)
+        return int(message.headers.get("content-length") or 0)
+
+
+_SB_REQUESTS = metrics.counter("supabase_requests_total",
+                               "Supabase HTTP requests by kind and status", ["kind", "status"])
+_SB_SECONDS  = metrics.histogram("supabase_request_seconds",
+                                 "Supabase HTTP latency", ["kind"])
+
+
+def _classify(request: httpx.Request) -> Tuple[str, Dict[str, Any]]:
+    """(kind, span attrs) of a Supabase request: rpc, rest, storage, …"""
+    parts = request.url.path.strip("/").split("/")   # e.g. rest/v1/rpc/match_vectors
+    service, rest = parts[0] if parts else "", parts[2:]
+    if service == "rest" and rest[:1] == ["rpc"]:
+        return "rpc", {"fn": "/".join(rest[1:]), "method": request.method}
+    if service == "rest":
+        return "rest", {"table": rest[0] if rest else "", "method": request.method}
+    if service in ("storage", "functions", "auth"):
+        return service, {"path": "/".join(rest), "method": request.method}
+    return "http", {"path": request.url.path, "method": request.method}
+
+
+_INNER_OVERRIDE: httpx.BaseTransport | None = None
+
+
+def set_inner_transport(transport: httpx.BaseTransport | None) -> httpx.BaseTransport | None:
+    """
+    Send every TracedTransport's requests to *transport* instead of the
+    network (None restores it); returns the previous override.
+    backend.offline uses this for stubbed / recorded Supabase responses.
+    """
+    global _INNER_OVERRIDE
+    prev, _INNER_OVERRIDE = _INNER_OVERRIDE, transport
+    return prev
+
+
+class TracedTransport(httpx.BaseTransport):
+    """
+    httpx transport for Supabase clients: every request runs in a span
+    and feeds the supabase_requests_total / _seconds metrics.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport | None = None):
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        kind, attrs = _classify(request)
+        status = "error"
+        t0 = time.perf_counter()
+        try:
+            with span(f"supabase.{kind}", **attrs) as sp:
+                resp = (_INNER_OVERRIDE or self.inner).handle_request(request)
+                resp.read()                     # Supabase bodies are small JSON / files
+                status = str(resp.status_code)
+                sp.set(status=resp.status_code, bytes_out=body_size(request),
+                       bytes_in=len(resp.content))
+                return resp
+        finally:
+            _SB_SECONDS.observe(time.perf_counter() - t0, kind=kind)
+            _SB_REQUESTS.inc(kind=kind, status=status)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def supabase_options() -> Any:
+    """
+    `options=` for `create_client` routing its HTTP through TracedTransport,
+    or None on supabase-py versions without `ClientOptions.httpx_client`.
+    """
+    try:
+        from supabase import ClientOptions
+    except ImportError:
+        return None
+    if "httpx_client" not in getattr(ClientOptions, "__dataclass_fields__", {}):
+        return None
+    return ClientOptions(httpx_client=traced_client())
+
+
+def traced_client(**kwargs: Any) -> httpx.Client:
+    """httpx.Client on a TracedTransport (Supabase defaults: 120 s timeout)."""
+    kwargs.setdefault("timeout", httpx.Timeout(120.0, connect=10.0))
+    return httpx.Client(transport=TracedTransport(), **kwargs)
+
+
+configure_from_env()
+
+
+__all__ = [
+    "Span",
+    "active",
+    "span",
+    "traced",
+    "run_context",
+    "current_run_id",
+    "attach",
+    "collect",
+    "JsonlExporter",
+    "OTelExporter",
+    "add_exporter",
+    "remove_exporter",
+    "body_size",
+    "TracedTransport",
+    "set_inner_transport",
+    "supabase_options",
+    "traced_client",
+]
@@ -9,26 +9,54 @@ import os
 from typing import Any, Dict, List
 
 import openai
+from langchain_core.documents import Document
 from supabase import create_client, Client
 
+from backend import budget, metrics, tracing
+from backend.embed_batch import MicroBatcher
+from backend.embed_cache import cached_embed, cached_embed_many
+from backend.openai_scheduler import openai_client
+
 # --------------------------------------------------------------------------- #
 # 1.  Config & helpers
 # --------------------------------------------------------------------------- #
 openai.api_key = os.environ["OPENAI_API_KEY"]
 _MODEL_EMBED   = "text-embedding-3-small"          # ⇢ same model stored in DB
+_OA            = openai_client()                   # shared rate-limit budget
 
 _SB: Client = create_client(
     os.environ["SUPABASE_URL"],
     os.environ["SUPABASE_KEY"],
+    options=tracing.supabase_options(),
 )
 
 
 def _embed(text: str) -> List[float]:
-    """One-liner wrapper for OpenAI’s embedding endpoint."""
-    return openai.embeddings.create(
+    """One-liner wrapper for OpenAI’s embedding endpoint (disk-cached)."""
+    metrics.tally("embed")
+    with tracing.span("embed", model=_MODEL_EMBED, chars=len(text)):
+        return cached_embed(_MODEL_EMBED, text, _embed_remote)
+
+
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """Batch variant: cache hits locally, all misses in one OpenAI call."""
+    return cached_embed_many(_MODEL_EMBED, texts, _embed_many_remote)
+
+
+def _embed_remote(text: str) -> List[float]:
+    # coalesced with other sessions' misses by the micro-batcher
+    return _BATCHER.submit(text)
+
+
+def _embed_many_remote(texts: List[str]) -> List[List[float]]:
+    resp = _OA.embeddings.create(
         model=_MODEL_EMBED,
-        input=text,
-    ).data[0].embedding
+        input=texts,
+    )
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+_BATCHER = MicroBatcher(_embed_many_remote, name="openai-embed")
 
 
 # Make the embedder usable elsewhere
@@ -45,12 +73,20 @@ def match_vectors(
     k: int = 10,
     tenant: str = "default",
     doc_id: str | None = None,
+    q_vec: List[float] | None = None,
 ) -> List[Dict[str, Any]]:
     """
     Call the `match_vectors` Postgres function and return
     a list of rows + raw cosine **similarity** (higher = closer).
+    A precomputed `q_vec` (same embedding model) skips embedding `q_text`.
+    Inside a budgeted json_graph run `k` is trimmed to the chunks left.
     """
-    q_vec = _embed(q_text)
+    k = budget.limit_chunks(k)
+    if k <= 0:
+        return []
+    budget.check(calls=1)
+    if q_vec is None:
+        q_vec = _embed(q_text)
 
     params: Dict[str, Any] = {
         "table_name": table_name,
@@ -61,6 +97,7 @@ def match_vectors(
     }
 
     rows = _SB.rpc("match_vectors", params).execute().data or []
+    budget.charge(calls=1, chunks=len(rows))
 
     out: List[Dict[str, Any]] = []
     for r in rows:
@@ -72,7 +109,54 @@ def match_vectors(
 
 
 # --------------------------------------------------------------------------- #
-# 3.  Bulk task-embedding fetch (used by router)
+# 3.  LangChain-style retriever over match_vectors
+# --------------------------------------------------------------------------- #
+class SupaRetriever:
+    """
+    Retrieve top-k chunks from any table that stores (embedding, content, metadata).
+
+    Callers that already embedded the question (the workflow carries the
+    prompt vector in `WorkflowState.query_vec`) pass it as `q_vec` so the
+    question is not embedded a second time.
+    """
+
+    def __init__(
+        self,
+        table_name: str = "vector_chunks",
+        *,
+        k: int = 4,
+        tenant: str = "default",
+        doc_id: str | None = None,
+    ) -> None:
+        self.table_name = table_name
+        self.k = k
+        self.tenant = tenant
+        self.doc_id = doc_id
+
+    def get_relevant_documents(
+        self, query: str, *, q_vec: List[float] | None = None
+    ) -> List[Document]:
+        rows = match_vectors(
+            table_name=self.table_name,
+            q_text=query,
+            k=self.k,
+            tenant=self.tenant,
+            doc_id=self.doc_id,
+            q_vec=q_vec,
+        )
+        docs: List[Document] = []
+        for r in rows:
+            meta = r.get("metadata") or {}
+            if isinstance(meta, str):
+                meta = json.loads(meta)
+            meta = {**meta, "doc_id": r.get("doc_id", ""),
+                    "sim": r["sim"], "dist": 1 - r["sim"]}
+            docs.append(Document(page_content=r.get("content", ""), metadata=meta))
+        return docs
+
+
+# --------------------------------------------------------------------------- #
+# 4.  Bulk task-embedding fetch (used by router)
 # --------------------------------------------------------------------------- #
 def get_task_embeddings() -> List[Dict[str, Any]]:
     """Return enabled tasks with their stored embeddings."""
@@ -104,10 +188,12 @@ def get_task_embeddings() -> List[Dict[str, Any]]:
 
 
 # --------------------------------------------------------------------------- #
-# 4.  Public exports
+# 5.  Public exports
 # --------------------------------------------------------------------------- #
 __all__ = [
     "embed_text",
+    "embed_many",
     "match_vectors",
+    "SupaRetriever",
     "get_task_embeddings",
 ]
@@ -0,0 +1,143 @@
+"""
+backend.versioned_cache
+-----------------------
+Snapshot cache that stays fresh by polling a cheap version signal.
+
+`VersionedCache.get()` never blocks on the network once the first snapshot
+exists. At most every `poll_sec` it starts a background check of
+`version_fn()` (e.g. row count + max `updated_at`); when the version moved,
+it rebuilds — incrementally via `delta_loader` when one is given, else via
+the full `loader` — and swaps the new snapshot in with one assignment, so
+readers see either the old or the new value, never a half-built one.
+
+    _TASKS = VersionedCache(load_rows, lambda: table_version("task_manifest"))
+    rows = _TASKS.get()
+    _TASKS.invalidate()          # after a local publish: refresh right away
+
+Environment vars
+----------------
+SNAPSHOT_POLL_SEC   – minimum seconds between version checks (default: 30)
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+log = logging.getLogger(__name__)
+
+POLL_SEC = float(os.getenv("SNAPSHOT_POLL_SEC", "30"))
+
+T = TypeVar("T")
+
+
+class VersionedCache(Generic[T]):
+    def __init__(
+        self,
+        loader: Callable[[], T],
+        version_fn: Callable[[], Hashable],
+        *,
+        delta_loader: Optional[Callable[[T, Hashable, Hashable], Optional[T]]] = None,
+        poll_sec: float = POLL_SEC,
+        name: str = "snapshot",
+    ):
+        self.loader       = loader
+        self.version_fn   = version_fn
+        self.delta_loader = delta_loader
+        self.poll_sec     = poll_sec
+        self.name         = name
+        self.rebuilds     = 0
+
+        self._value: Optional[T]           = None
+        self._version: Optional[Hashable]  = None
+        self._checked     = 0.0
+        self._force       = False
+        self._lock        = threading.Lock()       # guards first build / swap
+        self._refreshing  = threading.Lock()       # one background refresh at a time
+
+    # ── reads ──
+    def get(self) -> T:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._build_full()
+            return self._value                      # type: ignore[return-value]
+        if self._force or time.monotonic() - self._checked >= self.poll_sec:
+            self._refresh_async()
+        return self._value
+
+    @property
+    def version(self) -> Optional[Hashable]:
+        return self._version
+
+    # ── writes ──
+    def invalidate(self) -> None:
+        """Force a version check on the next `get()` and start one now."""
+        self._force = True
+        if self._value is not None:
+            self._refresh_async()
+
+    def refresh(self) -> T:
+        """Synchronously check the version and rebuild if it moved."""
+        with self._refreshing:
+            self._refresh_if_changed()
+        return self.get()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._value, self._version = None, None
+
+    # ── internals ──
+    def _build_full(self) -> None:
+        version = self._safe_version()
+        value   = self.loader()
+        self._value, self._version = value, version
+        self._checked = time.monotonic()
+        self.rebuilds += 1
+
+    def _safe_version(self) -> Optional[Hashable]:
+        try:
+            return self.version_fn()
+        except Exception as e:                    # signal unavailable → always reload
+            log.warning("%s: version check failed: %s", self.name, e)
+            return None
+
+    def _refresh_async(self) -> None:
+        if not self._refreshing.acquire(blocking=False):
+            return                                # someone is already on it
+
+        def _run():
+            try:
+                self._refresh_if_changed()
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=_run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def _refresh_if_changed(self) -> None:
+        forced, self._force = self._force, False
+        self._checked = time.monotonic()
+        new_version = self._safe_version()
+        if not forced and new_version is not None and new_version == self._version:
+            return
+
+        try:
+            value = None
+            if (self.delta_loader is not None and self._value is not None
+                    and self._version is not None and new_version is not None):
+                value = self.delta_loader(self._value, self._version, new_version)
+            if value is None:
+                value = self.loader()
+        except Exception as e:                    # keep serving the old snapshot
+            log.warning("%s: rebuild failed, keeping previous snapshot: %s", self.name, e)
+            return
+
+        with self._lock:
+            self._value, self._version = value, new_version
+        self.rebuilds += 1
+        log.info("%s: rebuilt at version %s", self.name, new_version)
+
+
+__all__ = ["VersionedCache", "POLL_SEC"]
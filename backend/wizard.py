@@ -2,19 +2,20 @@
 Wizard helpers
 ──────────────
 • wizard_find_similar
-• wizard_start_plan_chat / wizard_chat_continue
+• wizard_start_plan_chat / wizard_chat_continue (+ _stream variant)
 • wizard_create_draft / wizard_update_fields / wizard_publish
 """
 from __future__ import annotations
 
 import json, uuid, re
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Tuple
+from typing import Iterator, List, Dict, Any, Tuple
 
-import openai
 from pydantic import BaseModel
 
 from backend.supabase     import _SB
+from backend.openai_scheduler import openai_client
+from backend.router_index import invalidate_routing as _invalidate_routing
 from backend.vector_search import match_vectors, embed_text
 
 
@@ -39,7 +40,7 @@ def wizard_find_similar(goal: str, k: int = 3) -> List[dict]:
 _SYS = ("You are the Workflow Wizard planner. Restate the user's goal in one "
         "paragraph (inputs, processing, output) and finish with 'Is that correct?'")
 
-_OA = openai.OpenAI()
+_OA = openai_client()
 
 def wizard_start_plan_chat(goal: str) -> List[dict]:
     msgs = [
@@ -65,6 +66,20 @@ def wizard_chat_continue(history: List[dict]) -> str:
     ).choices[0].message.content.strip()
 
 
+def wizard_chat_continue_stream(history: List[dict]) -> Iterator[str]:
+    """Same reply as `wizard_chat_continue`, yielded as text deltas."""
+    for chunk in _OA.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=history,
+        temperature=0.3,
+        max_tokens=180,
+        stream=True,
+    ):
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+
 # ──────────────────────────────────────────────────────────────────────
 # 3.  Minimal Pydantic draft model (no external import needed)          #
 # ──────────────────────────────────────────────────────────────────────
@@ -146,6 +161,8 @@ def wizard_publish(draft: WizardDraft) -> Tuple[bool, str]:
             }
         ).execute()
 
+        _invalidate_routing()
+
         _SB.table("wizard_drafts").update(
             {"published_at": datetime.now(timezone.utc).isoformat()}
         ).eq("draft_id", draft.draft_id).execute()
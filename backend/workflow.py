@@ -7,19 +7,24 @@ from __future__ import annotations
 import importlib
 from typing import Dict, Any
 import numpy as np
-from backend.vector_search import get_task_embeddings          # ⬅️ your util
+from backend.db_router import table_version
+from backend.router_index import RouterIndex
+from backend.versioned_cache import VersionedCache
+from backend.vector_search import _SB, get_task_embeddings     # ⬅️ your util
 from supabase import create_client, Client                     # or your wrapper
 
 # --- config ---
 SIM_THRESHOLD = 0.55     # change back to whatever you used
 
 # --------------------------------------------------------------------------- #
-# 1.  Load task-level embeddings once at import-time                           #
+# 1.  Task-level embeddings: loaded on first use, rebuilt when the table moves #
 # --------------------------------------------------------------------------- #
-rows = get_task_embeddings()         # returns [{task, embedding, helper_py}]
-TASK_EMB  = np.stack([r["embedding"] for r in rows])
-TASK_META = rows                     # keep task + helper filename handy
-TASK_NORM = np.linalg.norm(TASK_EMB, axis=1, keepdims=True)
+# get_task_embeddings() returns [{task, embedding, helper_py}]
+TASK_INDEX: VersionedCache[RouterIndex] = VersionedCache(
+    lambda: RouterIndex(get_task_embeddings()),
+    lambda: table_version("task_manifest", _SB),
+    name="workflow_tasks",
+)
 
 # --------------------------------------------------------------------------- #
 # 2.  Main entry point called by Streamlit                                    #
@@ -28,14 +33,11 @@ def run(prompt: str, **extra) -> Dict[str, Any]:
     """
     Vector-router → helper.run() → helper result
     """
-    emb = embed(prompt)                            # same model you stored with
-    sim = (TASK_EMB @ emb) / (TASK_NORM.squeeze() * np.linalg.norm(emb))
+    emb  = embed(prompt)                           # same model you stored with
+    hits = TASK_INDEX.get().search(emb, k=1, min_similarity=SIM_THRESHOLD)
 
-    best_idx = int(np.argmax(sim))
-    best_sim = float(sim[best_idx])
-
-    if best_sim >= SIM_THRESHOLD:
-        helper_mod = importlib.import_module(f"backend.helpers.{TASK_META[best_idx]['helper_py']}")
+    if hits:
+        helper_mod = importlib.import_module(f"backend.helpers.{hits[0][1]['helper_py']}")
     else:
         # last-ditch keyword stub until DB router lands
         helper_mod = _fallback_helper(prompt)
@@ -1,3 +1,24 @@
+from typing import Any, Dict, Iterable
+
+import streamlit as st
+
+
+def render_stream(events: Iterable[Dict[str, Any]]) -> None:
+    """
+    Consume `run_workflow_stream`: partial text is drawn into one
+    placeholder as tokens arrive, the final event goes through
+    `render_event` like a non-streamed one.
+    """
+    placeholder = st.empty()
+    for evt in events:
+        if evt.get("ui_event") == "partial":
+            placeholder.markdown(evt["content"] + "▌")
+            continue
+        placeholder.empty()
+        st.session_state['event'] = evt
+    render_event()
+
+
 def render_event():
     event = st.session_state.get('event')
     if not event:
@@ -20,6 +41,13 @@ def render_event():
         st.download_button("Download", output["url"], key="download_sow")
         return
 
+    if evt_type == "download_links" and output.get("urls"):
+        names = output.get("names") or []
+        for i, url in enumerate(output["urls"], 1):
+            label = names[i - 1] if i <= len(names) else f"Document {i}"
+            st.markdown(f"[{label}]({url})")
+        return
+
     if evt_type == "form":
         with st.form("dynamic_form"):
             answers = {}
@@ -35,6 +63,7 @@ def render_event():
             submitted = st.form_submit_button("Submit")
         if submitted:
             st.session_state['user_inputs'] = answers
+            st.session_state['run_id'] = output.get("run_id")
             st.rerun()
         return
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Replay a JSONL of sessions against run_workflow and report throughput,
+latency percentiles, error rate and per-stage breakdown (backend.loadtest).
+
+  {"prompt": "how much PTO do I get?"}
+  {"prompt": "draft an NDA", "answers": {"party": "Acme"}}
+
+Run:  PYTHONPATH=. python scripts/loadtest_workflow.py sessions.jsonl --concurrency 8
+      … --rate 20 --duration 60            open loop, Poisson arrivals
+      … --offline --stub-latency-ms 40     no network (backend.offline)
+      … --offline --recordings rec.jsonl   replay recorded responses
+      … --record rec.jsonl                 live run, capture responses
+      … --url http://host:8000/run         a service endpoint instead
+      … --max-error-rate 0.01 --max-p95-ms 2500   exit 1 when exceeded
+
+Sample sessions: scripts/loadtest_sessions.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+def _parse() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Replay-driven load test for run_workflow.")
+    ap.add_argument("sessions", help="JSONL: {\"prompt\": …, \"answers\": {…}} per line")
+    load = ap.add_mutually_exclusive_group(required=True)
+    load.add_argument("--concurrency", type=int, help="closed loop: parallel sessions")
+    load.add_argument("--rate", type=float, help="open loop: session arrivals per second")
+    ap.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    ap.add_argument("--max-inflight", type=int, default=256, help="open loop worker cap")
+    ap.add_argument("--requests", type=int, help="sessions to run (default: one pass)")
+    ap.add_argument("--duration", type=float, help="stop starting sessions after N seconds")
+    ap.add_argument("--warmup", type=int, default=0, help="unmeasured sessions first")
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--engine", choices=("langgraph", "fast"), help="override WORKFLOW_ENGINE")
+    ap.add_argument("--url", help="POST to this endpoint instead of calling in-process")
+    ap.add_argument("--no-profile", action="store_true", help="skip per-stage profiling")
+    ap.add_argument("--offline", action="store_true", help="stub OpenAI and Supabase")
+    ap.add_argument("--recordings", help="offline: recorded responses to replay")
+    ap.add_argument("--record", help="live: append responses to this recordings file")
+    ap.add_argument("--stub-latency-ms", type=float, default=0.0)
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("--max-error-rate", type=float)
+    ap.add_argument("--max-p95-ms", type=float)
+    return ap.parse_args()
+
+
+def _offline_env() -> None:
+    """Before any backend import: placeholder credentials, scratch caches."""
+    scratch = tempfile.mkdtemp(prefix="i2i-loadtest-")
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.offline.invalid")
+    os.environ.setdefault("SUPABASE_KEY", "offline")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+    os.environ["EMBED_CACHE_PATH"]   = os.path.join(scratch, "embeddings.sqlite")
+    os.environ["LLM_CACHE_PATH"]     = os.path.join(scratch, "llm_responses.sqlite")
+    os.environ["TEMPLATE_CACHE_DIR"] = os.path.join(scratch, "templates")
+
+
+def main() -> int:
+    args = _parse()
+    if args.offline:
+        _offline_env()
+    else:
+        from dotenv import load_dotenv          # pip install python-dotenv
+        load_dotenv()
+
+    from backend import loadtest, offline
+
+    if args.offline:
+        offline.install(args.recordings, latency_ms=args.stub_latency_ms)
+    elif args.record:
+        offline.install(record=args.record)
+
+    if args.url:
+        target = loadtest.HttpTarget(args.url, profile=not args.no_profile)
+    else:
+        if args.engine:
+            import backend.graph as g
+            g.reload_graph(args.engine)
+        target = loadtest.InProcessTarget(profile=not args.no_profile)
+
+    report = loadtest.run(
+        loadtest.load_sessions(args.sessions), target,
+        concurrency=args.concurrency, rate=args.rate, arrival=args.arrival,
+        total=args.requests, duration=args.duration, warmup=args.warmup,
+        max_inflight=args.max_inflight, seed=args.seed,
+    )
+    offline.uninstall()                         # closes a recordings file
+
+    summary = report.to_dict()
+    print(json.dumps(summary, indent=2) if args.json else report.format())
+
+    failed = []
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        failed.append(f"error rate {summary['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.max_p95_ms is not None and summary["latency_ms"]["p95"] > args.max_p95_ms:
+        failed.append(f"p95 {summary['latency_ms']['p95']:.1f} ms > {args.max_p95_ms:.1f} ms")
+    for f in failed:
+        print(f"FAIL: {f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
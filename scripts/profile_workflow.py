@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Profile one workflow request against the live backends.
+
+Prints the event and where the time went: wall / CPU / network time per
+node, embedding / LLM / RPC call counts, bytes, tokens and the slowest
+outbound calls (backend.profiling). `--cpu` adds a cProfile per node.
+
+Run:  PYTHONPATH=. python scripts/profile_workflow.py "how much PTO do I get?"
+      PYTHONPATH=. python scripts/profile_workflow.py "draft an NDA" \\
+          --answers '{"party": "Acme"}' --cpu --engine fast
+      … --json   → the raw event + profile as JSON
+
+.env needs SUPABASE_URL, SUPABASE_KEY and OPENAI_API_KEY, as for the app.
+"""
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv          # pip install python-dotenv
+
+load_dotenv()
+
+import backend.graph as g
+from backend.profiling import format_report
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("prompt")
+    ap.add_argument("--answers", help="form answers as a JSON object")
+    ap.add_argument("--run-id", help="resume a run paused on a form")
+    ap.add_argument("--engine", choices=("langgraph", "fast"), help="override WORKFLOW_ENGINE")
+    ap.add_argument("--cpu", action="store_true", help="cProfile each node")
+    ap.add_argument("--json", action="store_true", help="print raw JSON")
+    args = ap.parse_args()
+
+    if args.engine:
+        g.reload_graph(args.engine)
+    answers = json.loads(args.answers) if args.answers else None
+    event = g.run_workflow(args.prompt, answers, args.run_id,
+                           profile="cpu" if args.cpu else True)
+
+    if args.json:
+        print(json.dumps(event, indent=2, default=str))
+        return 0
+    report = event.pop("profile")
+    print(json.dumps(event, indent=2, default=str)[:2000])
+    print()
+    print(format_report(report))
+    return 0 if event.get("ui_event") != "error" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,9 @@ from supabase import create_client      # pip install supabase
 import openai                           # pip install openai
 from dotenv import load_dotenv          # pip install python-dotenv
 
+from backend.embed_cache import cached_embed, cached_embed_many
+from backend.openai_scheduler import BATCH as BATCH_PRIORITY, openai_client, priority
+
 MODEL  = "text-embedding-3-small"
 BATCH  = 50
 
@@ -33,10 +36,25 @@ if missing:
     sys.exit(f"❌ Missing env vars: {', '.join(missing)}")
 
 sb = create_client(url, key)
+oa = openai_client()          # shares the app's rate budget, queued behind interactive calls
 
 # ── helpers -------------------------------------------------------------------
 def embed(text: str) -> list[float]:
-    return openai.embeddings.create(model=MODEL, input=text).data[0].embedding
+    # unchanged titles/phrases are served from the shared embedding cache
+    return cached_embed(MODEL, text, _embed_remote)
+
+def _embed_remote(text: str) -> list[float]:
+    with priority(BATCH_PRIORITY):
+        return oa.embeddings.create(model=MODEL, input=text).data[0].embedding
+
+def embed_many(texts: list[str]) -> list[list[float]]:
+    # one OpenAI call per page of rows instead of one per row
+    return cached_embed_many(MODEL, texts, _embed_many_remote)
+
+def _embed_many_remote(texts: list[str]) -> list[list[float]]:
+    with priority(BATCH_PRIORITY):
+        resp = oa.embeddings.create(model=MODEL, input=texts)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
 
 # ── main ----------------------------------------------------------------------
 def run():
@@ -51,23 +69,27 @@ def run():
         )
         if not rows: break
 
+        todo = []
         for r in rows:
             title   = r["title"] or ""
             phrases = " ".join(r.get("phrase_examples") or [])
             txt     = f"{title} {phrases}".strip()
             if not txt:
                 print(f"⚠️  {r['task']} has no text — skipping"); continue
+            todo.append((r["task"], txt))
 
-            try:
-                vec = embed(txt)
-            except Exception as e:
-                print(f"❌  {r['task']} embedding failed: {e}"); continue
+        try:
+            vecs = embed_many([txt for _, txt in todo])
+        except Exception as e:
+            print(f"❌  batch at offset {offset} embedding failed: {e}")
+            offset += BATCH; continue
 
+        for (task, _), vec in zip(todo, vecs):
             sb.table("task_manifest")\
               .update({"embedding": json.dumps(vec)})\
-              .eq("task", r["task"]).execute()
-            print(f"✔  {r['task']} updated")
-            time.sleep(0.4)   # gentle pacing
+              .eq("task", task).execute()
+            print(f"✔  {task} updated")
+        time.sleep(0.4)   # gentle pacing between batches
 
         offset += BATCH
     print("🎉  Re-embedding complete.")
@@ -1,7 +1,10 @@
 import { serve } from 'https://deno.land/std@0.199.0/http/server.ts'
 
+// Accepts either { text: string }      → { embedding: number[] }
+//            or { texts: string[] }    → { embeddings: number[][] }  (same order)
 serve(async (req: Request) => {
-  const { text } = await req.json()
+  const { text, texts } = await req.json()
+  const batch: string[] = Array.isArray(texts) ? texts : [text]
 
   const openaiRes = await fetch('https://api.openai.com/v1/embeddings', {
     method: 'POST',
@@ -10,13 +13,21 @@ serve(async (req: Request) => {
       'Authorization': `Bearer ${Deno.env.get('OPENAI_API_KEY')}`,
     },
     body: JSON.stringify({
-      input: text,
+      input: batch,
       model: 'text-embedding-3-small'   // or 'text-embedding-ada-002'
     }),
   }).then(r => r.json())
 
+  // OpenAI tags each result with its input index; don't rely on array order
+  const vectors: number[][] = new Array(batch.length)
+  for (const d of openaiRes.data) vectors[d.index] = d.embedding
+
+  const body = Array.isArray(texts)
+    ? { embeddings: vectors }
+    : { embedding: vectors[0] }
+
   return new Response(
-    JSON.stringify({ embedding: openaiRes.data[0].embedding }),
+    JSON.stringify(body),
     { headers: { 'Content-Type': 'application/json' } },
   )
 })
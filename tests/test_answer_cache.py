@@ -0,0 +1,52 @@
+import numpy as np
+
+from backend import answer_cache as ac
+from backend.answer_cache import SemanticAnswerCache
+
+
+def test_near_duplicate_questions_share_an_answer():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("hb", ("v", 1), [1.0, 0.0, 0.0], {"content": "20 days"})
+
+    assert cache.lookup("hb", ("v", 1), [0.99, 0.05, 0.0])[1]["content"] == "20 days"
+    assert cache.lookup("hb", ("v", 1), [0.0, 1.0, 0.0]) is None      # different question
+    assert cache.lookup("other", ("v", 1), [1.0, 0.0, 0.0]) is None   # different doc
+    assert cache.lookup("hb", ("v", 2), [1.0, 0.0, 0.0]) is None      # re-ingested doc
+
+
+def test_cached_answer_invalidated_on_reingest(monkeypatch):
+    versions = {"hb": (10, "2025-01-01")}
+    monkeypatch.setattr(ac, "_fetch_doc_version", lambda doc_id: versions[doc_id])
+    monkeypatch.setattr(ac, "VERSION_SEC", 0)
+    monkeypatch.setattr(ac, "ANSWERS", SemanticAnswerCache(threshold=0.9))
+    ac.invalidate_doc()
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"ui_event": "text", "content": f"answer {len(calls)}"}
+
+    vec = np.array([0.3, 0.4, 0.5])
+    assert ac.cached_answer("pto?", "hb", vec, compute)["content"] == "answer 1"
+    assert ac.cached_answer("PTO ?", "hb", vec * 1.01, compute)["content"] == "answer 1"
+    assert len(calls) == 1
+
+    versions["hb"] = (10, "2025-02-01")                                # chunks re-upserted
+    assert ac.cached_answer("pto?", "hb", vec, compute)["content"] == "answer 2"
+
+    ac.invalidate_doc("hb")
+    assert ac.cached_answer("pto?", "hb", vec, compute)["content"] == "answer 3"
+
+
+def test_unknown_version_bypasses_cache(monkeypatch):
+    def boom(doc_id):
+        raise RuntimeError("no updated_at column")
+
+    monkeypatch.setattr(ac, "_fetch_doc_version", boom)
+    ac.invalidate_doc()
+    calls = []
+    for _ in range(2):
+        ac.cached_answer("q", "hb", [1.0, 0.0], lambda: calls.append(1) or {"content": "x"})
+    assert len(calls) == 2
+    ac.invalidate_doc()
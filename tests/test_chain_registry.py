@@ -0,0 +1,91 @@
+import pytest
+
+from backend.chain_registry import LazyRegistry
+
+
+def _registry(rows, ttl=60.0, **kw):
+    fetched, built = [], []
+
+    def fetch(cid):
+        fetched.append(cid)
+        return rows.get(cid)
+
+    def build(row):
+        built.append(row["chain_id"])
+        if row["chain_json"].get("broken"):
+            raise ValueError("bad spec")
+        return ("chain", row["chain_id"], row["chain_json"]["v"])
+
+    reg = LazyRegistry(fetch, build, list_ids=lambda: list(rows), ttl=ttl, **kw)
+    return reg, fetched, built
+
+
+def test_loads_on_first_request_only():
+    rows = {"c1": {"chain_id": "c1", "chain_json": {"v": 1}}}
+    reg, fetched, built = _registry(rows)
+    reg["builtin"] = "static"
+
+    assert list(reg) == ["builtin"]               # nothing fetched at start
+    assert reg["c1"] == ("chain", "c1", 1)
+    assert reg["c1"] == ("chain", "c1", 1)
+    assert fetched == ["c1"] and built == ["c1"]
+    assert "builtin" in reg and "c1" in reg
+    assert reg.available() == ["builtin", "c1"]
+
+
+def test_unknown_and_invalid_ids_are_negatively_cached():
+    rows = {"bad": {"chain_id": "bad", "chain_json": {"broken": True}}}
+    reg, fetched, _ = _registry(rows)
+    for _ in range(3):
+        assert "nope" not in reg
+        with pytest.raises(KeyError):
+            reg["bad"]
+    assert fetched == ["nope", "bad"]
+
+
+def test_ttl_recheck_rebuilds_only_on_change_and_targeted_invalidate():
+    rows = {"c1": {"chain_id": "c1", "chain_json": {"v": 1}},
+            "c2": {"chain_id": "c2", "chain_json": {"v": 1}}}
+    reg, fetched, built = _registry(rows, ttl=0)
+
+    reg["c1"]
+    reg["c1"]                                     # expired → refetch, same hash
+    assert built == ["c1"] and fetched == ["c1", "c1"]
+
+    rows["c1"]["chain_json"] = {"v": 2}
+    assert reg["c1"][2] == 2
+    assert built == ["c1", "c1"]
+
+    reg.ttl = 60
+    reg["c2"]
+    reg.invalidate("c2")
+    reg["c2"]
+    reg["c1"]
+    assert fetched.count("c2") == 2 and fetched.count("c1") == 3
+
+
+def test_lru_bound():
+    rows = {f"c{i}": {"chain_id": f"c{i}", "chain_json": {"v": i}} for i in range(5)}
+    reg, _, _ = _registry(rows, max_items=2)
+    for i in range(5):
+        reg[f"c{i}"]
+    assert sorted(reg) == ["c3", "c4"]
+
+
+def test_fetch_error_after_ttl_serves_the_cached_chain():
+    rows = {"c1": {"chain_id": "c1", "chain_json": {"v": 1}}}
+    calls = []
+
+    def fetch(cid):
+        calls.append(cid)
+        if len(calls) > 1:
+            raise ConnectionError("supabase down")
+        return rows.get(cid)
+
+    reg = LazyRegistry(fetch, lambda row: ("chain", row["chain_json"]["v"]), ttl=0)
+    assert reg["c1"] == ("chain", 1)
+    assert reg["c1"] == ("chain", 1)              # expired, fetch fails → stale
+    assert len(calls) == 2
+
+    with pytest.raises(ConnectionError):          # nothing cached → error surfaces
+        reg["c2"]
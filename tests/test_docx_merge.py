@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import docx
+
+from backend.tools.docx_merge import MergeTemplate
+
+
+def _template(build):
+    d = docx.Document()
+    build(d)
+    buf = io.BytesIO()
+    d.save(buf)
+    return buf.getvalue()
+
+
+def test_split_runs_keep_their_formatting():
+    def build(d):
+        p = d.add_paragraph()
+        p.add_run("Dear {{cli")
+        bold = p.add_run("ent}}, total ")
+        bold.bold = True
+        p.add_run("{{ cost }} {{unknown}}")
+
+    tpl = MergeTemplate(_template(build))
+    assert tpl.fields == {"client", "cost", "unknown"}
+
+    out = docx.Document(io.BytesIO(tpl.render({"client": "A&B <Ltd>", "cost": 5})))
+    para = out.paragraphs[0]
+    assert para.text == "Dear A&B <Ltd>, total 5 {{unknown}}"
+    assert [r.bold for r in para.runs] == [None, True, None]
+
+
+def test_tables_headers_and_untouched_members():
+    def build(d):
+        d.add_table(rows=1, cols=1).cell(0, 0).text = "Client: {{client}}"
+        d.sections[0].header.paragraphs[0].text = "{{client}} – SOW"
+
+    blob = _template(build)
+    out  = MergeTemplate(blob).render({"client": "ACME"})
+
+    doc = docx.Document(io.BytesIO(out))
+    assert doc.tables[0].cell(0, 0).text == "Client: ACME"
+    assert doc.sections[0].header.paragraphs[0].text == "ACME – SOW"
+
+    src, dst = zipfile.ZipFile(io.BytesIO(blob)), zipfile.ZipFile(io.BytesIO(out))
+    assert dst.testzip() is None
+    assert src.namelist() == dst.namelist()
+    assert src.read("word/styles.xml") == dst.read("word/styles.xml")
@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from backend.embed_batch import MicroBatcher
+
+
+def test_concurrent_submits_coalesce_into_one_call():
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [len(t) for t in texts]
+
+    mb = MicroBatcher(batch_fn, window_ms=50, max_batch=64)
+    results = {}
+
+    def worker(i):
+        barrier.wait()
+        results[i] = mb.submit("x" * (i % 4 + 1))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: i % 4 + 1 for i in range(8)}
+    assert len(calls) < 8
+    assert all(len(c) == len(set(c)) for c in calls)       # deduplicated
+
+
+def test_window_zero_disables_batching_and_errors_propagate():
+    def boom(texts):
+        raise ValueError("upstream down")
+
+    mb = MicroBatcher(boom, window_ms=0)
+    with pytest.raises(ValueError):
+        mb.submit("hello")
+    assert mb.stats()["calls"] == 1
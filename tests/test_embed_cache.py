@@ -0,0 +1,61 @@
+import numpy as np
+
+import backend.embed_cache as ec
+from backend.embed_cache import EmbeddingCache
+
+
+def test_hit_after_miss_and_whitespace_normalised(tmp_path):
+    cache = EmbeddingCache(tmp_path / "emb.sqlite", max_items=10)
+    assert cache.get("m", "create an SOW") is None
+
+    cache.put("m", "create an SOW", [0.5, 0.25, 1.0])
+    vec = cache.get("m", "  create   an SOW ")
+    assert vec.dtype == np.float32
+    assert vec.tolist() == [0.5, 0.25, 1.0]
+    assert cache.get("other-model", "create an SOW") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 1}
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = EmbeddingCache(tmp_path / "emb.sqlite", max_items=3)
+    for i in range(3):
+        cache.put("m", f"t{i}", [float(i)])
+    cache.get("m", "t0")                  # touch → most recently used
+    cache.put("m", "t3", [3.0])           # over cap → evict down to 90 %
+
+    assert cache.get("m", "t0") is not None
+    assert cache.get("m", "t1") is None
+    assert cache.stats()["size"] <= 3
+
+
+def test_cached_embed_calls_upstream_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(ec, "_CACHE", EmbeddingCache(tmp_path / "emb.sqlite"))
+    monkeypatch.setattr(ec, "ENABLED", True)
+    calls = []
+
+    def fake(text):
+        calls.append(text)
+        return [1.0, 2.0]
+
+    assert ec.cached_embed("m", "hello", fake) == [1.0, 2.0]
+    assert ec.cached_embed("m", "hello", fake) == [1.0, 2.0]
+    assert calls == ["hello"]
+
+    monkeypatch.setattr(ec, "ENABLED", False)
+    ec.cached_embed("m", "hello", fake)
+    assert len(calls) == 2
+
+
+def test_cached_embed_many_only_sends_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(ec, "_CACHE", EmbeddingCache(tmp_path / "emb.sqlite"))
+    monkeypatch.setattr(ec, "ENABLED", True)
+    ec.get_cache().put("m", "a", [1.0])
+    sent = []
+
+    def fake_many(texts):
+        sent.append(texts)
+        return [[float(len(t))] for t in texts]
+
+    out = ec.cached_embed_many("m", ["a", "bb", "bb", "ccc"], fake_many)
+    assert out == [[1.0], [2.0], [2.0], [3.0]]
+    assert sent == [["bb", "ccc"]]
@@ -0,0 +1,189 @@
+import pytest
+
+import backend.json_executor as je
+from backend.json_executor import JSONGraphExecutor, compile_graph
+
+BUILT = []
+
+
+class Upper:
+    def __init__(self, key="prompt"):
+        BUILT.append(self)
+        self.key = key
+
+    def run(self, state):
+        return state.get(self.key, "").upper()
+
+
+class Pair:
+    stateless = True
+
+    def __init__(self):
+        BUILT.append(self)
+
+    def run(self, ctx, state):
+        return (ctx.get("tenant"), state["up"])
+
+
+SPEC = {
+    "type": "json_graph",
+    "entry": "up",
+    "nodes": {
+        "up":   {"type": f"{__name__}.Upper", "params": {"key": "prompt"}, "next": ["pair"]},
+        "pair": {"type": f"{__name__}.Pair"},
+    },
+}
+
+
+def test_plan_is_compiled_once_and_reused(monkeypatch):
+    je.clear_plan_cache()
+    BUILT.clear()
+    plan = compile_graph(SPEC)
+    assert [n.arity for n in plan.steps] == [1, 2]
+    assert plan.steps[1].instance is not None          # stateless → pre-built
+    assert compile_graph(dict(reversed(list(SPEC.items())))) is plan
+
+    # steady state: no imports / reflection
+    monkeypatch.setattr(je.importlib, "import_module", lambda *_: pytest.fail("import"))
+    monkeypatch.setattr(je.inspect, "signature", lambda *_: pytest.fail("reflection"))
+    out = JSONGraphExecutor(SPEC).run({"tenant": "acme"}, {"prompt": "hi"})
+    assert out["pair"] == ("acme", "HI")
+    JSONGraphExecutor(SPEC).run({}, {"prompt": "again"})
+    assert sum(isinstance(b, Pair) for b in BUILT) == 1     # shared instance
+    assert sum(isinstance(b, Upper) for b in BUILT) == 2    # one per run
+
+
+def test_cycle_is_rejected_at_compile_time():
+    spec = {"type": "json_graph", "entry": "a", "nodes": {
+        "a": {"type": f"{__name__}.Upper", "next": ["b"]},
+        "b": {"type": f"{__name__}.Upper", "next": ["a"]},
+    }}
+    with pytest.raises(RuntimeError, match="cycle"):
+        compile_graph(spec)
+
+
+class Slow:
+    def __init__(self, tag=""):
+        self.tag = tag
+
+    def run(self, state):
+        import time
+        time.sleep(0.2)
+        return self.tag
+
+
+class AsyncFetch:
+    def __init__(self, tag=""):
+        self.tag = tag
+
+    async def run(self, ctx, state):
+        import asyncio
+        await asyncio.sleep(0.2)
+        return self.tag
+
+
+class Join:
+    def run(self, state):
+        return sorted(v for k, v in state.items() if k in ("a", "b"))
+
+
+def test_independent_branches_run_concurrently():
+    import time
+
+    spec = {"type": "json_graph", "entry": "start", "nodes": {
+        "start": {"type": f"{__name__}.Upper", "next": ["a", "b"]},
+        "a":     {"type": f"{__name__}.Slow", "params": {"tag": "docs-A"}, "next": ["draft"]},
+        "b":     {"type": f"{__name__}.AsyncFetch", "params": {"tag": "docs-B"}, "next": ["draft"]},
+        "draft": {"type": f"{__name__}.Join"},
+    }}
+    plan = compile_graph(spec)
+    assert plan.parallel
+    assert [n.name for n in plan.steps][0] == "start"
+    assert [n.name for n in plan.steps][-1] == "draft"
+
+    t0 = time.perf_counter()
+    out = JSONGraphExecutor(spec).run({}, {"prompt": "x"})
+    assert time.perf_counter() - t0 < 0.35
+    assert out["draft"] == ["docs-A", "docs-B"]
+
+
+def test_async_node_runs_inside_a_running_event_loop():
+    import asyncio
+
+    spec = {"type": "json_graph", "entry": "fetch", "nodes": {
+        "fetch": {"type": f"{__name__}.AsyncFetch", "params": {"tag": "docs"}},
+    }}
+
+    async def handler():                                # e.g. an async web endpoint
+        return JSONGraphExecutor(spec).run({}, {})
+
+    assert asyncio.run(handler())["fetch"] == "docs"
+
+
+def test_unknown_next_is_rejected_at_compile_time():
+    spec = {"type": "json_graph", "entry": "a", "nodes": {
+        "a": {"type": f"{__name__}.Upper", "next": ["ghost"]},
+    }}
+    with pytest.raises(ValueError, match="ghost"):
+        compile_graph(spec)
+
+
+class Spend:
+    """Stands in for an LLM step: picks a model, charges tokens + one call."""
+
+    def __init__(self, tokens=0):
+        self.tokens = tokens
+
+    def run(self, state):
+        from backend import budget
+        model = budget.pick_model("gpt-4o")
+        budget.check(calls=1, tokens=self.tokens)
+        budget.charge(calls=1, tokens=self.tokens)
+        return {"ui_event": "text", "content": model}
+
+
+def _spend_spec(guard, *costs):
+    names = [f"s{i}" for i in range(len(costs))]
+    return {"type": "json_graph", "entry": "s0", "cost_guard": guard, "nodes": {
+        n: {"type": f"{__name__}.Spend", "params": {"tokens": c},
+            "next": names[i + 1:i + 2]}
+        for i, (n, c) in enumerate(zip(names, costs))
+    }}
+
+
+def test_invoke_reports_usage_and_degrades_model():
+    spec = _spend_spec({"max_tokens": 1000, "degrade_at": 0.5}, 600, 100)
+    event = JSONGraphExecutor(spec).invoke({"prompt": "q"})
+    assert event["content"] == "gpt-4o-mini"            # 60 % spent → fallback model
+    usage = event["usage"]
+    assert usage["used"]["tokens"] == 700 and usage["used"]["calls"] == 2
+    assert usage["nodes"]["s0"]["tokens"] == 600 and "wall_sec" in usage["nodes"]["s1"]
+    assert usage["degraded"] == ["model:gpt-4o->gpt-4o-mini"]
+
+
+def test_invoke_aborts_when_a_budget_is_blown():
+    event = JSONGraphExecutor(_spend_spec({"max_calls": 1}, 10, 10, 10)).invoke({})
+    assert event["ui_event"] == "error" and "calls budget" in event["content"]
+    assert list(event["usage"]["nodes"]) == ["s0", "s1"]    # s2 never started
+
+    spec = {"type": "json_graph", "entry": "start", "cost_guard": {"max_wall_sec": 0.05},
+            "nodes": {
+                "start": {"type": f"{__name__}.Upper", "next": ["a", "b"]},
+                "a":     {"type": f"{__name__}.Slow", "next": ["draft"]},
+                "b":     {"type": f"{__name__}.Slow", "next": ["draft"]},
+                "draft": {"type": f"{__name__}.Join"},
+            }}
+    with pytest.raises(je.BudgetExceeded, match="wall_sec"):
+        JSONGraphExecutor(spec).run({}, {"prompt": "x"})
+
+
+def test_legacy_executor_applies_cost_guard():
+    from backend import executor
+
+    spec = {k: v for k, v in _spend_spec({"max_calls": 1}, 10, 10).items() if k != "entry"}
+    event = executor.JSONGraphExecutor(spec).invoke({"prompt": "q"})
+    assert event["ui_event"] == "error" and "calls budget" in event["content"]
+    assert event["usage"]["used"]["calls"] == 1
+
+    with pytest.raises(je.BudgetExceeded, match="calls"):
+        executor.JSONGraphExecutor(spec).run({})
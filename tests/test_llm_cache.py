@@ -0,0 +1,75 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import pytest
+
+from backend import llm, llm_cache
+from backend.llm_cache import ResponseCache
+
+
+class _Completions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **request):
+        self.calls.append(request)
+        msg = type("M", (), {"content": f"answer {len(self.calls)}"})
+        return type("R", (), {"choices": [type("C", (), {"message": msg})]})
+
+
+@pytest.fixture
+def fake_api(monkeypatch, tmp_path):
+    completions = _Completions()
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": completions})})
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    monkeypatch.setattr(llm, "get_prompt", lambda name, version=None: "Q: {QUESTION}")
+    monkeypatch.setattr(llm_cache, "_CACHE", ResponseCache(tmp_path / "llm.sqlite"))
+    return completions
+
+
+def test_deterministic_calls_hit_cache(fake_api):
+    a = llm.call_llm("p", {"QUESTION": "pto?"}, temperature=0, cache=True)
+    b = llm.call_llm("p", {"QUESTION": "pto?"}, temperature=0, cache=True)
+    c = llm.call_llm("p", {"QUESTION": "sick?"}, temperature=0, cache=True)
+    assert a == b != c
+    assert len(fake_api.calls) == 2
+
+
+def test_sampling_bypasses_cache(fake_api):
+    llm.call_llm("p", {"QUESTION": "pto?"}, temperature=0.2, cache=True)
+    llm.call_llm("p", {"QUESTION": "pto?"}, temperature=0.2, cache=True)
+    assert len(fake_api.calls) == 2
+    assert llm_cache.get_cache().stats()["size"] == 0
+
+
+def test_policy_qna_answers_use_the_cache(fake_api, monkeypatch):
+    from langchain_core.documents import Document
+
+    import backend.helpers.policy_qna as policy_qna
+
+    class Retriever:
+        def __init__(self, *a, **kw):
+            pass
+
+        def get_relevant_documents(self, question, q_vec=None):
+            return [Document(page_content="PTO is 20 days.", metadata={})]
+
+    monkeypatch.setattr(policy_qna, "SupaRetriever", Retriever)
+    a = policy_qna._answer("pto?", "handbook_2024", [0.1])
+    b = policy_qna._answer("pto?", "handbook_2024", [0.1])
+    assert a["content"] == b["content"]
+    assert len(fake_api.calls) == 1 and fake_api.calls[0]["temperature"] == 0
+
+
+def test_ttl_and_eviction(tmp_path):
+    cache = ResponseCache(tmp_path / "c.sqlite", max_items=10, ttl=3600)
+    for i in range(12):
+        cache.put(f"k{i}", "m", f"v{i}")
+    assert cache.stats()["size"] <= 10
+    assert cache.get("k11") == "v11"
+
+    cache.ttl = 0
+    assert cache.get("k11") is None
@@ -0,0 +1,80 @@
+import json
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+import backend.graph as g
+from backend import embed_cache, loadtest, offline
+
+SESSIONS = [
+    {"prompt": "how much PTO?"},
+    {"prompt": "draft an NDA", "answers": {"party": "Acme"}},
+    {"prompt": "boom"},
+]
+
+
+def fake_target(prompt, answers, run_id):
+    if prompt == "boom":
+        raise RuntimeError("chain exploded")
+    if prompt == "draft an NDA" and not answers:
+        return {"ui_event": "form", "fields": ["party"], "run_id": "r1"}
+    assert run_id == ("r1" if answers else None)
+    return {"ui_event": "text", "content": "ok",
+            "profile": {"nodes": {"process_node": {"wall_ms": 2.0, "cpu_ms": 1.0,
+                                                   "network_ms": 0.5}},
+                        "calls": {"llm": 1}, "bytes": {"sent": 10, "received": 20},
+                        "tokens": 7}}
+
+
+@pytest.mark.parametrize("load", [{"concurrency": 2}, {"rate": 200.0, "arrival": "uniform"}])
+def test_replay_report(load):
+    report = loadtest.run(SESSIONS, fake_target, total=6, **load).to_dict()
+
+    assert report["sessions"] == 6 and report["requests"] == 8     # 2 form resubmissions
+    assert set(report["by_step"]) == {"prompt", "resume"}
+    assert report["errors"] == 2 and report["error_rate"] == 0.25
+    assert report["error_kinds"] == {"RuntimeError": 2}
+    assert report["ui_events"] == {"text": 4, "form": 2, "none": 2}
+    assert report["throughput_rps"] > 0
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+    assert report["stages"]["process_node"]["wall_ms"]["p50"] == 2.0
+    assert report["per_request"]["calls"] == {"llm": 1.0}
+    assert report["per_request"]["tokens"] == 7
+
+
+def test_percentile_interpolates():
+    assert loadtest.percentile([1, 2, 3, 4], 50) == 2.5
+    assert loadtest.percentile([5], 99) == 5
+
+
+def test_recordings_replay(tmp_path):
+    rec = offline.Recorder(tmp_path / "rec.jsonl")
+    rec.record("POST", "/functions/v1/embed", json.dumps({"texts": ["a", "b"]}).encode(),
+               200, {}, json.dumps({"embeddings": [[1.0, 0.0], [0.0, 1.0]]}).encode())
+    rec.record("POST", "/rest/v1/rpc/match_vectors", b'{"k": 6}', 200,
+               {"content-type": "application/json"}, b'[{"payload": {}, "score": 0.9}]')
+    rec.close()
+
+    stub = offline.StubBackend(offline.Recordings(tmp_path / "rec.jsonl"))
+    _, _, body = stub.respond("POST", "/functions/v1/embed", b'{"texts": ["b", "zzz"]}')
+    vecs = json.loads(body)["embeddings"]
+    assert vecs[0] == [0.0, 1.0] and len(vecs[1]) == offline.DIMS    # unknown → hash vector
+    _, _, body = stub.respond("POST", "/rest/v1/rpc/match_vectors", b'{"k": 6}')
+    assert json.loads(body)[0]["score"] == 0.9
+
+
+def test_offline_workflow(monkeypatch):
+    monkeypatch.setattr(embed_cache, "ENABLED", False)      # keep stub vectors out of the cache
+    offline.install()
+    try:
+        event = g.run_workflow("offline: how much PTO do I get?", profile=True)
+    finally:
+        offline.uninstall()
+
+    assert event["ui_event"] == "text" and event["content"] == offline.CHAT_ANSWER
+    calls = event["profile"]["calls"]
+    assert calls["llm"] == 1 and calls["rpc"] >= 1
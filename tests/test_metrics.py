@@ -0,0 +1,75 @@
+import os
+import urllib.request
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+from langchain_core.runnables import RunnableLambda
+
+import backend.graph as g
+import backend.processors as processors
+import backend.supabase as supa
+from backend import metrics, tracing
+
+
+def test_render_and_quantile():
+    reg = metrics.Registry()
+    c = reg.counter("jobs_total", "jobs done", ["kind"])
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    h = reg.histogram("job_seconds", buckets=(0.1, 1.0))
+    for v in (0.05, 0.05, 0.5, 0.5):
+        h.observe(v)
+    reg.callback("queue_depth", lambda: 7)
+
+    text = reg.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a"} 3' in text
+    assert 'job_seconds_bucket{le="0.1"} 2' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4' in text
+    assert "job_seconds_count 4" in text and "queue_depth 7" in text
+    assert c.value(kind="a") == 3 and h.quantile(0.5) == 0.1
+    assert 0.1 < h.quantile(0.75) < 1.0
+
+
+def test_endpoint_serves_registry():
+    metrics.counter("endpoint_test_total").inc()
+    server = metrics.serve(port=0)
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as resp:
+        body = resp.read().decode()
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert "endpoint_test_total 1" in body
+
+
+def test_supabase_transport_counts_requests():
+    requests_total = metrics.get("supabase_requests_total")
+    before = requests_total.value(kind="rpc", status="200")
+    transport = tracing.TracedTransport(httpx.MockTransport(lambda r: httpx.Response(200)))
+    httpx.Client(transport=transport, base_url="http://sb").post("/rest/v1/rpc/match_vectors")
+    assert requests_total.value(kind="rpc", status="200") == before + 1
+
+
+def test_workflow_run_updates_request_metrics(monkeypatch):
+    manifest = {"processor_chain_id": "metrics_test_chain", "required_fields": [], "metadata": {}}
+
+    def embed(text):
+        metrics.tally("embed")
+        return [0.1]
+
+    monkeypatch.setattr(supa, "_embed", embed)
+    monkeypatch.setattr(supa, "fetch_manifest", lambda p, q_vec=None: ("t", manifest))
+    processors.REG["metrics_test_chain"] = RunnableLambda(
+        lambda p: {"ui_event": "text", "content": "ok"})
+    embeds = metrics.get("workflow_embed_calls_per_request")
+    n, total = embeds.count(), embeds.sum()
+    try:
+        g.run_workflow("hello")
+    finally:
+        del processors.REG["metrics_test_chain"]
+
+    requests_total = metrics.get("workflow_requests_total")
+    assert requests_total.value(chain_id="metrics_test_chain", ui_event="text") == 1
+    assert metrics.get("chain_seconds").count(chain_id="metrics_test_chain") == 1
+    assert (embeds.count(), embeds.sum()) == (n + 1, total + 1)
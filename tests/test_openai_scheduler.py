@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+
+import pytest
+
+from backend import openai_scheduler as osched
+from backend.openai_scheduler import (
+    BATCH, INTERACTIVE, Limits, Retry, ScheduledTransport, Scheduler, TokenBucket, httpx,
+)
+
+
+def _sched(**kw):
+    kw.setdefault("retry_base", 0.001)
+    kw.setdefault("retry_max", 0.01)
+    return Scheduler(**kw)
+
+
+def test_token_bucket_waits_for_refill():
+    b = TokenBucket(per_minute=60)                  # 1 unit / second
+    assert b.wait_time(60) == 0
+    b.take(60)
+    assert b.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    assert b.wait_time(1000) <= 60.1                # capped at a full bucket
+
+
+def test_rpm_limit_spaces_requests():
+    s = _sched(default=Limits(rpm=600, tpm=1e9))   # 10 req/s, bucket starts full
+    s._bucket("m")[0].level = 0
+    t0 = time.monotonic()
+    for _ in range(3):
+        s.call(lambda: None, model="m")
+    assert time.monotonic() - t0 >= 0.25
+
+
+def test_interactive_jumps_queued_batch_jobs():
+    s = _sched(max_concurrency=1)
+    gate, order = threading.Event(), []
+    blocker = s.submit(gate.wait, model="m")
+    time.sleep(0.05)                                # blocker holds the only slot
+    futs = [s.submit(lambda i=i: order.append(f"batch{i}"), model="m", priority=BATCH)
+            for i in range(3)]
+    futs.append(s.submit(lambda: order.append("ui"), model="m", priority=INTERACTIVE))
+    time.sleep(0.05)
+    gate.set()
+    for f in [blocker, *futs]:
+        f.result(timeout=2)
+    assert order == ["ui", "batch0", "batch1", "batch2"]
+
+
+def test_retry_then_fallback():
+    s = _sched(max_retries=2)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Retry(fallback="last")
+        return "ok"
+
+    assert s.call(flaky, model="m") == "ok"
+    calls.clear()
+    assert s.call(lambda: (calls.append(1), (_ for _ in ()).throw(Retry(fallback="last"))),
+                  model="m") == "last"
+    assert len(calls) == 3 and s.stats()["retries"] == 4
+
+
+def test_non_retryable_error_propagates():
+    s = _sched()
+    with pytest.raises(ValueError):
+        s.call(lambda: (_ for _ in ()).throw(ValueError("bad")), model="m")
+    assert s.stats()["retries"] == 0
+
+
+def test_transport_retries_429_and_estimates_tokens():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if len(seen) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "1"}, json={})
+        return httpx.Response(200, json={"ok": True})
+
+    s = _sched()
+    client = httpx.Client(transport=ScheduledTransport(httpx.MockTransport(handler), s))
+    body = {"model": "gpt-4o", "max_tokens": 100, "messages": []}
+    with osched.priority(BATCH):
+        resp = client.post("https://api.test/v1/chat/completions", json=body)
+    assert resp.status_code == 200 and resp.json() == {"ok": True}
+    assert len(seen) == 2
+    tpm = s._bucket("gpt-4o")[1]
+    assert tpm.capacity - tpm.level >= 2 * 100      # both attempts charged
+
+
+def test_transport_returns_last_error_after_max_retries():
+    s = _sched(max_retries=1)
+    transport = httpx.MockTransport(lambda r: httpx.Response(503, json={"error": "down"}))
+    client = httpx.Client(transport=ScheduledTransport(transport, s))
+    resp = client.post("https://api.test/v1/embeddings",
+                       content=json.dumps({"model": "e", "input": ["x"]}))
+    assert resp.status_code == 503 and resp.json() == {"error": "down"}
+
+
+def test_transport_charges_active_run_budget():
+    from backend import budget
+
+    usage = {"usage": {"total_tokens": 42}}
+    transport = httpx.MockTransport(lambda r: httpx.Response(200, json=usage))
+    client = httpx.Client(transport=ScheduledTransport(transport, _sched()))
+    run = budget.Budget({"max_calls": 1})
+    with budget.active(run):
+        client.post("https://api.test/v1/chat/completions", json={"model": "m"})
+        with pytest.raises(budget.BudgetExceeded):
+            client.post("https://api.test/v1/chat/completions", json={"model": "m"})
+    assert run.used["tokens"] == 42 and run.used["calls"] == 1
+
+
+def test_stream_holds_its_slot_until_closed():
+    def handler(request):
+        chunks = iter([b"data: {}\n\n", b"data: [DONE]\n\n"])
+        return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                              stream=_Chunks(chunks))
+
+    s = _sched(max_concurrency=1)
+    client = httpx.Client(transport=ScheduledTransport(httpx.MockTransport(handler), s))
+    body = {"model": "m", "stream": True}
+
+    stream_cm = client.stream("POST", "https://api.test/v1/chat/completions", json=body)
+    resp = stream_cm.__enter__()
+    second = threading.Thread(
+        target=lambda: client.post("https://api.test/v1/chat/completions", json=body).read())
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()                        # the open stream holds the only slot
+
+    assert b"[DONE]" in resp.read()
+    stream_cm.__exit__(None, None, None)
+    second.join(2)
+    assert not second.is_alive()
+
+
+class _Chunks(httpx.SyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        yield from self.chunks
@@ -4,3 +4,34 @@ def test_extract_plaintext():
     sample = b"Hello {{client}}, amount is {{amount}}. {{client}} again."
     names = extract_placeholders(sample, ".txt")
     assert names == ["amount","client"]
+
+
+def _zip(members):
+    import io, zipfile
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_scan_pptx_split_runs_and_locations():
+    from backend.templates import scan_template
+
+    slide = ('<p:sld><a:p><a:r><a:t>Hi {{ti</a:t></a:r><a:r><a:t>tle}}!</a:t></a:r></a:p>'
+             '<a:p><a:r><a:t>{{owner}}</a:t></a:r></a:p></p:sld>')
+    blob = _zip({
+        "ppt/slides/slide1.xml": slide,
+        "ppt/slideLayouts/slideLayout1.xml": "<a:p><a:r><a:t>{{ignored}}</a:t></a:r></a:p>",
+        "ppt/media/image1.png": b"\x89PNG{{not_a_field}}",
+    })
+
+    scan = scan_template(blob, ".pptx")
+    assert scan.names == ("owner", "title")
+    title = scan.locations["ppt/slides/slide1.xml"][0]
+    assert title.raw == "{{title}}" and len(title.spans) == 2
+    first, second = title.spans
+    assert slide[first.text_start:first.text_end][first.lo:first.hi] == "{{ti"
+    assert slide[second.text_start:second.text_end][second.lo:second.hi] == "tle}}"
+    assert scan_template(blob, ".pptx") is scan            # cached by content hash
+    assert extract_placeholders(blob, ".pptx") == ["owner", "title"]
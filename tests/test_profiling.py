@@ -0,0 +1,66 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import backend.graph as g
+import backend.processors as processors
+import backend.supabase as supa
+from backend import tracing
+from backend.profiling import format_report
+
+MANIFEST = {"processor_chain_id": "profile_test_chain", "required_fields": [], "metadata": {}}
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Embedding and manifest lookup go through a mocked Supabase transport."""
+    sb = httpx.Client(base_url="http://sb", transport=tracing.TracedTransport(
+        httpx.MockTransport(lambda r: httpx.Response(200, json=[MANIFEST]))))
+
+    def embed(text):
+        with tracing.span("embed"):
+            return [0.1]
+
+    def fetch_manifest(prompt, q_vec=None):
+        sb.post("/rest/v1/rpc/match_task_manifest_vec", json={"q": q_vec})
+        return "t", MANIFEST
+
+    def busy_chain(payload):
+        sum(i * i for i in range(20000))
+        return {"ui_event": "text", "content": "ok"}
+
+    monkeypatch.setattr(supa, "_embed", embed)
+    monkeypatch.setattr(supa, "fetch_manifest", fetch_manifest)
+    processors.REG["profile_test_chain"] = RunnableLambda(busy_chain)
+    yield
+    del processors.REG["profile_test_chain"]
+
+
+def test_profile_breakdown(backends):
+    assert "profile" not in g.run_workflow("hello")
+
+    event = g.run_workflow("hello", profile=True)
+    report = event.pop("profile")
+    assert event == {"ui_event": "text", "content": "ok"}
+
+    assert {"intent_node", "gather_node", "process_node", "deliver_node"} <= set(report["nodes"])
+    intent = report["nodes"]["intent_node"]
+    assert 0 < intent["network_ms"] <= intent["wall_ms"]
+    assert report["nodes"]["process_node"]["cpu_ms"] > 0
+    assert report["network_ms"] == pytest.approx(intent["network_ms"])
+    assert report["calls"]["embed"] == 1 and report["calls"]["rpc"] == 1
+    assert report["bytes"]["sent"] > 0 and report["bytes"]["received"] > 0
+    assert report["slowest"][0]["fn"] == "match_task_manifest_vec"
+    assert "cpu_profile" not in report
+    assert "process_node" in format_report(report)
+
+
+def test_profile_cpu_capture(backends):
+    report = g.run_workflow("hello", profile="cpu")["profile"]
+    assert "busy_chain" in report["cpu_profile"]["process_node"]
@@ -0,0 +1,126 @@
+import psycopg2
+import pytest
+
+from backend import prompts
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    prompts.invalidate_prompts()
+    yield
+    prompts.invalidate_prompts()
+
+
+def test_get_prompt_cached_until_invalidated(monkeypatch):
+    calls = []
+
+    def fake_query(sql, args):
+        calls.append(args)
+        return [(f"text for {args}",)]
+
+    monkeypatch.setattr(prompts, "_query", fake_query)
+
+    assert prompts.get_prompt("policy_qa") == prompts.get_prompt("policy_qa")
+    prompts.get_prompt("policy_qa", 2)
+    assert calls == [("policy_qa",), ("policy_qa", 2)]
+
+    prompts.invalidate_prompts("policy_qa")
+    prompts.get_prompt("policy_qa")
+    assert len(calls) == 3
+
+
+def test_preload_fills_latest_and_versions(monkeypatch):
+    rows = [("a", 3, "a3"), ("a", 1, "a1"), ("b", 1, "b1")]
+    monkeypatch.setattr(prompts, "_query", lambda sql, args: rows)
+    assert prompts.preload_prompts() == 3
+
+    monkeypatch.setattr(prompts, "_query", lambda sql, args: pytest.fail("hit the DB"))
+    assert prompts.get_prompt("a") == "a3"
+    assert prompts.get_prompt("a", 1) == "a1"
+    assert prompts.get_prompt("b") == "b1"
+
+
+def test_stale_connection_is_dropped_and_retried(monkeypatch):
+    class Cursor:
+        def __init__(self, conn):
+            self.conn = conn
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return False
+        def execute(self, sql, args):
+            if self.conn.stale:
+                raise psycopg2.OperationalError("server closed the connection")
+        def fetchall(self):
+            return [("fresh",)]
+
+    class Conn:
+        closed = 0
+        def __init__(self, stale):
+            self.stale = stale
+        def cursor(self):
+            return Cursor(self)
+        def rollback(self):
+            pass
+
+    class Pool:
+        def __init__(self):
+            self.idle, self.discarded = [Conn(stale=True)], []
+        def getconn(self):
+            return self.idle.pop() if self.idle else Conn(stale=False)
+        def putconn(self, conn, close=False):
+            (self.discarded if close else self.idle).append(conn)
+
+    pool = Pool()
+    monkeypatch.setattr(prompts, "_pool", lambda: pool)
+
+    assert prompts.get_prompt("x") == "fresh"
+    assert len(pool.discarded) == 1 and len(pool.idle) == 1
+
+
+def test_misses_beyond_pool_max_wait_for_a_connection(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+    import time
+
+    from psycopg2.pool import PoolError
+
+    class Cursor:
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return False
+        def execute(self, sql, args):
+            time.sleep(0.02)
+        def fetchall(self):
+            return [("text",)]
+
+    class Conn:
+        closed = 0
+        def cursor(self):
+            return Cursor()
+        def rollback(self):
+            pass
+
+    class Pool:                                # ThreadedConnectionPool semantics
+        def __init__(self):
+            self.out, self.peak, self.lock = 0, 0, threading.Lock()
+        def getconn(self):
+            with self.lock:
+                if self.out >= prompts.POOL_MAX:
+                    raise PoolError("connection pool exhausted")
+                self.out += 1
+                self.peak = max(self.peak, self.out)
+            return Conn()
+        def putconn(self, conn, close=False):
+            with self.lock:
+                self.out -= 1
+
+    pool = Pool()
+    monkeypatch.setattr(prompts, "_pool", lambda: pool)
+
+    n = prompts.POOL_MAX * 2
+    with ThreadPoolExecutor(n) as ex:
+        got = list(ex.map(lambda i: prompts.get_prompt(f"p{i}"), range(n)))
+    assert got == ["text"] * n
+    assert pool.peak == prompts.POOL_MAX
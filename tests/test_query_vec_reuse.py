@@ -0,0 +1,55 @@
+"""
+The prompt is embedded once in Intent and the same vector is handed to
+retrieval — no network: Supabase RPCs and the embedder are faked.
+"""
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import backend.graph as g
+import backend.router_index as ri
+import backend.supabase as supa
+import backend.vector_search as vs
+
+
+class _Rpc:
+    def __init__(self, data, calls):
+        self.data, self.calls = data, calls
+
+    def __call__(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return self
+
+
+def test_intent_embeds_once_and_reuses_vector(monkeypatch):
+    embeds = []
+    monkeypatch.setattr(supa, "_embed", lambda t: embeds.append(t) or [0.1, 0.2])
+    idx = ri.RouterIndex([{"task": "pto", "required_fields": [], "embedding": [0.1, 0.2]}])
+    monkeypatch.setattr(ri, "get_index", lambda: idx)
+
+    state = g.intent_node(g.WorkflowState(prompt="how much PTO?"))
+    assert embeds == ["how much PTO?"]
+    assert state.query_vec == [0.1, 0.2]
+    assert state.manifest["task"] == "pto"
+
+    # a second pass (e.g. resubmission) does not embed again
+    g.intent_node(state)
+    assert len(embeds) == 1
+
+
+def test_retriever_uses_precomputed_vector(monkeypatch):
+    monkeypatch.setattr(vs, "_embed", lambda t: (_ for _ in ()).throw(AssertionError("embedded")))
+    calls = []
+    rows = [{"payload": {"content": "20 days", "doc_id": "handbook_2024"}, "score": 0.9}]
+    monkeypatch.setattr(vs._SB, "rpc", _Rpc(rows, calls))
+
+    docs = vs.SupaRetriever(doc_id="handbook_2024", k=2).get_relevant_documents(
+        "how much PTO?", q_vec=[0.1, 0.2])
+    assert calls[0][1]["q_vec"] == [0.1, 0.2]
+    assert docs[0].page_content == "20 days"
+    assert abs(docs[0].metadata["dist"] - 0.1) < 1e-9
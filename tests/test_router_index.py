@@ -0,0 +1,62 @@
+import logging
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import numpy as np
+import pytest
+
+from backend import router_index
+from backend.router_index import RouterIndex
+
+ROWS = [
+    {"task": "draft_sow",  "tenant_id": "default", "embedding": [1.0, 0.0, 0.0]},
+    {"task": "policy_qna", "tenant_id": "default", "embedding": "[0.0, 2.0, 0.0]"},
+    {"task": "invoice",    "tenant_id": "default", "embedding": "{0.7,0.7,0}"},
+    {"task": "acme_only",  "tenant_id": "acme",    "embedding": [1.0, 0.0, 0.0]},
+    {"task": "no_vector",  "tenant_id": "default", "embedding": None},
+]
+
+
+def test_top_k_is_ordered_and_returns_full_row():
+    idx = RouterIndex(ROWS)
+    assert len(idx) == 4
+    assert idx.tenants == ["acme", "default"]
+
+    hits = idx.search([0.9, 0.1, 0.0], k=2)
+    assert [r["task"] for _, r in hits] == ["draft_sow", "invoice"]
+    sim, row = hits[0]
+    assert row["sim"] == pytest.approx(sim)
+    assert row["dist"] == pytest.approx(1 - sim)
+    assert "embedding" not in row
+    assert idx._parts["default"].matrix.flags["C_CONTIGUOUS"]
+    assert idx._parts["default"].matrix.dtype == np.float32
+
+
+def test_tenant_partition_and_threshold():
+    idx = RouterIndex(ROWS)
+    assert [r["task"] for _, r in idx.search([1, 0, 0], tenant="acme", k=5)] == ["acme_only"]
+    assert idx.search([1, 0, 0], tenant="missing") == []
+    assert idx.search([0, 0, 1], k=3, min_similarity=0.5) == []
+
+
+def test_dimension_mismatch_raises():
+    with pytest.raises(ValueError):
+        RouterIndex(ROWS).search([1.0, 0.0])
+
+
+def test_empty_index_has_no_hits(monkeypatch, caplog):
+    from backend import supabase
+
+    empty = RouterIndex([{"task": "no_vector", "embedding": None}])
+    assert empty.dim is None and len(empty) == 0
+    assert empty.search([1.0, 0.0, 0.0]) == []
+
+    monkeypatch.setattr(supabase, "_ROUTER_MODE", "local")
+    monkeypatch.setattr(router_index, "get_index", lambda: empty)
+    monkeypatch.setattr(supabase._SB, "rpc", lambda *a, **k: pytest.fail("rpc fallback"))
+    with caplog.at_level(logging.WARNING):
+        assert supabase.fetch_manifest("anything", q_vec=[1.0, 0.0]) == ("", {})
+    assert "router index unavailable" not in caplog.text
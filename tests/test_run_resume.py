@@ -0,0 +1,65 @@
+"""
+A form resubmission carrying the run id resumes at Gather: no second
+embedding, no second manifest lookup — Supabase and OpenAI are faked.
+Both workflow engines (LangGraph and the fast path) must behave the same.
+"""
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import backend.graph as g
+import backend.processors as processors
+import backend.supabase as supa
+from backend.run_store import RUNS, RunStore
+
+MANIFEST = {"task": "sow", "processor_chain_id": "resume_test_chain",
+            "required_fields": [{"name": "client"}], "metadata": {}}
+
+
+@pytest.fixture(params=["langgraph", "fast"])
+def engine(request):
+    before = g.ENGINE
+    g.reload_graph(request.param)
+    yield request.param
+    g.reload_graph(before)
+
+
+def test_resubmission_skips_intent(monkeypatch, engine):
+    calls = []
+    monkeypatch.setattr(supa, "_embed", lambda t: calls.append("embed") or [0.5])
+    monkeypatch.setattr(supa, "fetch_manifest",
+                        lambda p, q_vec=None: calls.append("manifest") or ("sow", MANIFEST))
+    processors.REG["resume_test_chain"] = RunnableLambda(
+        lambda p: {"ui_event": "text", "content": f"{p['inputs']['client']} {p['query_vec']}"})
+    try:
+        _form_then_resume(calls)
+    finally:
+        del processors.REG["resume_test_chain"]
+
+
+def _form_then_resume(calls):
+    form = g.run_workflow("draft a SOW")
+    assert form["ui_event"] == "form" and form["run_id"]
+    assert calls == ["embed", "manifest"]
+
+    done = g.run_workflow("draft a SOW", {"client": "Acme"}, run_id=form["run_id"])
+    assert done == {"ui_event": "text", "content": "Acme [0.5]"}
+    assert calls == ["embed", "manifest"]                 # Intent skipped
+    assert RUNS.load(form["run_id"]) is None             # finished run is dropped
+
+    # an unknown id just starts over
+    g.run_workflow("draft a SOW", {"client": "Acme"}, run_id="gone")
+    assert calls.count("embed") == 2
+
+
+def test_run_store_expires_and_caps():
+    store = RunStore(ttl=-1)
+    assert store.load(store.save({"prompt": "p"})) is None
+    store = RunStore(max_items=2)
+    ids = [store.save({"n": i}) for i in range(3)]
+    assert store.load(ids[0]) is None and store.load(ids[2]) == {"n": 2}
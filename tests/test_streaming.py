@@ -0,0 +1,69 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import backend.graph as g
+import backend.processors as processors
+import backend.router_index as ri
+import backend.supabase as supa
+from backend import llm, streaming
+
+
+def test_iter_tokens_yields_deltas_then_result():
+    def work(n):
+        for i in range(n):
+            streaming.emit(f"t{i} ")
+        return "done!"
+
+    assert list(streaming.iter_tokens(work, 3)) == [
+        ("token", "t0 "), ("token", "t1 "), ("token", "t2 "), ("done", "done!")]
+    assert not streaming.active()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        list(streaming.iter_tokens(fail))
+
+
+def test_call_llm_streams_when_sink_installed(monkeypatch):
+    def chunk(text):
+        delta = type("D", (), {"content": text})
+        return type("Chunk", (), {"choices": [type("C", (), {"delta": delta})]})
+
+    class Completions:
+        def create(self, stream=False, **request):
+            assert stream
+            return iter([chunk("Twenty"), chunk(" days")])
+
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": Completions()})})
+    monkeypatch.setattr(llm, "_client", lambda: client)
+    monkeypatch.setattr(llm, "get_prompt", lambda name, version=None: "Q")
+
+    seen = []
+    with streaming.token_sink(seen.append):
+        assert llm.call_llm("p") == "Twenty days"
+    assert seen == ["Twenty", " days"]
+
+
+def test_run_workflow_stream_through_graph(monkeypatch):
+    monkeypatch.setattr(supa, "_embed", lambda t: [0.1, 0.2])
+    idx = ri.RouterIndex([{"task": "talk", "required_fields": [], "embedding": [0.1, 0.2],
+                           "processor_chain_id": "talk_chain"}])
+    monkeypatch.setattr(ri, "get_index", lambda: idx)
+
+    def talk(payload):
+        for tok in ("Hel", "lo"):
+            streaming.emit(tok)
+        return {"ui_event": "text", "content": "Hello"}
+
+    monkeypatch.setitem(processors.REG._static, "talk_chain", RunnableLambda(talk))
+
+    events = list(g.run_workflow_stream("hi"))
+    assert [e["content"] for e in events] == ["Hel", "Hello", "Hello"]
+    assert [e["ui_event"] for e in events] == ["partial", "partial", "text"]
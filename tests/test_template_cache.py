@@ -0,0 +1,161 @@
+import io
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import docx
+import pytest
+
+from backend.tools.template_cache import TemplateCache
+
+
+def _cache(store, **kw):
+    fetched = []
+
+    def fetch(path):
+        fetched.append(path)
+        return store[path][1]
+
+    return TemplateCache(fetch, lambda p: store[p][0], **kw), fetched
+
+
+def test_revalidates_instead_of_redownloading():
+    store = {"t.docx": ("etag-1", b"one")}
+    cache, fetched = _cache(store, revalidate_sec=0)
+
+    assert cache.get("t.docx").blob == b"one"
+    assert cache.get("t.docx").blob == b"one"
+    assert fetched == ["t.docx"]
+    assert cache.stats()["revalidations"] == 1
+
+    store["t.docx"] = ("etag-2", b"two")
+    assert cache.get("t.docx").blob == b"two"
+    assert fetched == ["t.docx", "t.docx"]
+
+
+def test_parse_once_and_lru_bound():
+    store = {f"{i}.docx": (f"e{i}", b"x%d" % i) for i in range(3)}
+    parsed = []
+    cache, _ = _cache(store, parse=lambda b: parsed.append(b) or b.upper(), max_items=2)
+
+    entry = cache.get("0.docx")
+    assert entry.parsed() == entry.parsed() == b"X0"
+    assert parsed == [b"x0"]
+
+    cache.get("1.docx"), cache.get("2.docx")
+    assert cache.stats()["size"] == 2
+
+
+def test_disk_layer_survives_new_instance(tmp_path):
+    store = {"t.docx": ("etag-1", b"blob")}
+    first, fetched = _cache(store, cache_dir=tmp_path)
+    first.get("t.docx")
+
+    second, fetched2 = _cache(store, cache_dir=tmp_path)
+    assert second.get("t.docx").blob == b"blob"
+    assert fetched == ["t.docx"] and fetched2 == []
+
+
+class _Bucket:
+    def __init__(self, files):
+        self.files, self.calls = files, []
+
+    def download(self, path):
+        self.calls.append(("download", path))
+        return self.files[path]
+
+    def list(self, folder, opts):
+        self.calls.append(("list", opts["search"]))
+        prefix = f"{folder}/" if folder else ""
+        return [{"name": opts["search"], "metadata": {"eTag": "e1"}}
+                for p in self.files if p == prefix + opts["search"]]
+
+    def upload(self, key, blob, opts):
+        self.calls.append(("upload", key))
+        self.files[key] = blob
+
+    def create_signed_url(self, key, expiry):
+        self.calls.append(("sign", key))
+        return {"signedURL": "https://signed/" + key}
+
+
+class _Storage:
+    def __init__(self):
+        self.buckets = {}
+
+    def from_(self, bucket):
+        return self.buckets.setdefault(bucket, _Bucket({}))
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    from backend.tools import docx_render as dr
+
+    fake = _Storage()
+    monkeypatch.setattr(dr, "sb", type("SB", (), {"storage": fake})())
+    dr._TEMPLATES.invalidate()
+    dr._URLS.clear()
+    yield fake
+    dr._TEMPLATES.invalidate()
+    dr._URLS.clear()
+
+
+def _put_template(storage, name, text):
+    tpl = docx.Document()
+    tpl.add_paragraph(text)
+    buf = io.BytesIO()
+    tpl.save(buf)
+    storage.from_("templates").files[name] = buf.getvalue()
+
+
+def _text(blob):
+    return docx.Document(io.BytesIO(blob)).paragraphs[0].text
+
+
+def test_docx_render_reuses_template_and_output(storage):
+    from backend.tools import docx_render as dr
+
+    _put_template(storage, "greeting.docx", "Hello {{name}}")
+    render = dr.DocxRender("greeting")
+    out1 = render.invoke({"name": "Ada"})
+    out2 = render.invoke({"name": "Bob"})
+    again = render.invoke({"name": "Ada"})
+
+    tpl_calls = storage.from_("templates").calls
+    assert [c for c in tpl_calls if c[0] == "download"] == [("download", "greeting.docx")]
+
+    docs = storage.from_(dr.OUTPUT_BUCKET)
+    uploads = [c[1] for c in docs.calls if c[0] == "upload"]
+    assert len(uploads) == 2                     # the repeat was deduplicated
+    assert sorted(_text(docs.files[k]) for k in uploads) == ["Hello Ada", "Hello Bob"]
+    assert again["url"] == out1["url"] != out2["url"]
+    assert out1["ui_event"] == "download_link"
+
+    dr._URLS.clear()                             # other process: storage lookup only
+    assert render.invoke({"name": "Ada"})["url"] == out1["url"]
+    assert len([c for c in docs.calls if c[0] == "upload"]) == 2
+
+
+def test_docx_batch_zip_and_links(storage, monkeypatch):
+    import zipfile
+    from backend.tools import docx_render as dr
+
+    monkeypatch.setattr(dr, "BATCH_MIN_PARALLEL", 2)
+    _put_template(storage, "batchtpl.docx", "Client {{client}}")
+    rows = [{"client": f"C{i}"} for i in range(4)]
+    render = dr.DocxRender("batchtpl")
+    docs = storage.from_(dr.OUTPUT_BUCKET)
+
+    out = render.batch(rows, as_zip=True, name_field="client", processes=2)
+    assert out["ui_event"] == "download_link" and out["count"] == 4
+    archive = zipfile.ZipFile(io.BytesIO(docs.files[out["url"].split("signed/")[1]]))
+    assert archive.namelist() == [f"{i + 1:04d}-C{i}.docx" for i in range(4)]
+    assert _text(archive.read("0001-C0.docx")) == "Client C0"
+
+    single = render.invoke(rows[1])
+    links = render.batch(rows[:3], name_field="client", processes=1)
+    assert links["ui_event"] == "download_links" and len(links["urls"]) == 3
+    assert links["names"] == [f"{i + 1:04d}-C{i}.docx" for i in range(3)]
+    assert links["urls"][1] == single["url"] + "?download=0002-C1.docx"
+    assert len([c for c in docs.calls if c[0] == "upload"]) == 1 + 3
@@ -0,0 +1,69 @@
+import json
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+from langchain_core.runnables import RunnableLambda
+
+import backend.graph as g
+import backend.processors as processors
+import backend.supabase as supa
+from backend import tracing
+
+
+def test_spans_nest_and_noop_when_off(tmp_path):
+    assert tracing.span("idle") is tracing._NOOP        # no exporter, no collector
+
+    exporter = tracing.JsonlExporter(tmp_path / "t.jsonl")
+    tracing.add_exporter(exporter)
+    try:
+        with tracing.run_context("run-1"), tracing.collect() as spans:
+            with tracing.span("outer", k=1):
+                with tracing.span("inner") as sp:
+                    sp.set(rows=3)
+    finally:
+        tracing.remove_exporter(exporter)
+        exporter.close()
+
+    inner, outer = spans
+    assert inner.parent_id == outer.span_id and inner.attrs == {"rows": 3}
+    assert {inner.trace_id, outer.trace_id} == {"run-1"}
+    lines = [json.loads(l) for l in (tmp_path / "t.jsonl").read_text().splitlines()]
+    assert [l["name"] for l in lines] == ["inner", "outer"]
+
+
+def test_supabase_transport_names_spans():
+    transport = tracing.TracedTransport(httpx.MockTransport(lambda r: httpx.Response(200)))
+    client = httpx.Client(transport=transport, base_url="http://sb")
+    with tracing.collect() as spans:
+        client.post("/rest/v1/rpc/match_task_manifest_vec")
+        client.get("/rest/v1/task_manifest")
+        client.get("/storage/v1/object/templates/a.docx")
+    assert [(s.name, s.attrs.get("fn") or s.attrs.get("table") or s.attrs.get("path"))
+            for s in spans] == [("supabase.rpc", "match_task_manifest_vec"),
+                                ("supabase.rest", "task_manifest"),
+                                ("supabase.storage", "object/templates/a.docx")]
+    assert spans[0].attrs["status"] == 200
+
+
+def test_workflow_run_is_one_trace(monkeypatch):
+    manifest = {"processor_chain_id": "trace_test_chain", "required_fields": [], "metadata": {}}
+    monkeypatch.setattr(supa, "_embed", lambda t: [0.1])
+    monkeypatch.setattr(supa, "fetch_manifest", lambda p, q_vec=None: ("t", manifest))
+    processors.REG["trace_test_chain"] = RunnableLambda(
+        lambda p: {"ui_event": "text", "content": "ok"})
+    try:
+        with tracing.collect() as spans:
+            g.run_workflow("hello")
+    finally:
+        del processors.REG["trace_test_chain"]
+
+    by_name = {s.name: s for s in spans}
+    root = by_name["run_workflow"]
+    assert {"intent_node", "gather_node", "process_node", "deliver_node"} <= set(by_name)
+    assert {s.trace_id for s in spans} == {root.trace_id}
+    assert by_name["process_node"].parent_id == root.span_id
+    assert root.attrs["ui_event"] == "text"
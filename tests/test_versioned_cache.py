@@ -0,0 +1,60 @@
+import time
+
+from backend.versioned_cache import VersionedCache
+
+
+def _wait(pred, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not pred() and time.monotonic() < end:
+        time.sleep(0.01)
+    return pred()
+
+
+def test_rebuilds_in_background_only_when_version_moves():
+    state = {"version": 1, "loads": 0}
+
+    def loader():
+        state["loads"] += 1
+        return f"snap-{state['version']}"
+
+    cache = VersionedCache(loader, lambda: state["version"], poll_sec=0)
+    assert cache.get() == "snap-1"
+
+    cache.get()                                   # same version → no reload
+    assert _wait(lambda: not cache._refreshing.locked())
+    assert state["loads"] == 1
+
+    state["version"] = 2
+    cache.get()                                   # still returns the old snapshot …
+    assert _wait(lambda: cache.get() == "snap-2")  # … until the swap lands
+    assert state["loads"] == 2
+
+
+def test_delta_loader_and_failed_rebuild_keeps_snapshot():
+    state = {"version": 1}
+    deltas = []
+
+    def delta(prev, old, new):
+        deltas.append((old, new))
+        if new == 3:
+            raise RuntimeError("db down")
+        return prev + [new]
+
+    cache = VersionedCache(lambda: [1], lambda: state["version"],
+                           delta_loader=delta, poll_sec=3600)
+    assert cache.get() == [1]
+
+    state["version"] = 2
+    assert cache.refresh() == [1, 2]
+    state["version"] = 3
+    assert cache.refresh() == [1, 2]              # rebuild failed → old value
+    assert deltas == [(1, 2), (2, 3)]
+
+
+def test_invalidate_forces_reload_even_if_version_unchanged():
+    loads = []
+    cache = VersionedCache(lambda: loads.append(1) or len(loads), lambda: "v",
+                           poll_sec=3600)
+    assert cache.get() == 1
+    cache.invalidate()
+    assert _wait(lambda: cache.get() == 2)